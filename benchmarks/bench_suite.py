@@ -0,0 +1,221 @@
+"""
+Reproducible benchmark suite for the conversion pipeline.
+
+Generates synthetic SLD99 DXF drawings (LINE-heavy, LWPOLYLINE-heavy and
+curve-heavy)
+and times each stage on its own: the scalar and batch transforms, layer
+scanning, KML writing and full DXF → KML conversion, including a re-run
+served from the entity cache. Every stage also records its peak traced
+memory. Results are written as JSON so runs from different commits can be
+compared.
+
+Usage:  python benchmarks/bench_suite.py [--sizes 10000,100000,1000000] [--out results.json]
+        python benchmarks/bench_suite.py --compare old.json new.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import converter
+from converter import (wgs84_to_sld99, wgs84_to_sld99_batch, sld99_to_wgs84, sld99_to_wgs84_batch,
+                       read_geometry, iter_dxf_entities, count_layers, scan_layer_counts, KMLWriter, convert_file)
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+SHAPES = ('lines', 'polylines', 'curves')
+POLYLINE_VERTICES = 20
+
+
+def _measure(fn, repeats):
+    """Best wall time over `repeats` untraced runs, then one traced run for peak memory (MB)."""
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def make_dxf(path, n_vertices, shape, seed=1):
+    """Write a drawing of about `n_vertices` vertices spread over 8 layers.
+    'lines' chains LINE entities end to end (every corner shared by two
+    entities), 'polylines' draws closed 20-vertex LWPOLYLINE lots and
+    'curves' mixes ARCs, CIRCLEs and bulged LWPOLYLINE lots, one entity per
+    20 requested vertices (the flattened vertex count depends on the tolerance)."""
+    import ezdxf
+    rnd = random.Random(seed)
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    x = 500000.0; y = 500000.0
+    if shape == 'lines':
+        for i in range(n_vertices // 2):
+            nx = x + rnd.uniform(-20, 20); ny = y + rnd.uniform(-20, 20)
+            msp.add_line((x, y), (nx, ny), dxfattribs={'layer': f"LINES_{i % 8}"})
+            x, y = nx, ny
+            if i % 500 == 499: x = rnd.uniform(420000, 580000); y = rnd.uniform(420000, 780000)
+    elif shape == 'curves':
+        for i in range(n_vertices // POLYLINE_VERTICES):
+            cx = rnd.uniform(420000, 580000); cy = rnd.uniform(420000, 780000)
+            attribs = {'layer': f"CURVES_{i % 8}"}
+            if i % 3 == 0:
+                msp.add_arc((cx, cy), rnd.uniform(5, 200), rnd.uniform(0, 360), rnd.uniform(0, 360), dxfattribs=attribs)
+            elif i % 3 == 1:
+                msp.add_circle((cx, cy), rnd.uniform(1, 50), dxfattribs=attribs)
+            else:
+                pts = [(cx, cy, 0.3), (cx + 30, cy, 0), (cx + 30, cy + 30, -0.2), (cx, cy + 30, 0)]
+                msp.add_lwpolyline(pts, format='xyb', close=True, dxfattribs=attribs)
+    else:
+        for i in range(n_vertices // POLYLINE_VERTICES):
+            cx = rnd.uniform(420000, 580000); cy = rnd.uniform(420000, 780000)
+            pts = [(cx + 30 * rnd.random(), cy + 30 * rnd.random()) for _ in range(POLYLINE_VERTICES - 1)]
+            msp.add_lwpolyline(pts + pts[:1], dxfattribs={'layer': f"LOTS_{i % 8}"})
+    doc.saveas(path)
+
+
+def dxf_fixture(cache_dir, n_vertices, shape):
+    path = os.path.join(cache_dir, f"bench_{shape}_{n_vertices}.dxf")
+    if not os.path.exists(path):
+        print(f"generating {os.path.basename(path)}...", file=sys.stderr)
+        make_dxf(path + '.part', n_vertices, shape)
+        os.replace(path + '.part', path)
+    return path
+
+
+def bench_transforms(n, repeats):
+    rnd = random.Random(99)
+    lons = [rnd.uniform(79.6, 81.9) for _ in range(n)]
+    lats = [rnd.uniform(5.9, 9.8) for _ in range(n)]
+    easts, norths = wgs84_to_sld99_batch(lons, lats)
+    easts = list(easts); norths = list(norths)
+    cases = [
+        ("sld99_to_wgs84", "scalar", lambda: [sld99_to_wgs84(e, nn) for e, nn in zip(easts, norths)]),
+        ("sld99_to_wgs84", "batch", lambda: sld99_to_wgs84_batch(easts, norths)),
+        ("wgs84_to_sld99", "scalar", lambda: [wgs84_to_sld99(lo, la) for lo, la in zip(lons, lats)]),
+        ("wgs84_to_sld99", "batch", lambda: wgs84_to_sld99_batch(lons, lats)),
+    ]
+    for stage, case, fn in cases:
+        secs, peak = _measure(fn, repeats)
+        yield {'stage': stage, 'case': case, 'vertices': n, 'seconds': secs, 'peak_mb': peak}
+
+
+def bench_dxf(path, shape, n, out_dir, repeats):
+    geom = read_geometry(path)
+    coords = " ".join("80.1234567,7.1234567,0" for _ in range(2 if shape == 'lines' else POLYLINE_VERTICES))
+
+    def write_only():
+        w = KMLWriter(out_dir)
+        try:
+            for layer_name, _, _ in geom.parts:
+                w.add_linestring(layer_name, "layer_default", coords)
+            w.close()
+        finally:
+            w.discard()
+
+    # Warm the entity cache so 'cached_rerun' measures a fully cached conversion
+    cache_dir = os.path.join(out_dir, 'entity_cache')
+    convert_file(path, out_dir, cache_dir=cache_dir)
+
+    cases = [
+        ("layer_scan", "load", lambda: read_geometry(path)),
+        ("layer_scan", "stream", lambda: count_layers(iter_dxf_entities(path))),
+        ("layer_scan", "fast", lambda: scan_layer_counts(path)),
+        ("kml_write", "kml", write_only),
+        ("convert", "kml", lambda: convert_file(path, out_dir)),
+        ("convert", "kmz", lambda: convert_file(path, out_dir, kmz=True)),
+        ("convert", "low_memory", lambda: convert_file(path, out_dir, low_memory=True)),
+        ("convert", "cached_rerun", lambda: convert_file(path, out_dir, cache_dir=cache_dir)),
+    ]
+    for stage, case, fn in cases:
+        secs, peak = _measure(fn, repeats)
+        yield {'stage': stage, 'case': f"{shape}/{case}", 'vertices': n, 'seconds': secs, 'peak_mb': peak}
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import ezdxf
+        ezdxf_version = ezdxf.__version__
+    except ImportError:
+        ezdxf_version = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'numpy': converter.HAVE_NUMPY, 'ezdxf': ezdxf_version,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run(sizes, repeats, cache_dir, stages):
+    results = []
+    def report(r):
+        r['per_second'] = r['vertices'] / r['seconds'] if r['seconds'] else None
+        results.append(r)
+        print(f"{r['stage']:15s} {r['case']:22s} {r['vertices']:>9,} v  {r['seconds']:9.4f} s  "
+              f"{r['per_second']:12,.0f} v/s  {r['peak_mb']:8.1f} MB", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix='surveymap_bench_') as out_dir:
+        for n in sizes:
+            if 'transforms' in stages:
+                for r in bench_transforms(n, repeats): report(r)
+            if 'dxf' in stages:
+                for shape in SHAPES:
+                    for r in bench_dxf(dxf_fixture(cache_dir, n, shape), shape, n, out_dir, repeats): report(r)
+    return {'env': environment(), 'repeats': repeats, 'results': results}
+
+
+def compare(old_path, new_path):
+    """Print the time and memory ratio (new / old) of every stage found in both files."""
+    with open(old_path) as f: old = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    key = lambda r: (r['stage'], r['case'], r['vertices'])
+    before = {key(r): r for r in old['results']}
+    print(f"{old['env'].get('commit')} → {new['env'].get('commit')}   (ratio < 1 is better)")
+    for r in new['results']:
+        o = before.get(key(r))
+        if o is None: continue
+        t = r['seconds'] / o['seconds'] if o['seconds'] else float('nan')
+        m = r['peak_mb'] / o['peak_mb'] if o['peak_mb'] else float('nan')
+        flag = "  SLOWER" if t > 1.1 else ""
+        print(f"{r['stage']:15s} {r['case']:22s} {r['vertices']:>9,} v  time x{t:5.2f}  mem x{m:5.2f}{flag}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated vertex counts")
+    ap.add_argument('--repeats', type=int, default=3)
+    ap.add_argument('--stages', default='transforms,dxf', help="transforms and/or dxf")
+    ap.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'surveymap_bench_dxf'),
+                    help="where generated DXF fixtures are kept between runs")
+    ap.add_argument('--out', help="write JSON results here (default: stdout)")
+    ap.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files")
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    os.makedirs(args.cache_dir, exist_ok=True)
+    data = run([int(s) for s in args.sizes.split(',')], args.repeats, args.cache_dir, args.stages.split(','))
+    text = json.dumps(data, indent=1)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
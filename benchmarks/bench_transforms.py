@@ -0,0 +1,62 @@
+"""
+Throughput benchmark: scalar vs batch WGS84 → SLD99 / SLD99 → WGS84,
+plus the approximate grid transforms (scalar lookup vs batch interpolation).
+
+Usage:  python benchmarks/bench_transforms.py [n_points] [repeats]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from converter import (wgs84_to_sld99, wgs84_to_sld99_batch,
+                       sld99_to_wgs84, sld99_to_wgs84_batch, HAVE_NUMPY,
+                       transform_grids, verify_transform_grids, GRID_MAX_ERROR_M)
+
+
+def _best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(n=100000, repeats=3, seed=99):
+    rnd = random.Random(seed)
+    lons = [rnd.uniform(79.6, 81.9) for _ in range(n)]
+    lats = [rnd.uniform(5.9, 9.8) for _ in range(n)]
+    easts, norths = wgs84_to_sld99_batch(lons, lats)
+    easts = list(easts); norths = list(norths)
+
+    cases = [
+        ("wgs84_to_sld99", lambda: [wgs84_to_sld99(lo, la) for lo, la in zip(lons, lats)],
+                           lambda: wgs84_to_sld99_batch(lons, lats)),
+        ("sld99_to_wgs84", lambda: [sld99_to_wgs84(e, nn) for e, nn in zip(easts, norths)],
+                           lambda: sld99_to_wgs84_batch(easts, norths)),
+    ]
+
+    fwd, inv = transform_grids()
+    cases += [
+        ("grid sld99→wgs84", lambda: [fwd(e, nn) for e, nn in zip(easts, norths)],
+                             lambda: fwd.batch(easts, norths)),
+        ("grid wgs84→sld99", lambda: [inv(lo, la) for lo, la in zip(lons, lats)],
+                             lambda: inv.batch(lons, lats)),
+    ]
+
+    print(f"points: {n}   repeats: {repeats}   numpy: {'yes' if HAVE_NUMPY else 'no'}")
+    for name, scalar, batch in cases:
+        ts = _best_of(scalar, repeats)
+        tb = _best_of(batch, repeats)
+        print(f"{name:16s} scalar {n/ts:12,.0f} pts/s   batch {n/tb:12,.0f} pts/s   x{ts/tb:5.1f}")
+
+    fwd_err, inv_err, ok = verify_transform_grids()
+    print(f"grid max error: forward {fwd_err*1000:.2f} mm   inverse {inv_err*1000:.2f} mm   "
+          f"bound {GRID_MAX_ERROR_M*1000:.0f} mm {'OK' if ok else 'EXCEEDED'}")
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
@@ -4,8 +4,9 @@ package.name = surveymapsl
 package.domain = org.vithana
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas
+source.exclude_dirs = benchmarks,tests
 version = 4.1
-requirements = python3,kivy,ezdxf,jnius,android
+requirements = python3,kivy,numpy,ezdxf,jnius,android
 android.permissions = INTERNET,ACCESS_FINE_LOCATION,ACCESS_COARSE_LOCATION,READ_EXTERNAL_STORAGE,WRITE_EXTERNAL_STORAGE
 android.api = 33
 android.minapi = 24
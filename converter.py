@@ -0,0 +1,2071 @@
+"""
+SurveyMap SL conversion core: SLD99 ↔ WGS84 transforms and the DXF → KML/KMZ
+pipeline. No Kivy imports, so it runs on a server as well as inside the app.
+
+Usage:  python converter.py [options] <file | folder | glob> ...
+        python converter.py points [options] <points.csv> ...
+"""
+import os
+import io
+import csv
+import sys
+import math
+import glob
+import pickle
+import hashlib
+import shutil
+import struct
+import time
+import tempfile
+import threading
+import zipfile
+import tracemalloc
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from xml.sax.saxutils import escape
+
+# =====================================================
+# KML Layer Colors (Google Earth: AABBGGRR format)
+# =====================================================
+LAYER_COLORS_HEX = [
+    ("Red",    "ff0000ff"),
+    ("Blue",   "ffff0000"),
+    ("Green",  "ff00aa00"),
+    ("Yellow", "ff00ffff"),
+    ("Cyan",   "ffffff00"),
+    ("Purple", "ffaa00aa"),
+    ("Orange", "ff0066ff"),
+    ("White",  "ffffffff"),
+    ("Pink",   "ffaa44ff"),
+    ("Lime",   "ff00ff88"),
+]
+
+def get_layer_color(index):
+    return LAYER_COLORS_HEX[index % len(LAYER_COLORS_HEX)]
+
+# =====================================================
+# Datum Constants (computed once at import)
+# =====================================================
+# Everest 1830 (1937 Adjustment) ellipsoid
+SLD_A = 6377276.345; SLD_F = 1/300.8017; SLD_B = SLD_A*(1-SLD_F)
+SLD_E2 = (SLD_A**2-SLD_B**2)/SLD_A**2; SLD_EP2 = (SLD_A**2-SLD_B**2)/SLD_B**2
+
+# SLD99 Transverse Mercator projection
+TM_K0 = 0.9999238418; TM_FE = 500000.0; TM_FN = 500000.0
+TM_LON0 = math.radians(80.7717130833333); TM_LAT0 = math.radians(7.00047152777778)
+TM_MC0 = 1-SLD_E2/4-3*SLD_E2**2/64-5*SLD_E2**3/256; TM_MC2 = 3*SLD_E2/8+3*SLD_E2**2/32; TM_MC4 = 15*SLD_E2**3/256
+TM_MU_DEN = SLD_A*TM_MC0
+TM_M0 = SLD_A*(TM_MC0*TM_LAT0-TM_MC2*math.sin(2*TM_LAT0)+TM_MC4*math.sin(4*TM_LAT0))
+TM_E1 = (1-math.sqrt(1-SLD_E2))/(1+math.sqrt(1-SLD_E2))
+TM_FP2 = 3*TM_E1/2-27*TM_E1**3/32; TM_FP4 = 21*TM_E1**2/16; TM_FP6 = 151*TM_E1**3/96
+
+# 7-parameter Helmert (SLD99 → WGS84)
+H_DX = -0.293; H_DY = 766.95; H_DZ = 87.713
+H_RX = math.radians(-0.195704/3600); H_RY = math.radians(-1.695068/3600); H_RZ = math.radians(-3.473016/3600)
+H_DS = -0.039338/1e6
+
+# WGS84 ellipsoid
+WGS_A = 6378137.0; WGS_F = 1/298.257223563; WGS_E2 = 2*WGS_F-WGS_F**2
+WGS_B = WGS_A*(1-WGS_F); WGS_EP2 = (WGS_A**2-WGS_B**2)/WGS_B**2
+
+# NumPy is optional: batch transforms fall back to pure Python without it.
+# The Android build bundles it (buildozer.spec requirements).
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    np = None
+    HAVE_NUMPY = False
+
+# =====================================================
+# SLD99 → WGS84
+# =====================================================
+def sld99_to_wgs84(easting, northing):
+    a=SLD_A; e2=SLD_E2; e_prime2=SLD_EP2; k0=TM_K0
+    x=easting-TM_FE; y=northing-TM_FN
+    mu=(TM_M0+y/k0)/TM_MU_DEN
+    lat1=mu+TM_FP2*math.sin(2*mu)+TM_FP4*math.sin(4*mu)+TM_FP6*math.sin(6*mu)
+    s1=math.sin(lat1); c1=math.cos(lat1); t1=s1/c1
+    N1=a/math.sqrt(1-e2*s1**2); T1=t1**2
+    C1=e_prime2*c1**2; R1=a*(1-e2)/(1-e2*s1**2)**1.5
+    D=x/(N1*k0)
+    lat_l=lat1-(N1*t1/R1)*(D**2/2-(5+3*T1+10*C1-4*C1**2-9*e_prime2)*D**4/24+(61+90*T1+298*C1+45*T1**2-252*e_prime2-3*C1**2)*D**6/720)
+    lon_l=TM_LON0+(D-(1+2*T1+C1)*D**3/6+(5-2*C1+28*T1-3*C1**2+8*e_prime2+24*T1**2)*D**5/120)/c1
+    sl=math.sin(lat_l); cl=math.cos(lat_l); Nl=a/math.sqrt(1-e2*sl**2)
+    Xl=Nl*cl*math.cos(lon_l); Yl=Nl*cl*math.sin(lon_l); Zl=Nl*(1-e2)*sl
+    Xw=Xl+H_DX+H_DS*Xl+H_RZ*Yl-H_RY*Zl; Yw=Yl+H_DY-H_RZ*Xl+H_DS*Yl+H_RX*Zl; Zw=Zl+H_DZ+H_RY*Xl-H_RX*Yl+H_DS*Zl
+    aw=WGS_A; bw=WGS_B
+    p=math.sqrt(Xw**2+Yw**2); th=math.atan2(Zw*aw,p*bw)
+    lonw=math.atan2(Yw,Xw); latw=math.atan2(Zw+WGS_EP2*bw*math.sin(th)**3,p-WGS_E2*aw*math.cos(th)**3)
+    return math.degrees(lonw), math.degrees(latw)
+
+def sld99_to_wgs84_batch(eastings, northings):
+    """Transform many SLD99 points at once → (lons, lats).
+    Returns NumPy arrays when NumPy is available, otherwise lists."""
+    if not HAVE_NUMPY:
+        pairs = [sld99_to_wgs84(e, n) for e, n in zip(eastings, northings)]
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+
+    a=SLD_A; e2=SLD_E2; e_prime2=SLD_EP2; k0=TM_K0
+    x = np.asarray(eastings, dtype=np.float64) - TM_FE
+    y = np.asarray(northings, dtype=np.float64) - TM_FN
+    mu = (TM_M0 + y/k0) / TM_MU_DEN
+    lat1 = mu + TM_FP2*np.sin(2*mu) + TM_FP4*np.sin(4*mu) + TM_FP6*np.sin(6*mu)
+    s1 = np.sin(lat1); c1 = np.cos(lat1); t1 = s1/c1
+    w = 1 - e2*s1**2
+    N1 = a/np.sqrt(w); T1 = t1**2
+    C1 = e_prime2*c1**2; R1 = a*(1-e2)/(w*np.sqrt(w))
+    D = x/(N1*k0); D2 = D*D
+    lat_l = lat1-(N1*t1/R1)*(D2/2-(5+3*T1+10*C1-4*C1**2-9*e_prime2)*D2**2/24+(61+90*T1+298*C1+45*T1**2-252*e_prime2-3*C1**2)*D2**3/720)
+    lon_l = TM_LON0+(D-(1+2*T1+C1)*D*D2/6+(5-2*C1+28*T1-3*C1**2+8*e_prime2+24*T1**2)*D*D2**2/120)/c1
+
+    sl = np.sin(lat_l); cl = np.cos(lat_l); Nl = a/np.sqrt(1-e2*sl**2)
+    Xl = Nl*cl*np.cos(lon_l); Yl = Nl*cl*np.sin(lon_l); Zl = Nl*(1-e2)*sl
+    Xw = Xl+H_DX+H_DS*Xl+H_RZ*Yl-H_RY*Zl
+    Yw = Yl+H_DY-H_RZ*Xl+H_DS*Yl+H_RX*Zl
+    Zw = Zl+H_DZ+H_RY*Xl-H_RX*Yl+H_DS*Zl
+
+    aw=WGS_A; bw=WGS_B
+    p = np.hypot(Xw, Yw); th = np.arctan2(Zw*aw, p*bw)
+    lonw = np.arctan2(Yw, Xw)
+    latw = np.arctan2(Zw+WGS_EP2*bw*np.sin(th)**3, p-WGS_E2*aw*np.cos(th)**3)
+    return np.degrees(lonw), np.degrees(latw)
+
+# =====================================================
+# WGS84 → SLD99 (Inverse)
+# =====================================================
+def wgs84_to_sld99(lon, lat):
+    ae = SLD_A; ee2 = SLD_E2; ep2 = SLD_EP2
+
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    sw = math.sin(lat_rad); cw = math.cos(lat_rad)
+    Nw = WGS_A / math.sqrt(1 - WGS_E2 * sw**2)
+    Xw = Nw * cw * math.cos(lon_rad)
+    Yw = Nw * cw * math.sin(lon_rad)
+    Zw = Nw * (1 - WGS_E2) * sw
+
+    Xs = Xw - H_DX; Ys = Yw - H_DY; Zs = Zw - H_DZ
+    X_e = Xs - H_DS*Xs + H_RZ*Ys - H_RY*Zs
+    Y_e = Ys - H_RZ*Xs - H_DS*Ys + H_RX*Zs
+    Z_e = Zs + H_RY*Xs - H_RX*Ys - H_DS*Zs
+
+    p = math.sqrt(X_e**2 + Y_e**2)
+    th = math.atan2(Z_e * ae, p * SLD_B)
+    lat_e = math.atan2(Z_e + ep2 * SLD_B * math.sin(th)**3, p - ee2 * ae * math.cos(th)**3)
+    lon_e = math.atan2(Y_e, X_e)
+
+    se = math.sin(lat_e); ce = math.cos(lat_e); te = se / ce
+    A = (lon_e - TM_LON0) * ce
+    T = te**2
+    C = ep2 * ce**2
+    N = ae / math.sqrt(1 - ee2 * se**2)
+    M = ae * (TM_MC0*lat_e - TM_MC2*math.sin(2*lat_e) + TM_MC4*math.sin(4*lat_e))
+
+    Easting = TM_FE + TM_K0 * N * (A + (1-T+C)*A**3/6 + (5-18*T+T**2+72*C-58*ep2)*A**5/120)
+    Northing = TM_FN + TM_K0 * (M - TM_M0 + N * te * (A**2/2 + (5-T+9*C+4*C**2)*A**4/24 + (61-58*T+T**2+600*C-330*ep2)*A**6/720))
+
+    return Easting, Northing
+
+def wgs84_to_sld99_batch(lons, lats):
+    """Transform many WGS84 points at once → (eastings, northings).
+    Returns NumPy arrays when NumPy is available, otherwise lists."""
+    if not HAVE_NUMPY:
+        pairs = [wgs84_to_sld99(lo, la) for lo, la in zip(lons, lats)]
+        return [p[0] for p in pairs], [p[1] for p in pairs]
+
+    ae = SLD_A; ee2 = SLD_E2; ep2 = SLD_EP2
+    lat_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lons, dtype=np.float64))
+    sw = np.sin(lat_rad); cw = np.cos(lat_rad)
+    Nw = WGS_A / np.sqrt(1 - WGS_E2 * sw**2)
+    Xw = Nw * cw * np.cos(lon_rad)
+    Yw = Nw * cw * np.sin(lon_rad)
+    Zw = Nw * (1 - WGS_E2) * sw
+
+    Xs = Xw - H_DX; Ys = Yw - H_DY; Zs = Zw - H_DZ
+    X_e = Xs - H_DS*Xs + H_RZ*Ys - H_RY*Zs
+    Y_e = Ys - H_RZ*Xs - H_DS*Ys + H_RX*Zs
+    Z_e = Zs + H_RY*Xs - H_RX*Ys - H_DS*Zs
+
+    p = np.hypot(X_e, Y_e)
+    th = np.arctan2(Z_e * ae, p * SLD_B)
+    lat_e = np.arctan2(Z_e + ep2 * SLD_B * np.sin(th)**3, p - ee2 * ae * np.cos(th)**3)
+    lon_e = np.arctan2(Y_e, X_e)
+
+    se = np.sin(lat_e); ce = np.cos(lat_e); te = se / ce
+    A = (lon_e - TM_LON0) * ce; A2 = A*A
+    T = te**2
+    C = ep2 * ce**2
+    N = ae / np.sqrt(1 - ee2 * se**2)
+    M = ae * (TM_MC0*lat_e - TM_MC2*np.sin(2*lat_e) + TM_MC4*np.sin(4*lat_e))
+
+    Easting = TM_FE + TM_K0 * N * (A + (1-T+C)*A*A2/6 + (5-18*T+T**2+72*C-58*ep2)*A*A2**2/120)
+    Northing = TM_FN + TM_K0 * (M - TM_M0 + N * te * (A2/2 + (5-T+9*C+4*C**2)*A2**2/24 + (61-58*T+T**2+600*C-330*ep2)*A2**3/720))
+
+    return Easting, Northing
+
+# =====================================================
+# Fast Approximate Transforms (bilinear lookup grids)
+# =====================================================
+# Grids cover Sri Lanka with margin. Measured worst-case interpolation
+# error against the exact functions is ~3.5 mm (forward, 1 km nodes) and
+# ~4.2 mm (inverse, 0.01° nodes); verify_transform_grids() checks this bound.
+# Speed is only about 2x the exact functions, not 10x: per point the Python
+# call overhead dominates (~300k vs ~150k points/s when the grid object is
+# called directly), and in batch the exact NumPy path is already fast
+# (~4.6M vs ~2.2M points/s).
+GRID_MAX_ERROR_M = 0.005
+SLD99_GRID_EXTENT = (350000.0, 370000.0, 650000.0, 830000.0); SLD99_GRID_STEP = 1000.0
+WGS84_GRID_EXTENT = (79.4, 5.8, 82.0, 10.0); WGS84_GRID_STEP = 0.01
+GRID_FILE_VERSION = 1
+
+class TransformGrid:
+    """Regular grid of exact transform results, interpolated bilinearly.
+    Points outside the grid fall back to the exact function."""
+    _MAGIC = b'SLDG'
+    _HEADER = struct.Struct('<4sI3d2I')
+
+    def __init__(self, x0, y0, step, nx, ny, u, v, exact, exact_batch):
+        self.x0 = x0; self.y0 = y0; self.step = step; self.nx = nx; self.ny = ny
+        self.u = u; self.v = v
+        self.exact = exact; self.exact_batch = exact_batch
+        self._inv_step = 1.0 / step; self._imax = nx - 1; self._jmax = ny - 1
+        if HAVE_NUMPY:
+            self._U = np.frombuffer(u, dtype=np.float64).reshape(ny, nx)
+            self._V = np.frombuffer(v, dtype=np.float64).reshape(ny, nx)
+
+    @classmethod
+    def build(cls, exact, exact_batch, extent, step):
+        x0, y0, x1, y1 = extent
+        nx = int(round((x1 - x0) / step)) + 1; ny = int(round((y1 - y0) / step)) + 1
+        xs = [x0 + i * step for _ in range(ny) for i in range(nx)]
+        ys = [y0 + j * step for j in range(ny) for _ in range(nx)]
+        u, v = exact_batch(xs, ys)
+        return cls(x0, y0, step, nx, ny, array('d', u), array('d', v), exact, exact_batch)
+
+    def save(self, path):
+        tmp = path + '.part'
+        with open(tmp, 'wb') as f:
+            f.write(self._HEADER.pack(self._MAGIC, GRID_FILE_VERSION, self.x0, self.y0, self.step, self.nx, self.ny))
+            self.u.tofile(f); self.v.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, exact, exact_batch, extent, step):
+        """Read a saved grid; returns None if missing or built with other parameters."""
+        try:
+            with open(path, 'rb') as f:
+                magic, ver, x0, y0, st, nx, ny = cls._HEADER.unpack(f.read(cls._HEADER.size))
+                if magic != cls._MAGIC or ver != GRID_FILE_VERSION or (x0, y0, st) != (extent[0], extent[1], step):
+                    return None
+                u = array('d'); v = array('d')
+                u.fromfile(f, nx * ny); v.fromfile(f, nx * ny)
+            return cls(x0, y0, st, nx, ny, u, v, exact, exact_batch)
+        except (OSError, EOFError, struct.error):
+            return None
+
+    def __call__(self, x, y):
+        fx = (x - self.x0) * self._inv_step; fy = (y - self.y0) * self._inv_step
+        if not (0.0 <= fx < self._imax and 0.0 <= fy < self._jmax):
+            return self.exact(x, y)
+        i = int(fx); j = int(fy); tx = fx - i; ty = fy - j
+        k = j * self.nx + i; k2 = k + self.nx
+        u = self.u; v = self.v
+        u0 = u[k]; u2 = u[k2]; v0 = v[k]; v2 = v[k2]
+        u0 += (u[k+1] - u0) * tx; u2 += (u[k2+1] - u2) * tx
+        v0 += (v[k+1] - v0) * tx; v2 += (v[k2+1] - v2) * tx
+        return u0 + (u2 - u0) * ty, v0 + (v2 - v0) * ty
+
+    def batch(self, xs, ys):
+        if not HAVE_NUMPY:
+            pairs = [self(x, y) for x, y in zip(xs, ys)]
+            return [p[0] for p in pairs], [p[1] for p in pairs]
+        x = np.asarray(xs, dtype=np.float64); y = np.asarray(ys, dtype=np.float64)
+        fx = (x - self.x0) / self.step; fy = (y - self.y0) / self.step
+        inside = (fx >= 0) & (fx < self.nx - 1) & (fy >= 0) & (fy < self.ny - 1)
+        i = np.where(inside, fx, 0).astype(np.intp); j = np.where(inside, fy, 0).astype(np.intp)
+        tx = fx - i; ty = fy - j
+        U = self._U; V = self._V
+        u = (U[j, i] * (1 - tx) + U[j, i+1] * tx) * (1 - ty) + (U[j+1, i] * (1 - tx) + U[j+1, i+1] * tx) * ty
+        v = (V[j, i] * (1 - tx) + V[j, i+1] * tx) * (1 - ty) + (V[j+1, i] * (1 - tx) + V[j+1, i+1] * tx) * ty
+        if not inside.all():
+            out = ~inside
+            u[out], v[out] = self.exact_batch(x[out], y[out])
+        return u, v
+
+_grid_lock = threading.Lock()
+_grids = {}
+
+def transform_grids(cache_dir=None):
+    """(SLD99→WGS84, WGS84→SLD99) grids, built on first use and cached
+    as .bin files in `cache_dir` when one is given."""
+    # Built grids are never replaced, so reading them needs no lock
+    if _grids: return _grids['fwd'], _grids['inv']
+    with _grid_lock:
+        if not _grids:
+            specs = [('fwd', 'sld99_to_wgs84.grid', sld99_to_wgs84, sld99_to_wgs84_batch, SLD99_GRID_EXTENT, SLD99_GRID_STEP),
+                     ('inv', 'wgs84_to_sld99.grid', wgs84_to_sld99, wgs84_to_sld99_batch, WGS84_GRID_EXTENT, WGS84_GRID_STEP)]
+            for name, fname, exact, exact_batch, extent, step in specs:
+                path = os.path.join(cache_dir, fname) if cache_dir else None
+                grid = TransformGrid.load(path, exact, exact_batch, extent, step) if path else None
+                if grid is None:
+                    grid = TransformGrid.build(exact, exact_batch, extent, step)
+                    if path:
+                        try: os.makedirs(cache_dir, exist_ok=True); grid.save(path)
+                        except OSError: pass
+                _grids[name] = grid
+        return _grids['fwd'], _grids['inv']
+
+def sld99_to_wgs84_fast(easting, northing, cache_dir=None):
+    """Approximate sld99_to_wgs84 (error ≤ GRID_MAX_ERROR_M) for live previews.
+    In per-point loops, call transform_grids()[0] directly instead."""
+    return transform_grids(cache_dir)[0](easting, northing)
+
+def wgs84_to_sld99_fast(lon, lat, cache_dir=None):
+    """Approximate wgs84_to_sld99 (error ≤ GRID_MAX_ERROR_M) for live previews.
+    In per-point loops, call transform_grids()[1] directly instead."""
+    return transform_grids(cache_dir)[1](lon, lat)
+
+def verify_transform_grids(samples=20000, seed=7, cache_dir=None):
+    """Compare the grids with the exact functions at random points.
+    Returns (forward_max_error_m, inverse_max_error_m, within_bound)."""
+    import random
+    rnd = random.Random(seed)
+    fwd, inv = transform_grids(cache_dir)
+    fwd_err = 0.0; inv_err = 0.0
+    for _ in range(samples):
+        e = rnd.uniform(SLD99_GRID_EXTENT[0], SLD99_GRID_EXTENT[2]); n = rnd.uniform(SLD99_GRID_EXTENT[1], SLD99_GRID_EXTENT[3])
+        lo, la = sld99_to_wgs84(e, n); glo, gla = fwd(e, n)
+        dy = math.radians(gla - la) * WGS_A; dx = math.radians(glo - lo) * WGS_A * math.cos(math.radians(la))
+        fwd_err = max(fwd_err, math.hypot(dx, dy))
+
+        lo = rnd.uniform(WGS84_GRID_EXTENT[0], WGS84_GRID_EXTENT[2]); la = rnd.uniform(WGS84_GRID_EXTENT[1], WGS84_GRID_EXTENT[3])
+        e, n = wgs84_to_sld99(lo, la); ge, gn = inv(lo, la)
+        inv_err = max(inv_err, math.hypot(ge - e, gn - n))
+    return fwd_err, inv_err, max(fwd_err, inv_err) <= GRID_MAX_ERROR_M
+
+# =====================================================
+# DXF Geometry Extraction (parsed once, shared by scan & convert)
+# =====================================================
+CURVE_TYPES = ('LWPOLYLINE', 'POLYLINE', 'LINE', 'ARC', 'CIRCLE', 'ELLIPSE', 'SPLINE')
+CONVERTIBLE_TYPES = CURVE_TYPES + ('INSERT',)
+# Largest gap (metres) allowed between a curve and the chords replacing it
+CHORD_TOLERANCE_M = 0.1
+
+def dxf_file_key(path):
+    """Cache key for a DXF file: changes whenever the file is replaced or edited."""
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+class DXFGeometry:
+    """Compact copy of the convertible entities of a drawing.
+    Vertices live in two flat float arrays; `parts` holds one
+    (layer, start, count) record per entity, in modelspace order,
+    and `handles` the matching DXF entity handles. `dropped` counts the
+    malformed entities that could not be read."""
+    __slots__ = ('key', 'xs', 'ys', 'parts', 'handles', 'layer_counts', 'index', 'dropped')
+
+    def __init__(self, key=None):
+        self.key = key
+        self.xs = array('d'); self.ys = array('d')
+        self.parts = []
+        self.handles = []
+        self.layer_counts = {}
+        self.index = None
+        self.dropped = 0
+
+    def spatial_index(self):
+        """SpatialIndex over the parts' SLD99 boxes, built on first use and kept with the geometry."""
+        if self.index is None: self.index = SpatialIndex.from_parts(self.xs, self.ys, self.parts)
+        return self.index
+
+    def add(self, layer, pts, handle=None):
+        self.parts.append((layer, len(self.xs), len(pts)))
+        self.handles.append(handle)
+        for p in pts:
+            self.xs.append(p[0]); self.ys.append(p[1])
+
+    def add_transformed(self, layer, local, m, handle=None, first=0):
+        """Append every part of the DXFGeometry `local` mapped through the
+        ezdxf Matrix44 `m` (xy only). Parts get handles "<handle>:<first + i>",
+        numbered within the INSERT so edits elsewhere keep them stable."""
+        a, b = m.get_row(0)[:2]; c, d = m.get_row(1)[:2]; tx, ty = m.get_row(3)[:2]
+        base = len(self.xs)
+        if HAVE_NUMPY:
+            lx = np.frombuffer(local.xs, dtype=np.float64); ly = np.frombuffer(local.ys, dtype=np.float64)
+            self.xs.frombytes((lx * a + ly * c + tx).tobytes())
+            self.ys.frombytes((lx * b + ly * d + ty).tobytes())
+        else:
+            for x, y in zip(local.xs, local.ys):
+                self.xs.append(x * a + y * c + tx); self.ys.append(x * b + y * d + ty)
+        for _, start, count in local.parts:
+            self.parts.append((layer, base + start, count))
+        self.handles.extend(f"{handle}:{first + i}" if handle else None for i in range(len(local.parts)))
+
+def decode_layer_name(ln):
+    """R12 to R2004 files spell non-ANSI characters in names as \\U+XXXX,
+    which ezdxf keeps as read; the Layer Manager works with the real text."""
+    if '\\U+' not in ln: return ln
+    try:
+        from ezdxf.lldxf.encoding import decode_dxf_unicode
+    except ImportError:
+        return ln
+    return decode_dxf_unicode(ln)
+
+def entity_layer(e):
+    return decode_layer_name(e.dxf.layer) if hasattr(e.dxf, 'layer') else '0'
+
+def _closed(pts):
+    # Points may be tuples or ezdxf Vec3s (which cannot be sliced)
+    if len(pts) > 2 and (pts[0][0], pts[0][1]) != (pts[-1][0], pts[-1][1]): pts.append(pts[0])
+    return pts
+
+def _entity_errors():
+    """Exceptions raised by a malformed entity: it is skipped and counted as
+    dropped. Anything else is a bug and propagates."""
+    from ezdxf import DXFError
+    return (DXFError, ValueError, ArithmeticError, IndexError)
+
+def entity_points(e, tolerance=CHORD_TOLERANCE_M):
+    """Vertices of a convertible entity. Arcs, circles, ellipses, splines
+    and bulged polyline segments are flattened adaptively: each gets only
+    as many chords as needed to stay within `tolerance` metres of the curve."""
+    etype = e.dxftype()
+    if etype == 'LINE': return [e.dxf.start, e.dxf.end]
+    if etype == 'LWPOLYLINE':
+        if e.has_arc: return _flatten_path(e, tolerance)
+        pts = list(e.get_points('xy'))
+        return _closed(pts) if e.closed else pts
+    if etype == 'POLYLINE':
+        if e.is_2d_polyline and e.has_arc: return _flatten_path(e, tolerance)
+        pts = list(e.points())
+        return _closed(pts) if e.is_closed and (e.is_2d_polyline or e.is_3d_polyline) else pts
+    if etype in ('ARC', 'CIRCLE'): return list(e.flattening(tolerance))
+    return list(e.flattening(tolerance, segments=4))   # ELLIPSE, SPLINE
+
+def _flatten_path(e, tolerance):
+    from ezdxf import path
+    return list(path.make_path(e).flattening(tolerance, segments=4))
+
+def extract_geometry(entities, key=None, progress=None, tolerance=CHORD_TOLERANCE_M, blocks=None):
+    """Pull the vertices of convertible entities out of an entity iterable.
+    INSERTs are expanded through the BlockLibrary `blocks` (skipped without one)."""
+    geom = DXFGeometry(key)
+    counts = geom.layer_counts
+    errors = _entity_errors()
+    for i, e in enumerate(entities):
+        if progress and i % 5000 == 0: progress(i)
+        etype = e.dxftype()
+        if etype not in CONVERTIBLE_TYPES: continue
+        try:
+            ln = entity_layer(e)
+            counts[ln] = counts.get(ln, 0) + 1
+            if etype == 'INSERT':
+                if blocks: blocks.expand(e, geom, ln, e.dxf.handle)
+                continue
+            pts = entity_points(e, tolerance)
+            if len(pts) < 2: continue
+            geom.add(ln, pts, e.dxf.handle)
+        except errors: geom.dropped += 1
+    return geom
+
+# =====================================================
+# Block Expansion (INSERT / MINSERT)
+# =====================================================
+# Nesting depth at which block references stop being followed
+BLOCK_MAX_DEPTH = 16
+
+def insert_matrices(e):
+    """One ezdxf Matrix44 per placed instance of an INSERT (every unique
+    grid cell of a MINSERT), mapping base-point-relative block coordinates
+    to the INSERT's coordinate system; same construction as Insert.matrix44()."""
+    from ezdxf.math import Matrix44, Vec3, X_AXIS, Y_AXIS
+    dxf = e.dxf
+    ocs = e.ocs(); uz = ocs.uz
+    m = Matrix44.ucs(ux=Vec3(ocs.to_wcs(X_AXIS)) * dxf.xscale, uy=Vec3(ocs.to_wcs(Y_AXIS)) * dxf.yscale, uz=uz * dxf.zscale)
+    if dxf.rotation: m *= Matrix44.axis_rotate(uz, math.radians(dxf.rotation))
+    insert = Vec3(dxf.get('insert', (0, 0, 0)))
+    rows = max(dxf.get('row_count', 1), 1); cols = max(dxf.get('column_count', 1), 1)
+    row_sp = dxf.get('row_spacing', 0.0); col_sp = dxf.get('column_spacing', 0.0)
+    seen = set()
+    for r in range(rows):
+        for c in range(cols):
+            off = (c * col_sp, r * row_sp)
+            if off in seen: continue
+            seen.add(off)
+            o = Vec3(off)
+            if dxf.rotation: o = o.rotate_deg(dxf.rotation)
+            mi = m.copy(); mi.set_row(3, ocs.to_wcs(insert + o).xyz)
+            yield mi
+
+def read_block_definitions(path):
+    """{name: (base_point, entities)} for the BLOCKS section of `path`, read
+    through iterdxf so streaming conversions never load the whole drawing."""
+    from ezdxf.addons import iterdxf
+    doc = iterdxf.opendxf(path)
+    try:
+        start = doc.sections.get('BLOCKS')
+        if start is None: return {}
+        link = iterdxf.entity_linker()
+        blocks = {}; current = None
+        for e in doc.load_entities(start + 1, set(CONVERTIBLE_TYPES) | {'BLOCK', 'ENDBLK', 'VERTEX', 'SEQEND'}):
+            etype = e.dxftype()
+            if etype == 'BLOCK':
+                current = []; blocks[e.dxf.name] = (e.dxf.base_point, current)
+            elif etype == 'ENDBLK':
+                current = None
+            elif current is not None and not link(e) and etype in CONVERTIBLE_TYPES:
+                current.append(e)
+        return blocks
+    finally:
+        doc.close()
+
+class BlockLibrary:
+    """Block definitions flattened once, on first use, into base-point-relative
+    DXFGeometry (nested INSERTs included) that every INSERT of the block
+    reuses; each instance only costs its matrix. `definitions(name)` returns
+    (base_point, entities) or None. Curves are flattened in block units to
+    `tolerance` divided by the INSERT's largest scale factor (rounded down to
+    a power of two, so a few scales share one flattening). Expanded geometry
+    is booked on the layer of the top-level INSERT, so the Layer Manager
+    treats a symbol as one. `dropped` counts malformed entities inside block
+    definitions."""
+
+    def __init__(self, definitions, tolerance=CHORD_TOLERANCE_M):
+        self._definitions = definitions
+        self.tolerance = tolerance
+        self._local = {}
+        self._building = []
+        self.dropped = 0
+
+    @classmethod
+    def from_doc(cls, doc, tolerance=CHORD_TOLERANCE_M):
+        def definitions(name):
+            layout = doc.blocks.get(name)
+            return None if layout is None else (layout.block.dxf.base_point, layout)
+        return cls(definitions, tolerance)
+
+    @classmethod
+    def from_file(cls, path, tolerance=CHORD_TOLERANCE_M):
+        defs = []
+        def definitions(name):
+            if not defs: defs.append(read_block_definitions(path))
+            return defs[0].get(name)
+        return cls(definitions, tolerance)
+
+    def local(self, name, tolerance=None):
+        """The geometry of block `name` flattened to `tolerance` block units
+        (default self.tolerance), or None if it is missing, empty or refers
+        to itself."""
+        tolerance = tolerance or self.tolerance
+        key = (name, tolerance)
+        if key in self._local: return self._local[key]
+        if name in self._building or len(self._building) >= BLOCK_MAX_DEPTH: return None
+        d = self._definitions(name)
+        geom = None
+        if d is not None:
+            base, entities = d
+            geom = DXFGeometry()
+            errors = _entity_errors()
+            self._building.append(name)
+            try:
+                for e in entities:
+                    try:
+                        if e.dxftype() == 'INSERT':
+                            self.expand(e, geom, '0', tolerance=tolerance)
+                        elif e.dxftype() in CURVE_TYPES:
+                            pts = entity_points(e, tolerance)
+                            if len(pts) >= 2: geom.add('0', pts)
+                    except errors: self.dropped += 1
+            finally:
+                self._building.pop()
+            if not geom.parts:
+                geom = None
+            elif base[0] or base[1]:
+                geom.xs = array('d', (x - base[0] for x in geom.xs)); geom.ys = array('d', (y - base[1] for y in geom.ys))
+        self._local[key] = geom
+        return geom
+
+    def expand(self, insert, geom, layer, handle=None, tolerance=None):
+        """Append every instance of `insert` to `geom` on `layer`, with
+        curves within `tolerance` (default self.tolerance) of the placed shape."""
+        tolerance = tolerance or self.tolerance
+        scale = max(abs(insert.dxf.get('xscale', 1.0)), abs(insert.dxf.get('yscale', 1.0)))
+        if scale > 0: tolerance = 2.0 ** math.floor(math.log2(tolerance / scale))
+        local = self.local(insert.dxf.name, tolerance)
+        if local is None: return
+        for k, m in enumerate(insert_matrices(insert)):
+            geom.add_transformed(layer, local, m, handle, k * len(local.parts))
+
+# =====================================================
+# Low-memory Streaming Ingestion
+# =====================================================
+# Vertices buffered before each transform + write in streaming mode
+STREAM_CHUNK_VERTICES = 50000
+# Formatted vertices the pure-Python VertexCache keeps between streamed chunks.
+# An LRU entry costs about 300 B, so this caps it near 4 MB.
+LOW_MEMORY_CACHE_VERTICES = STREAM_CHUNK_VERTICES // 4
+
+def iter_dxf_entities(path):
+    """Yield convertible modelspace entities one at a time through ezdxf's
+    iterdxf add-on. Blocks, objects and other entity types are never loaded."""
+    from ezdxf.addons import iterdxf
+    return iterdxf.modelspace(path, types=CONVERTIBLE_TYPES)
+
+def count_layers(entities, progress=None):
+    counts = {}
+    for i, e in enumerate(entities):
+        if progress and i % 5000 == 0: progress(i)
+        ln = entity_layer(e)
+        counts[ln] = counts.get(ln, 0) + 1
+    return counts
+
+def iter_geometry_chunks(entities, active_layers=None, chunk_vertices=STREAM_CHUNK_VERTICES, stats=None,
+                         tolerance=CHORD_TOLERANCE_M, blocks=None):
+    """Group streamed entities into DXFGeometry chunks of about
+    `chunk_vertices` vertices; only one chunk is alive at a time.
+    INSERTs are expanded through the BlockLibrary `blocks`. Malformed
+    entities are counted in stats['dropped']."""
+    chunk = DXFGeometry()
+    errors = _entity_errors()
+    for e in entities:
+        try:
+            ln = entity_layer(e)
+            if active_layers is not None and ln not in active_layers:
+                if stats is not None: stats['skipped'] = stats.get('skipped', 0) + 1
+                continue
+            if e.dxftype() == 'INSERT':
+                if blocks: blocks.expand(e, chunk, ln, e.dxf.handle)
+            else:
+                pts = entity_points(e, tolerance)
+                if len(pts) < 2: continue
+                chunk.add(ln, pts)
+        except errors:
+            if stats is not None: stats['dropped'] = stats.get('dropped', 0) + 1
+            continue
+        if len(chunk.xs) >= chunk_vertices:
+            yield chunk
+            chunk = DXFGeometry()
+    if chunk.parts:
+        yield chunk
+
+# =====================================================
+# Fast Layer Scan (raw DXF tags)
+# =====================================================
+LAYER_SCAN_REPORT_EVERY = 20000
+
+def _dxf_text_encoding(acadver, codepage):
+    if acadver >= b'AC1021': return 'utf-8'
+    try:
+        from ezdxf.tools.codepage import toencoding
+        return toencoding(codepage.decode('ascii', 'replace'))
+    except ImportError:
+        return 'cp1252'
+
+def _decode_layer_counts(raw, encoding):
+    counts = {}
+    for name, n in raw.items():
+        ln = decode_layer_name(name.decode(encoding, 'replace'))
+        counts[ln] = counts.get(ln, 0) + n
+    return counts
+
+def scan_layer_counts(path, progress=None, report_every=LAYER_SCAN_REPORT_EVERY):
+    """Count convertible modelspace entities per layer, matching
+    extract_geometry().layer_counts, without building any entities: only
+    group codes 0 (type), 8 (layer) and 67 (paper space) of the ENTITIES
+    section are looked at. `progress(counts, fraction)` receives a snapshot
+    every `report_every` entities. Raises ValueError for binary DXF."""
+    types = {t.encode('ascii') for t in CONVERTIBLE_TYPES}
+    total = os.path.getsize(path) or 1
+    raw = {}
+    acadver = b'AC1009'; codepage = b'ANSI_1252'; encoding = 'cp1252'
+    with open(path, 'rb') as f:
+        if f.read(18) == b'AutoCAD Binary DXF':
+            raise ValueError("binary DXF is not supported by the fast layer scan")
+        f.seek(0)
+        it = iter(f)
+        var = None; in_section = False
+        for code in it:
+            code = code.strip(); value = next(it, b'').strip()
+            if code == b'9': var = value
+            elif code == b'1' and var == b'$ACADVER': acadver = value
+            elif code == b'3' and var == b'$DWGCODEPAGE': codepage = value
+            elif code == b'2' and in_section and value == b'ENTITIES': break
+            in_section = code == b'0' and value == b'SECTION'
+        else:
+            return {}
+        encoding = _dxf_text_encoding(acadver, codepage)
+
+        n = 0; etype = None; layer = b'0'; paper = False
+        for code in it:
+            value = next(it, b'')
+            code = code.strip()
+            if code == b'0':
+                if etype is not None and not paper:
+                    raw[layer] = raw.get(layer, 0) + 1
+                value = value.strip()
+                if value == b'ENDSEC' or value == b'EOF': break
+                etype = value if value in types else None
+                layer = b'0'; paper = False
+                n += 1
+                if progress and n % report_every == 0:
+                    progress(_decode_layer_counts(raw, encoding), f.tell() / total)
+            elif etype is not None:
+                if code == b'8': layer = value.rstrip(b'\r\n')
+                elif code == b'67': paper = value.strip() == b'1'
+    return _decode_layer_counts(raw, encoding)
+
+# =====================================================
+# Line Simplification (Douglas–Peucker, SLD99 metres)
+# =====================================================
+# Spans at least this long use the NumPy distance kernel
+SIMPLIFY_NUMPY_MIN = 32
+
+def simplify_indices(xs, ys, start, count, tolerance):
+    """Indices (absolute, ascending) of the vertices Douglas–Peucker keeps
+    for xs/ys[start:start + count]: every dropped vertex lies within
+    `tolerance` of the simplified line. Closed rings keep at least 4 vertices."""
+    last = start + count - 1
+    if count <= 2 or tolerance <= 0: return range(start, last + 1)
+    keep = bytearray(count); keep[0] = keep[-1] = 1
+    vec = HAVE_NUMPY and count >= SIMPLIFY_NUMPY_MIN
+    if vec:
+        ax = np.frombuffer(xs, dtype=np.float64)[start:last + 1]; ay = np.frombuffer(ys, dtype=np.float64)[start:last + 1]
+    stack = [(0, count - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2: continue
+        x0 = xs[start + i]; y0 = ys[start + i]; dx = xs[start + j] - x0; dy = ys[start + j] - y0
+        seg = math.hypot(dx, dy)
+        if vec and j - i >= SIMPLIFY_NUMPY_MIN:
+            px = ax[i + 1:j] - x0; py = ay[i + 1:j] - y0
+            d = np.abs(px * dy - py * dx) / seg if seg else np.hypot(px, py)
+            k = int(d.argmax()); dmax = float(d[k]); k += i + 1
+        else:
+            dmax = -1.0; k = i
+            for m in range(i + 1, j):
+                px = xs[start + m] - x0; py = ys[start + m] - y0
+                dm = abs(px * dy - py * dx) / seg if seg else math.hypot(px, py)
+                if dm > dmax: dmax = dm; k = m
+        if dmax > tolerance:
+            keep[k] = 1
+            stack.append((i, k)); stack.append((k, j))
+    kept = [start + m for m in range(count) if keep[m]]
+    closed = xs[start] == xs[last] and ys[start] == ys[last]
+    return range(start, last + 1) if closed and len(kept) < 4 else kept
+
+def simplify_parts(parts, xs, ys, tolerance_for):
+    """Simplify every part whose layer has a tolerance (`tolerance_for(layer)`
+    in metres, 0 = keep as is). Returns (parts, xs, ys, removed vertices);
+    the input is returned unchanged when no layer is simplified."""
+    if not any(tolerance_for(ln) > 0 for ln, _, _ in parts): return parts, xs, ys, 0
+    nxs = array('d'); nys = array('d'); nparts = []; removed = 0
+    for ln, start, count in parts:
+        tol = tolerance_for(ln)
+        n0 = len(nxs)
+        if tol > 0:
+            idx = simplify_indices(xs, ys, start, count, tol)
+            if isinstance(idx, range):
+                nxs.extend(xs[start:start + count]); nys.extend(ys[start:start + count])
+            else:
+                nxs.extend(xs[m] for m in idx); nys.extend(ys[m] for m in idx)
+        else:
+            nxs.extend(xs[start:start + count]); nys.extend(ys[start:start + count])
+        nparts.append((ln, n0, len(nxs) - n0))
+        removed += count - (len(nxs) - n0)
+    return nparts, nxs, nys, removed
+
+def layer_simplify_tolerances(layer_data, default=0.0):
+    """tolerance_for(layer) from the Layer Manager's per-layer 'simplify'
+    values (metres), falling back to `default`."""
+    per_layer = {ln: ld['simplify'] for ln, ld in (layer_data or {}).items() if ld.get('simplify') is not None}
+    return lambda ln: per_layer.get(ln, default)
+
+# =====================================================
+# Spatial Index + Clip Filter (SLD99 metres)
+# =====================================================
+# Aim for about this many parts per grid cell
+SPATIAL_CELL_PARTS = 8
+# Parts whose box spans more cells than this are checked on every query instead
+SPATIAL_MAX_CELLS = 64
+
+def part_bounds(xs, ys, parts):
+    """array('d') of xmin, ymin, xmax, ymax for each (layer, start, count) part."""
+    out = array('d')
+    if not parts: return out
+    if HAVE_NUMPY:
+        starts = np.fromiter((s for _, s, _ in parts), dtype=np.int64, count=len(parts))
+        counts = np.fromiter((c for _, _, c in parts), dtype=np.int64, count=len(parts))
+        # reduceat needs the parts to tile the arrays back to back
+        if counts.min() > 0 and starts[-1] + counts[-1] == len(xs) and np.array_equal(starts[1:], starts[:-1] + counts[:-1]):
+            X = np.frombuffer(xs, dtype=np.float64)[starts[0]:]; Y = np.frombuffer(ys, dtype=np.float64)[starts[0]:]
+            at = starts - starts[0]
+            b = np.column_stack((np.minimum.reduceat(X, at), np.minimum.reduceat(Y, at),
+                                 np.maximum.reduceat(X, at), np.maximum.reduceat(Y, at)))
+            out.frombytes(b.tobytes())
+            return out
+    for _, start, count in parts:
+        px = xs[start:start + count]; py = ys[start:start + count]
+        out.extend((min(px), min(py), max(px), max(py)))
+    return out
+
+class SpatialIndex:
+    """Uniform grid over part bounding boxes. Each part is listed in every
+    cell its box touches; very large parts (boundaries, grid lines) are kept
+    aside and tested on every query."""
+
+    def __init__(self, bounds, cell=None):
+        self.bounds = bounds
+        n = len(bounds) // 4
+        self.cells = {}; self.large = []
+        if not n:
+            self.x0 = self.y0 = 0.0; self.cell = 1.0
+            return
+        x0 = min(bounds[0::4]); y0 = min(bounds[1::4]); x1 = max(bounds[2::4]); y1 = max(bounds[3::4])
+        if cell is None: cell = max(math.sqrt(max(x1 - x0, 1.0) * max(y1 - y0, 1.0) * SPATIAL_CELL_PARTS / n), 1.0)
+        self.x0 = x0; self.y0 = y0; self.cell = cell
+        cells = self.cells
+        for i in range(n):
+            j = 4 * i
+            cx0, cy0, cx1, cy1 = self._cell_range(bounds[j], bounds[j + 1], bounds[j + 2], bounds[j + 3])
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > SPATIAL_MAX_CELLS:
+                self.large.append(i); continue
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    c = cells.get((cx, cy))
+                    if c is None: cells[(cx, cy)] = [i]
+                    else: c.append(i)
+
+    @classmethod
+    def from_parts(cls, xs, ys, parts, cell=None):
+        return cls(part_bounds(xs, ys, parts), cell)
+
+    def _cell_range(self, x0, y0, x1, y1):
+        c = self.cell
+        return (int((x0 - self.x0) // c), int((y0 - self.y0) // c), int((x1 - self.x0) // c), int((y1 - self.y0) // c))
+
+    def query(self, box):
+        """Sorted indexes of the parts whose box overlaps `box` (xmin, ymin, xmax, ymax)."""
+        qx0, qy0, qx1, qy1 = box
+        cx0, cy0, cx1, cy1 = self._cell_range(qx0, qy0, qx1, qy1)
+        found = set(self.large)
+        cells = self.cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            for (cx, cy), ids in cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1: found.update(ids)
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    ids = cells.get((cx, cy))
+                    if ids: found.update(ids)
+        b = self.bounds
+        return sorted(i for i in found if b[4 * i] <= qx1 and b[4 * i + 2] >= qx0 and b[4 * i + 1] <= qy1 and b[4 * i + 3] >= qy0)
+
+def _segments_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    """True when segment a-b touches segment c-d."""
+    def orient(px, py, qx, qy, rx, ry):
+        v = (qx - px) * (ry - py) - (qy - py) * (rx - px)
+        return (v > 0) - (v < 0)
+    o1 = orient(ax, ay, bx, by, cx, cy); o2 = orient(ax, ay, bx, by, dx, dy)
+    o3 = orient(cx, cy, dx, dy, ax, ay); o4 = orient(cx, cy, dx, dy, bx, by)
+    if o1 != o2 and o3 != o4: return True
+    # Collinear overlap
+    return ((o1 == 0 and min(ax, bx) <= cx <= max(ax, bx) and min(ay, by) <= cy <= max(ay, by)) or
+            (o2 == 0 and min(ax, bx) <= dx <= max(ax, bx) and min(ay, by) <= dy <= max(ay, by)) or
+            (o3 == 0 and min(cx, dx) <= ax <= max(cx, dx) and min(cy, dy) <= ay <= max(cy, dy)) or
+            (o4 == 0 and min(cx, dx) <= bx <= max(cx, dx) and min(cy, dy) <= by <= max(cy, dy)))
+
+def _point_in_ring(x, y, rx, ry):
+    """Even-odd test of (x, y) against the ring rx/ry (closing vertex optional)."""
+    inside = False; n = len(rx); j = n - 1
+    for i in range(n):
+        if (ry[i] > y) != (ry[j] > y) and x < (rx[j] - rx[i]) * (y - ry[i]) / (ry[j] - ry[i]) + rx[i]:
+            inside = not inside
+        j = i
+    return inside
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    dx = bx - ax; dy = by - ay
+    L = dx * dx + dy * dy
+    t = 0.0 if L == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / L))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+class ClipRegion:
+    """Export area in SLD99 metres: a polygon (rectangles included) or a
+    circle. A part intersects it when its linework enters the area, or when
+    it is a closed ring that surrounds the area."""
+
+    def __init__(self, polygon=None, centre=None, radius=None):
+        if polygon is not None:
+            pts = [(float(x), float(y)) for x, y in polygon]
+            if len(pts) > 1 and pts[0] == pts[-1]: pts.pop()
+            if len(pts) < 3: raise ValueError("a clip polygon needs at least 3 vertices")
+            self.px = [p[0] for p in pts]; self.py = [p[1] for p in pts]
+            self.centre = None; self.radius = None
+            self.bounds = (min(self.px), min(self.py), max(self.px), max(self.py))
+        else:
+            if radius is None or radius <= 0: raise ValueError("a clip radius must be positive")
+            self.px = self.py = None
+            self.centre = (float(centre[0]), float(centre[1])); self.radius = float(radius)
+            cx, cy = self.centre
+            self.bounds = (cx - radius, cy - radius, cx + radius, cy + radius)
+
+    @classmethod
+    def rect(cls, x0, y0, x1, y1):
+        x0, x1 = sorted((x0, x1)); y0, y1 = sorted((y0, y1))
+        return cls([(x0, y0), (x1, y0), (x1, y1), (x0, y1)])
+
+    @classmethod
+    def circle(cls, east, north, radius):
+        return cls(centre=(east, north), radius=radius)
+
+    @classmethod
+    def from_points_file(cls, path):
+        """Polygon from a CSV/TXT of SLD99 vertices: 'E,N' rows, or 'id,E,N,...'
+        rows as used by the point converter. Rows that do not parse are skipped."""
+        delimiter, header = sniff_point_format(path)
+        pts = []
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+            rows = iter_point_rows(f, delimiter)
+            if header: next(rows, None)
+            for row in rows:
+                x_col, y_col = (0, 1) if len(row) == 2 else (1, 2)
+                if len(row) <= y_col: continue
+                x = _to_float(row[x_col]); y = _to_float(row[y_col])
+                if x is not None and y is not None: pts.append((x, y))
+        return cls(pts)
+
+    def describe(self):
+        if self.centre: return f"{self.radius:g} m around E {self.centre[0]:.1f} N {self.centre[1]:.1f}"
+        w, s, e, n = self.bounds
+        return f"{len(self.px)}-vertex area, {e - w:.0f} × {n - s:.0f} m"
+
+    def intersects(self, xs, ys, start, count):
+        """True when the part xs/ys[start:start + count] enters the area."""
+        px = xs[start:start + count]; py = ys[start:start + count]
+        w, s, e, n = self.bounds
+        if max(px) < w or min(px) > e or max(py) < s or min(py) > n: return False
+        closed = count > 3 and px[0] == px[-1] and py[0] == py[-1]
+        if self.centre:
+            cx, cy = self.centre; r = self.radius
+            if count == 1: return math.hypot(px[0] - cx, py[0] - cy) <= r
+            for k in range(count - 1):
+                if _segment_distance(cx, cy, px[k], py[k], px[k + 1], py[k + 1]) <= r: return True
+            return closed and _point_in_ring(cx, cy, px, py)
+        rx = self.px; ry = self.py; m = len(rx)
+        for k in range(count):
+            if _point_in_ring(px[k], py[k], rx, ry): return True
+        for k in range(count - 1):
+            ax, ay, bx, by = px[k], py[k], px[k + 1], py[k + 1]
+            if max(ax, bx) < w or min(ax, bx) > e or max(ay, by) < s or min(ay, by) > n: continue
+            for i in range(m):
+                if _segments_cross(ax, ay, bx, by, rx[i - 1], ry[i - 1], rx[i], ry[i]): return True
+        return closed and _point_in_ring(rx[0], ry[0], px, py)
+
+def parse_clip(spec, gps_fix=None):
+    """ClipRegion from text: 'E1,N1,E2,N2' (rectangle), 'E,N,R' (circle),
+    'R' (radius around `gps_fix`, an SLD99 (east, north)) or the path of a
+    polygon point file. Blank means no clipping (None)."""
+    spec = (spec or "").strip()
+    if not spec: return None
+    if os.path.isfile(spec): return ClipRegion.from_points_file(spec)
+    vals = [_to_float(v) for v in spec.replace(';', ',').replace(' ', ',').split(',') if v]
+    if None in vals or len(vals) not in (1, 3, 4):
+        raise ValueError(f"export area {spec!r}: use E1,N1,E2,N2 / E,N,radius / radius / polygon file")
+    if len(vals) == 4: return ClipRegion.rect(*vals)
+    if len(vals) == 3: return ClipRegion.circle(*vals)
+    if gps_fix is None: raise ValueError("a radius alone needs a GPS fix")
+    return ClipRegion.circle(gps_fix[0], gps_fix[1], vals[0])
+
+def clip_parts(parts, xs, ys, clip):
+    """Keep the parts that intersect `clip`. Returns (parts, xs, ys, dropped)."""
+    nxs = array('d'); nys = array('d'); nparts = []
+    for ln, start, count in parts:
+        if not clip.intersects(xs, ys, start, count): continue
+        nparts.append((ln, len(nxs), count))
+        nxs.extend(xs[start:start + count]); nys.extend(ys[start:start + count])
+    return nparts, nxs, nys, len(parts) - len(nparts)
+
+# =====================================================
+# Streaming KML Writer
+# =====================================================
+KML_MIME = "application/vnd.google-earth.kml+xml"
+KMZ_MIME = "application/vnd.google-earth.kmz"
+# zlib level for KMZ output: 1 = fastest, 9 = smallest
+KMZ_COMPRESS_LEVEL = 6
+
+def kml_mime_type(path):
+    return KMZ_MIME if path.lower().endswith('.kmz') else KML_MIME
+
+class KMLWriter:
+    """Writes a KML document piece by piece to a temp file in `folder`.
+    With kmz=True the text is deflated straight into the doc.kml entry of
+    a zip archive. commit(path) renames it into place atomically; discard() removes it."""
+
+    def __init__(self, folder, title="Survey Plan - SLD99", buffer_size=256 * 1024,
+                 kmz=False, compress_level=KMZ_COMPRESS_LEVEL):
+        self.kmz = kmz
+        self.ext = '.kmz' if kmz else '.kml'
+        fd, self.tmp_path = tempfile.mkstemp(prefix='.surveymap_', suffix=self.ext + '.part', dir=folder)
+        if kmz:
+            self._raw = os.fdopen(fd, 'wb')
+            self._zip = zipfile.ZipFile(self._raw, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level)
+            self._f = io.TextIOWrapper(io.BufferedWriter(self._zip.open('doc.kml', 'w', force_zip64=True), buffer_size), encoding='utf-8')
+        else:
+            self._raw = self._zip = None
+            self._f = os.fdopen(fd, 'w', encoding='utf-8', buffering=buffer_size)
+        self._f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n  <n>{title}</n>\n')
+        self.placemarks = 0
+
+    def add_line_style(self, style_id, color_kml, width=2):
+        self._f.write(f'  <Style id="{style_id}"><LineStyle><color>{color_kml}</color><width>{width}</width></LineStyle></Style>\n')
+
+    def add_linestring(self, name, style_ref, coords):
+        self._f.write(f'  <Placemark><n>{name}</n><styleUrl>#{style_ref}</styleUrl><LineString><tessellate>1</tessellate><coordinates>{coords}</coordinates></LineString></Placemark>\n')
+        self.placemarks += 1
+
+    def add_linestring_stream(self, name, style_ref, coord_chunks):
+        """Like add_linestring, with the coordinates written chunk by chunk."""
+        self._f.write(f'  <Placemark><n>{name}</n><styleUrl>#{style_ref}</styleUrl><LineString><tessellate>1</tessellate><coordinates>')
+        for chunk in coord_chunks: self._f.write(chunk)
+        self._f.write('</coordinates></LineString></Placemark>\n')
+        self.placemarks += 1
+
+    def add_point(self, name, lon, lat, style_ref=None):
+        style = f'<styleUrl>#{style_ref}</styleUrl>' if style_ref else ''
+        self._f.write(f'  <Placemark><n>{escape(name)}</n>{style}<Point><coordinates>{lon:.7f},{lat:.7f},0</coordinates></Point></Placemark>\n')
+        self.placemarks += 1
+
+    def close(self):
+        if not self._f.closed:
+            self._f.write('</Document>\n</kml>')
+            if self._zip is not None:
+                self._f.close(); self._zip.close()
+                self._raw.flush(); os.fsync(self._raw.fileno()); self._raw.close()
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+
+    def commit(self, path):
+        self.close()
+        try: os.chmod(self.tmp_path, 0o644)
+        except OSError: pass
+        os.replace(self.tmp_path, path)
+        return path
+
+    def discard(self):
+        for f in (self._f, self._zip, self._raw):
+            try:
+                if f is not None: f.close()
+            except Exception: pass
+        try: os.remove(self.tmp_path)
+        except OSError: pass
+
+def layer_style_id(layer_name):
+    return "layer_" + layer_name.replace(' ', '_').replace('/', '_')
+
+# =====================================================
+# Tiled KML (Regions + NetworkLinks)
+# =====================================================
+# A tile holding more placemarks than this is split into four children
+TILE_MAX_PLACEMARKS = 2000
+TILE_MAX_DEPTH = 12
+# Google Earth loads a tile once its Region covers this many screen pixels
+TILE_MIN_LOD_PIXELS = 256
+
+def coords_bounds(coords):
+    """(west, south, east, north) of a 'lon,lat,0 lon,lat,0 ...' coordinate string."""
+    v = coords.replace(' ', ',').split(',')
+    lons = [float(s) for s in v[0::3]]; lats = [float(s) for s in v[1::3]]
+    return min(lons), min(lats), max(lons), max(lats)
+
+def _kml_region(bounds, min_lod):
+    w, s, e, n = bounds
+    return (f'<Region><LatLonAltBox><north>{n:.7f}</north><south>{s:.7f}</south><east>{e:.7f}</east><west>{w:.7f}</west>'
+            f'</LatLonAltBox><Lod><minLodPixels>{min_lod}</minLodPixels><maxLodPixels>-1</maxLodPixels></Lod></Region>')
+
+def _kml_network_link(name, href, region=''):
+    return (f'  <NetworkLink><n>{name}</n>{region}<Link><href>{href}</href>'
+            f'<viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>\n')
+
+class TiledKMLWriter:
+    """KMLWriter look-alike for very large plans. Placemarks are spooled to a
+    temp file with their lon/lat boxes; close() sorts them into a quadtree,
+    each one going to the smallest tile that holds its whole box, and writes
+    every tile as its own KML with a <Region>/<Lod> and NetworkLinks to its
+    children. Google Earth then fetches only the tiles in view at the current
+    zoom. With kmz=True the root doc.kml and tiles/ go into one archive;
+    otherwise commit(path) writes the root KML and a '<name>_tiles' folder."""
+
+    def __init__(self, folder, title="Survey Plan - SLD99", kmz=False, compress_level=KMZ_COMPRESS_LEVEL,
+                 max_placemarks=TILE_MAX_PLACEMARKS, max_depth=TILE_MAX_DEPTH, min_lod_pixels=TILE_MIN_LOD_PIXELS):
+        self.folder = folder; self.title = title
+        self.kmz = kmz; self.compress_level = compress_level
+        self.ext = '.kmz' if kmz else '.kml'
+        self.max_placemarks = max_placemarks; self.max_depth = max_depth; self.min_lod_pixels = min_lod_pixels
+        fd, self._spool_path = tempfile.mkstemp(prefix='.surveymap_', suffix='.spool', dir=folder)
+        self._spool = os.fdopen(fd, 'w+b')
+        self._offsets = array('q'); self._bounds = array('d')
+        self._styles = []
+        self.placemarks = 0
+        self.tiles = 0
+        self.tmp_path = None
+        self._closed = False
+
+    def add_line_style(self, style_id, color_kml, width=2):
+        self._styles.append(f'  <Style id="{style_id}"><LineStyle><color>{color_kml}</color><width>{width}</width></LineStyle></Style>\n')
+
+    def _add(self, text, bounds):
+        self._offsets.append(self._spool.tell())
+        self._spool.write(text.encode('utf-8'))
+        self._bounds.extend(bounds)
+        self.placemarks += 1
+
+    def add_linestring(self, name, style_ref, coords):
+        self._add(f'  <Placemark><n>{name}</n><styleUrl>#{style_ref}</styleUrl><LineString><tessellate>1</tessellate><coordinates>{coords}</coordinates></LineString></Placemark>\n',
+                  coords_bounds(coords))
+
+    def add_linestring_stream(self, name, style_ref, coord_chunks):
+        self.add_linestring(name, style_ref, "".join(coord_chunks))
+
+    def add_point(self, name, lon, lat, style_ref=None):
+        style = f'<styleUrl>#{style_ref}</styleUrl>' if style_ref else ''
+        self._add(f'  <Placemark><n>{escape(name)}</n>{style}<Point><coordinates>{lon:.7f},{lat:.7f},0</coordinates></Point></Placemark>\n',
+                  (lon, lat, lon, lat))
+
+    def build_tiles(self):
+        """Quadtree over the spooled boxes → [(key, bounds, ids, child keys)], parents first."""
+        b = self._bounds
+        if not self.placemarks: return []
+        root = (min(b[0::4]), min(b[1::4]), max(b[2::4]), max(b[3::4]))
+        tiles = []; stack = [('', root, list(range(self.placemarks)))]
+        while stack:
+            key, (w, s, e, n), ids = stack.pop()
+            if len(ids) <= self.max_placemarks or len(key) >= self.max_depth:
+                tiles.append((key, (w, s, e, n), ids, [])); continue
+            mx = (w + e) / 2; my = (s + n) / 2
+            kept = []; quads = ([], [], [], [])
+            for i in ids:
+                j = 4 * i
+                qx = 0 if b[j + 2] <= mx else 1 if b[j] >= mx else None
+                qy = 0 if b[j + 3] <= my else 1 if b[j + 1] >= my else None
+                if qx is None or qy is None: kept.append(i)
+                else: quads[qy * 2 + qx].append(i)
+            # Quadrants: 0 = SW, 1 = SE, 2 = NW, 3 = NE
+            boxes = ((w, s, mx, my), (mx, s, e, my), (w, my, mx, n), (mx, my, e, n))
+            children = [key + str(q) for q in range(4) if quads[q]]
+            tiles.append((key, (w, s, e, n), kept, children))
+            for q in range(3, -1, -1):
+                if quads[q]: stack.append((key + str(q), boxes[q], quads[q]))
+        return tiles
+
+    def _write_tile(self, f, key, bounds, ids, children, boxes):
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+                f'  <n>{self.title} · tile {key or "root"}</n>\n  {_kml_region(bounds, 0 if not key else self.min_lod_pixels)}\n')
+        f.writelines(self._styles)
+        spool = self._spool; offsets = self._offsets; end = self._spool_end
+        for i in sorted(ids):
+            spool.seek(offsets[i])
+            f.write(spool.read((offsets[i + 1] if i + 1 < len(offsets) else end) - offsets[i]).decode('utf-8'))
+        for c in children:
+            f.write(_kml_network_link(f"tile {c}", f"t{c}.kml", _kml_region(boxes[c], self.min_lod_pixels)))
+        f.write('</Document>\n</kml>')
+
+    def close(self):
+        """Build the quadtree and write every tile (the root KML follows in commit)."""
+        if self._closed: return
+        self._spool.flush(); self._spool_end = self._spool.tell()
+        tiles = self.build_tiles()
+        boxes = {key: bounds for key, bounds, _, _ in tiles}
+        self.tiles = len(tiles)
+        if self.kmz:
+            fd, self.tmp_path = tempfile.mkstemp(prefix='.surveymap_', suffix='.kmz.part', dir=self.folder)
+            with os.fdopen(fd, 'wb') as raw:
+                with zipfile.ZipFile(raw, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compress_level) as z:
+                    with io.TextIOWrapper(z.open('doc.kml', 'w'), encoding='utf-8') as f:
+                        f.write(self._root_kml('tiles/t.kml'))
+                    for key, bounds, ids, children in tiles:
+                        with io.TextIOWrapper(z.open(f'tiles/t{key}.kml', 'w', force_zip64=True), encoding='utf-8') as f:
+                            self._write_tile(f, key, bounds, ids, children, boxes)
+                raw.flush(); os.fsync(raw.fileno())
+        else:
+            self.tmp_path = tempfile.mkdtemp(prefix='.surveymap_', suffix='_tiles.part', dir=self.folder)
+            for key, bounds, ids, children in tiles:
+                with open(os.path.join(self.tmp_path, f't{key}.kml'), 'w', encoding='utf-8') as f:
+                    self._write_tile(f, key, bounds, ids, children, boxes)
+        self._discard_spool()
+        self._closed = True
+
+    def _root_kml(self, href):
+        return (f'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n'
+                f'  <n>{self.title}</n>\n{_kml_network_link(self.title, href)}</Document>\n</kml>')
+
+    def commit(self, path):
+        """Move the output into place. A plain KML gets its tiles in '<name>_tiles' beside it."""
+        self.close()
+        if self.kmz:
+            try: os.chmod(self.tmp_path, 0o644)
+            except OSError: pass
+            os.replace(self.tmp_path, path)
+            return path
+        tiles_dir = os.path.splitext(path)[0] + '_tiles'
+        if os.path.isdir(tiles_dir): shutil.rmtree(tiles_dir)
+        os.replace(self.tmp_path, tiles_dir)
+        self.tmp_path = None
+        fd, tmp = tempfile.mkstemp(prefix='.surveymap_', suffix='.kml.part', dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self._root_kml(f"{os.path.basename(tiles_dir)}/t.kml"))
+            f.flush(); os.fsync(f.fileno())
+        try: os.chmod(tmp, 0o644)
+        except OSError: pass
+        os.replace(tmp, path)
+        return path
+
+    def _discard_spool(self):
+        try: self._spool.close()
+        except Exception: pass
+        try: os.remove(self._spool_path)
+        except OSError: pass
+
+    def discard(self):
+        self._discard_spool()
+        if self.tmp_path:
+            if os.path.isdir(self.tmp_path): shutil.rmtree(self.tmp_path, ignore_errors=True)
+            else:
+                try: os.remove(self.tmp_path)
+                except OSError: pass
+            self.tmp_path = None
+
+# =====================================================
+# Parallel Transform + Formatting
+# =====================================================
+# Vertices per worker task; small enough to keep every core busy
+PARALLEL_CHUNK_VERTICES = 20000
+CONVERT_WORKERS = os.cpu_count() or 1
+
+def make_executor(workers=CONVERT_WORKERS):
+    """Process pool for the conversion workers, or None (serial) on a single
+    core or where multiprocessing is unavailable (Android has no sem_open).
+    Threads are no fallback: the transform and formatting run under the GIL."""
+    if workers <= 1: return None
+    import concurrent.futures as cf
+    try:
+        import multiprocessing
+        return cf.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    except (ImportError, NotImplementedError, OSError, ValueError):
+        return None
+
+def _format_points(task):
+    """Worker: transform a vertex slice and format each point as 'lon,lat,0'."""
+    xs, ys = task
+    lons, lats = sld99_to_wgs84_batch(xs, ys)
+    if HAVE_NUMPY: lons = lons.tolist(); lats = lats.tolist()
+    return [f"{lo:.7f},{la:.7f},0" for lo, la in zip(lons, lats)]
+
+# =====================================================
+# Shared-vertex Transform Cache
+# =====================================================
+class VertexCache:
+    """Formatted WGS84 coordinates keyed by the (E, N) pair quantized to
+    `resolution` metres, so corners shared by several LINEs or adjacent lots
+    are transformed only once. With NumPy, duplicates are found per call by
+    np.unique on packed int64 keys and nothing is kept between calls;
+    without it, a bounded LRU of `capacity` entries also catches vertices
+    repeated across calls."""
+
+    def __init__(self, capacity=500000, resolution=0.001):
+        self.capacity = capacity
+        self._q = 1.0 / resolution
+        self._lru = OrderedDict()
+        self.hits = 0; self.misses = 0
+
+    @property
+    def dedup_ratio(self):
+        return (self.hits + self.misses) / self.misses if self.misses else 1.0
+
+    def format_vertices(self, xs, ys, executor=None, chunk_vertices=PARALLEL_CHUNK_VERTICES, progress=None):
+        """Return one formatted coordinate string per input vertex.
+        `progress(done, total)` is called after each transformed chunk of unique vertices."""
+        if HAVE_NUMPY: return self._format_numpy(xs, ys, executor, chunk_vertices, progress)
+        q = self._q; lru = self._lru
+        get = lru.get; touch = lru.move_to_end
+        out = [None] * len(xs); pending = {}; hits = 0
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            k = (round(x * q), round(y * q))
+            s = get(k)
+            if s is not None:
+                touch(k); out[i] = s; hits += 1
+                continue
+            idxs = pending.get(k)
+            if idxs is None: pending[k] = [i]
+            else: idxs.append(i); hits += 1
+        self.hits += hits; self.misses += len(pending)
+
+        if pending:
+            keys = list(pending)
+            ux = array('d', (xs[pending[k][0]] for k in keys))
+            uy = array('d', (ys[pending[k][0]] for k in keys))
+            tasks = [(ux[j:j + chunk_vertices], uy[j:j + chunk_vertices]) for j in range(0, len(keys), chunk_vertices)]
+            results = executor.map(_format_points, tasks) if executor and len(tasks) > 1 else map(_format_points, tasks)
+            n = 0
+            for strs in results:
+                for s in strs:
+                    k = keys[n]; n += 1
+                    for i in pending[k]: out[i] = s
+                    lru[k] = s
+                if progress: progress(n, len(keys))
+            while len(lru) > self.capacity:
+                lru.popitem(last=False)
+        return out
+
+    def _format_numpy(self, xs, ys, executor, chunk_vertices, progress):
+        n = len(xs)
+        if not n: return []
+        X = np.frombuffer(xs, dtype=np.float64) if isinstance(xs, array) else np.asarray(xs, dtype=np.float64)
+        Y = np.frombuffer(ys, dtype=np.float64) if isinstance(ys, array) else np.asarray(ys, dtype=np.float64)
+        qx = np.rint(X * self._q).astype(np.int64); qy = np.rint(Y * self._q).astype(np.int64)
+        qx -= qx.min(); qy -= qy.min()
+        span = int(qy.max()) + 1
+        # One stable sort of the packed keys (lexsort when they do not fit in 63 bits)
+        new = np.empty(n, dtype=bool); new[0] = True
+        if int(qx.max()) < (1 << 62) // span:
+            k = qx * span + qy; order = np.argsort(k, kind='stable'); sk = k[order]
+            np.not_equal(sk[1:], sk[:-1], out=new[1:])
+        else:
+            order = np.lexsort((qy, qx)); sx = qx[order]; sy = qy[order]
+            new[1:] = (sx[1:] != sx[:-1]) | (sy[1:] != sy[:-1])
+        u = int(np.count_nonzero(new))
+        if u == n:
+            ux = X; uy = Y; inverse = None
+        else:
+            # Unique vertices in order of first appearance, so the final lookup runs almost sequentially
+            first = order[new]
+            rank = np.empty(u, dtype=np.int64); rank[np.argsort(first)] = np.arange(u)
+            inverse = np.empty(n, dtype=np.int64); inverse[order] = rank[np.cumsum(new) - 1]
+            first.sort(); ux = X[first]; uy = Y[first]
+        self.hits += n - u; self.misses += u
+        tasks = [(ux[j:j + chunk_vertices], uy[j:j + chunk_vertices]) for j in range(0, u, chunk_vertices)]
+        results = executor.map(_format_points, tasks) if executor and len(tasks) > 1 else map(_format_points, tasks)
+        strs = []
+        for chunk in results:
+            strs.extend(chunk)
+            if progress: progress(len(strs), u)
+        return strs if inverse is None else [strs[i] for i in inverse.tolist()]
+
+def write_placemarks(writer, parts, xs, ys, style_for, progress=None, executor=None,
+                     chunk_vertices=PARALLEL_CHUNK_VERTICES, cache=None, profile=None):
+    """Transform (layer, start, count) parts and append them to `writer` in order.
+    Unique vertices are found by the VertexCache `cache` (a fresh one by
+    default) and transformed in chunks on `executor` when given.
+    A StageProfile records the transform, format and write stages."""
+    n_parts = max(len(parts), 1)
+    stage = profile.stage if profile else _no_stage
+    if cache is None: cache = VertexCache()
+    # Transforming counts as the first half of the work, writing as the second
+    half = (lambda d, t: progress(d * n_parts // (2 * t), n_parts)) if progress else None
+    misses = cache.misses
+    with stage('transform', vertices=len(xs)) as st:
+        strs = cache.format_vertices(xs, ys, executor, chunk_vertices, half)
+        if st: st['unique_vertices'] = st.get('unique_vertices', 0) + cache.misses - misses
+    for b in range(0, len(parts), 1000):
+        if progress: progress((n_parts + b) // 2, n_parts)
+        block = parts[b:b + 1000]
+        with stage('format', entities=len(block), vertices=sum(c for _, _, c in block)):
+            coords = [" ".join(strs[start:start + count]) for _, start, count in block]
+        with stage('write', entities=len(block)):
+            for (layer_name, _, _), c in zip(block, coords):
+                writer.add_linestring(f"{layer_name} #{writer.placemarks+1}", style_for(layer_name), c)
+
+# =====================================================
+# Conversion Profiling
+# =====================================================
+PROFILE_STAGES = ('read', 'scan', 'filter', 'simplify', 'transform', 'format', 'write')
+
+def _no_stage(name, entities=0, vertices=0):
+    return nullcontext()
+
+class StageProfile:
+    """Wall time, entity and vertex counts per pipeline stage of one conversion.
+    Stages entered repeatedly (streamed chunks, placemark blocks) accumulate.
+    With trace_memory, each stage also keeps the peak memory tracemalloc saw
+    while it ran. Worker processes are not traced."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = OrderedDict((name, {'seconds': 0.0, 'entities': 0, 'vertices': 0}) for name in PROFILE_STAGES)
+        self.total_seconds = 0.0
+        self._cprofile = None; self._started = None; self._own_trace = False
+
+    def start(self, cprofile=False):
+        """Begin timing; with cprofile=True a cProfile.Profile runs on this thread until stop()."""
+        self._started = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(); self._own_trace = True
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile(); self._cprofile.enable()
+
+    def stop(self):
+        if self._cprofile: self._cprofile.disable()
+        if self._own_trace:
+            tracemalloc.stop(); self._own_trace = False
+        if self._started is not None:
+            self.total_seconds = time.perf_counter() - self._started; self._started = None
+
+    @contextmanager
+    def stage(self, name, entities=0, vertices=0):
+        st = self.stages.setdefault(name, {'seconds': 0.0, 'entities': 0, 'vertices': 0})
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing: tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield st
+        finally:
+            st['seconds'] += time.perf_counter() - t0
+            st['entities'] += entities; st['vertices'] += vertices
+            if tracing:
+                st['peak_mb'] = max(st.get('peak_mb', 0.0), tracemalloc.get_traced_memory()[1] / 1e6)
+
+    def summary(self):
+        """One short line per the stages that took measurable time."""
+        return " · ".join(f"{name} {st['seconds']:.2f}s" for name, st in self.stages.items() if st['seconds'] >= 0.005)
+
+    def to_dict(self, **meta):
+        return dict(meta, total_seconds=self.total_seconds, stages=self.stages)
+
+    def save(self, path, **meta):
+        """Write the profile as JSON to `path`; the cProfile capture, if any, goes to `path` + '.prof'."""
+        import json
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(**meta), f, indent=1)
+        if self._cprofile:
+            self._cprofile.dump_stats(path + '.prof')
+
+# =====================================================
+# Conversion Jobs (cancellation + throttled progress)
+# =====================================================
+class ConversionCancelled(Exception):
+    pass
+
+class ConversionJob:
+    """State shared between a running conversion and whoever started it.
+    cancel() is cooperative: the worker stops at its next progress() call.
+    Progress reaches `report(value, msg)` at most once per `min_interval` seconds."""
+
+    def __init__(self, report=None, min_interval=0.1, profile=None):
+        self._report = report
+        self.profile = profile
+        self.min_interval = min_interval
+        self._cancel = threading.Event()
+        self.started = time.monotonic()
+        self._last = -min_interval
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set(): raise ConversionCancelled()
+
+    def progress(self, value, msg, force=False):
+        self.check()
+        now = time.monotonic()
+        if not force and now - self._last < self.min_interval: return
+        self._last = now
+        if self._report: self._report(value, msg)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def rate_text(self, done, total=None, started=None):
+        """'N ent/s' for `done` items since `started`, plus an ETA when `total` is known."""
+        dt = time.monotonic() - (self.started if started is None else started)
+        rate = done / dt if dt > 0 else 0.0
+        text = f"{rate:,.0f} ent/s"
+        if total and rate > 0:
+            text += f" · ETA {format_duration((total - done) / rate)}"
+        return text
+
+def format_duration(seconds):
+    seconds = int(seconds + 0.5)
+    if seconds < 60: return f"{seconds}s"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
+
+
+# =====================================================
+# Incremental Re-conversion Cache
+# =====================================================
+# Cached drawings kept per cache folder; the least recently written go first
+ENTITY_CACHE_MAX_FILES = 20
+
+def file_content_hash(path, block_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def vertex_digest(xs, ys, start, count):
+    h = hashlib.blake2b(digest_size=8)
+    h.update(memoryview(xs)[start:start + count]); h.update(memoryview(ys)[start:start + count])
+    return h.digest()
+
+class EntityCache:
+    """Formatted WGS84 coordinates per DXF entity, kept on disk between runs.
+    Each drawing gets one file holding its content hash and, in modelspace
+    order, [handle, layer, vertex digest, coordinate string or None] per entity.
+    An unchanged drawing is rewritten without parsing it; an edited one only
+    retransforms entities whose handle or vertices changed."""
+    VERSION = 5
+
+    def __init__(self, folder, max_files=ENTITY_CACHE_MAX_FILES):
+        self.folder = folder
+        self.max_files = max_files
+
+    def _path(self, src):
+        name = hashlib.sha1(os.path.abspath(src).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.folder, name + '.ecache')
+
+    def load(self, src):
+        """The cached record for `src`, or None if missing or unreadable."""
+        try:
+            with open(self._path(src), 'rb') as f:
+                rec = pickle.load(f)
+            return rec if rec.get('version') == self.VERSION else None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return None
+
+    def save(self, src, file_hash, entities, dropped=0):
+        path = self._path(src)
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(path + '.part', 'wb') as f:
+                pickle.dump({'version': self.VERSION, 'file_hash': file_hash, 'entities': entities, 'dropped': dropped},
+                            f, pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.part', path)
+            self._prune()
+        except OSError:
+            pass
+
+    def _prune(self):
+        files = [os.path.join(self.folder, f) for f in os.listdir(self.folder) if f.endswith('.ecache')]
+        if len(files) <= self.max_files: return
+        files.sort(key=os.path.getmtime)
+        for f in files[:len(files) - self.max_files]:
+            try: os.remove(f)
+            except OSError: pass
+
+def write_incremental(path, writer, entity_cache, active_layers, style_for, load_geometry,
+                      job, executor=None, cache=None, tolerance=CHORD_TOLERANCE_M, simplify_for=None):
+    """Write `path` to `writer` reusing `entity_cache`: the drawing is parsed only
+    when it changed or an enabled layer has no cached coordinates, and only
+    new or edited entities are transformed. Entities of layers with a
+    `simplify_for(layer)` tolerance are simplified before transforming.
+    Returns (skipped, reused, transformed, removed vertices, dropped entities)."""
+    simplify_for = simplify_for or (lambda ln: 0.0)
+    upd = job.progress
+    profile = job.profile
+    stage = profile.stage if profile else _no_stage
+    wanted = (lambda ln: True) if active_layers is None else active_layers.__contains__
+    cache = cache or VertexCache()
+
+    upd(10, "Checking conversion cache...", force=True)
+    # Curves flatten differently at another tolerance, so it is part of the key
+    file_hash = f"{file_content_hash(path)}:{tolerance:g}"
+    rec = entity_cache.load(path)
+    entities = rec['entities'] if rec else []
+    removed = 0; dropped = rec['dropped'] if rec else 0
+    # A layer's simplification tolerance is folded into its entities' digests
+    def digest(ln, d):
+        tol = simplify_for(ln)
+        return d + struct.pack('<d', tol) if tol > 0 else d
+    def cached(e): return e[3] is not None and e[2][8:] == digest(e[1], b'')
+    if rec and rec['file_hash'] == file_hash and all(cached(e) for e in entities if wanted(e[1])):
+        transformed = 0
+    else:
+        geom = load_geometry(path, lambda i: upd(10 + min(i // 5000, 18), f"Reading entity {i:,}..."), profile)
+        upd(30, f"{len(geom.parts)} entities found...", force=True)
+        dropped = geom.dropped
+        with stage('filter') as st:
+            old = {e[0]: e for e in entities}
+            entities = []; todo = []
+            xs = array('d'); ys = array('d'); parts = []
+            for i, (layer_name, start, count) in enumerate(geom.parts):
+                h = geom.handles[i] or f"#{i}"
+                d = digest(layer_name, vertex_digest(geom.xs, geom.ys, start, count))
+                prev = old.get(h)
+                e = [h, layer_name, d, prev[3] if prev and prev[2] == d else None]
+                entities.append(e)
+                if e[3] is None and wanted(layer_name):
+                    todo.append(e); parts.append((layer_name, len(xs), count))
+                    xs.extend(geom.xs[start:start + count]); ys.extend(geom.ys[start:start + count])
+            if st: st['entities'] += len(parts); st['vertices'] += len(xs)
+        with stage('simplify') as st:
+            parts, xs, ys, removed = simplify_parts(parts, xs, ys, simplify_for)
+            if st: st['vertices'] += removed
+
+        upd(55, f"Transforming {len(xs):,} changed vertices...", force=True)
+        with stage('transform', vertices=len(xs)):
+            strs = cache.format_vertices(xs, ys, executor,
+                                         progress=lambda d, t: upd(55 + int(d / t * 25), f"Transforming {d:,} / {t:,} vertices..."))
+        with stage('format', entities=len(parts), vertices=len(xs)):
+            for e, (_, start, count) in zip(todo, parts):
+                e[3] = " ".join(strs[start:start + count])
+        del xs, ys, strs
+        transformed = len(todo)
+        entity_cache.save(path, file_hash, entities, dropped)
+
+    skipped = 0; n = 0
+    with stage('write') as st:
+        for h, layer_name, _, coords in entities:
+            if not wanted(layer_name):
+                skipped += 1; continue
+            writer.add_linestring(f"{layer_name} #{writer.placemarks+1}", style_for(layer_name), coords)
+            n += 1
+            if n % 1000 == 0: upd(80 + min(n * 8 // max(len(entities), 1), 8), f"Writing {n:,} placemarks...")
+        if st: st['entities'] += n
+    return skipped, n - transformed, transformed, removed, dropped
+
+# =====================================================
+# DXF → KML Pipeline
+# =====================================================
+def read_geometry(path, progress=None, profile=None, tolerance=CHORD_TOLERANCE_M):
+    """Parse `path` with ezdxf and keep only its convertible geometry."""
+    import ezdxf
+    stage = profile.stage if profile else _no_stage
+    with stage('read'):
+        doc = ezdxf.readfile(path)
+    with stage('scan') as st:
+        blocks = BlockLibrary.from_doc(doc, tolerance)
+        geom = extract_geometry(doc.modelspace(), dxf_file_key(path), progress, tolerance, blocks)
+        geom.dropped += blocks.dropped
+        if st: st['entities'] += len(geom.parts); st['vertices'] += len(geom.xs)
+    return geom
+
+def default_layer_data(layer_counts):
+    """Layer Manager settings for a fresh scan: all layers on, colours in order."""
+    return merge_layer_data({}, layer_counts)
+
+def merge_layer_data(layer_data, layer_counts):
+    """Copy of `layer_data` with counts refreshed from `layer_counts` and any
+    new layers appended (enabled, next colour in order); existing choices are kept."""
+    layers = dict(layer_data)
+    for ln, count in layer_counts.items():
+        if ln in layers:
+            layers[ln]['count'] = count
+        else:
+            cname, ckml = get_layer_color(len(layers))
+            layers[ln] = {'enabled': True, 'color_name': cname, 'color_kml': ckml, 'count': count}
+    return layers
+
+def convert_to_writer(path, writer, layer_data=None, low_memory=False, load_geometry=None,
+                      job=None, executor=None, entity_cache=None, tolerance=CHORD_TOLERANCE_M, simplify=0.0, clip=None):
+    """Convert the DXF at `path` into an open KMLWriter (not committed).
+    `layer_data` holds the Layer Manager settings; None converts every layer.
+    With low_memory the file is streamed instead of loaded via
+    `load_geometry(path, progress, profile)` (default read_geometry), and
+    only one chunk plus a VertexCache of LOW_MEMORY_CACHE_VERTICES entries
+    is held in memory;
+    otherwise an EntityCache lets unchanged entities skip the transform.
+    Curves are flattened to `tolerance` metres; lines are simplified to the
+    layer's 'simplify' tolerance, or `simplify` metres, before the datum
+    transform. With a ClipRegion `clip` only entities that intersect it are
+    converted, found through the geometry's SpatialIndex (clipped exports
+    bypass the entity cache). Progress, cancellation and the optional
+    StageProfile come from `job`. Returns a stats dict."""
+    job = job or ConversionJob()
+    if load_geometry is None:
+        load_geometry = lambda p, progress, profile: read_geometry(p, progress, profile, tolerance)
+    upd = job.progress
+    profile = job.profile
+    stage = profile.stage if profile else _no_stage
+    layer_data = layer_data or {}
+    active_layers = {ln for ln, ld in layer_data.items() if ld.get('enabled', True)} if layer_data else None
+    def style_for(ln): return layer_style_id(ln) if ln in layer_data else "layer_default"
+    simplify_for = layer_simplify_tolerances(layer_data, simplify)
+
+    for ln, ld in layer_data.items():
+        if not ld.get('enabled', True): continue
+        writer.add_line_style(layer_style_id(ln), ld["color_kml"])
+    writer.add_line_style("layer_default", "ff0000ff")
+
+    skipped = 0; reused = 0; removed = 0; clipped = 0; dropped = 0
+    cache = VertexCache(LOW_MEMORY_CACHE_VERTICES) if low_memory else VertexCache()
+
+    if low_memory:
+        # Stream entities straight from disk and write them chunk by chunk
+        upd(10, "Streaming DXF file...", force=True)
+        stats = {}
+        blocks = BlockLibrary.from_file(path, tolerance)
+        chunks = iter_geometry_chunks(iter_dxf_entities(path), active_layers, stats=stats, tolerance=tolerance,
+                                      blocks=blocks)
+        while True:
+            # Streaming reads, scans and filters in one pass: all booked as 'read'
+            with stage('read') as st:
+                chunk = next(chunks, None)
+                if st and chunk: st['entities'] += len(chunk.parts); st['vertices'] += len(chunk.xs)
+            if chunk is None: break
+            parts, xs, ys = chunk.parts, chunk.xs, chunk.ys
+            if clip is not None:
+                with stage('filter') as st:
+                    parts, xs, ys, n = clip_parts(parts, xs, ys, clip)
+                    clipped += n
+                    if st: st['entities'] += len(parts); st['vertices'] += len(xs)
+            with stage('simplify') as st:
+                parts, xs, ys, n = simplify_parts(parts, xs, ys, simplify_for)
+                removed += n
+                if st: st['vertices'] += n
+            write_placemarks(writer, parts, xs, ys, style_for, executor=executor, cache=cache, profile=profile)
+            upd(50, f"Converted {writer.placemarks:,} entities · {job.rate_text(writer.placemarks)}")
+        skipped = stats.get('skipped', 0)
+        dropped = stats.get('dropped', 0) + blocks.dropped
+    elif entity_cache is not None and clip is None:
+        skipped, reused, _, removed, dropped = write_incremental(path, writer, entity_cache, active_layers, style_for,
+                                                        load_geometry, job, executor, cache, tolerance, simplify_for)
+    else:
+        upd(10, "Reading DXF file...", force=True)
+        geom = load_geometry(path, lambda i: upd(10 + min(i // 5000, 18), f"Reading entity {i:,}..."), profile)
+        upd(30, f"{len(geom.parts)} entities found...", force=True)
+        dropped = geom.dropped
+
+        # Gather the enabled layers' vertices so the datum transform runs once
+        with stage('filter') as st:
+            if clip is None and (active_layers is None or all(ln in active_layers for ln in geom.layer_counts)):
+                xs = geom.xs; ys = geom.ys; parts = geom.parts
+            else:
+                if active_layers is not None:
+                    skipped = sum(ln not in active_layers for ln, _, _ in geom.parts)
+                # Only parts whose box overlaps the clip area get the exact test
+                ids = range(len(geom.parts)) if clip is None else geom.spatial_index().query(clip.bounds)
+                xs = array('d'); ys = array('d'); parts = []
+                for i in ids:
+                    layer_name, start, count = geom.parts[i]
+                    if active_layers is not None and layer_name not in active_layers: continue
+                    if clip is not None and not clip.intersects(geom.xs, geom.ys, start, count): continue
+                    parts.append((layer_name, len(xs), count))
+                    xs.extend(geom.xs[start:start + count]); ys.extend(geom.ys[start:start + count])
+                if clip is not None: clipped = len(geom.parts) - skipped - len(parts)
+            if st: st['entities'] += len(parts); st['vertices'] += len(xs)
+        with stage('simplify') as st:
+            parts, xs, ys, removed = simplify_parts(parts, xs, ys, simplify_for)
+            if st: st['vertices'] += removed
+
+        upd(55, f"Transforming {len(xs):,} vertices...", force=True)
+        t0 = time.monotonic()
+        write_placemarks(writer, parts, xs, ys, style_for,
+                         lambda i, n: upd(60 + int((i / n) * 25), f"Converting {i:,} / {n:,} · {job.rate_text(i, n, t0)}"),
+                         executor, cache=cache, profile=profile)
+        del xs, ys
+
+    return {'placemarks': writer.placemarks, 'skipped': skipped, 'reused': reused,
+            'vertices': cache.hits + cache.misses, 'unique_vertices': cache.misses, 'simplified': removed,
+            'clipped': clipped, 'dropped': dropped}
+
+def convert_file(path, out_dir=None, kmz=False, low_memory=False, layer_data=None,
+                 compress_level=KMZ_COMPRESS_LEVEL, job=None, executor=None, cache_dir=None,
+                 tolerance=CHORD_TOLERANCE_M, simplify=0.0, tiled=False, tile_size=TILE_MAX_PLACEMARKS, clip=None):
+    """Convert one DXF and save the KML/KMZ in `out_dir` (default: beside
+    the DXF), replacing any existing file. With `tiled` the output is a
+    Region/NetworkLink quadtree of at most `tile_size` placemarks per tile;
+    with a ClipRegion `clip` only the entities inside it are exported.
+    Returns (save_path, stats)."""
+    folder = out_dir or os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    if tiled: writer = TiledKMLWriter(folder, kmz=kmz, compress_level=compress_level, max_placemarks=tile_size)
+    else: writer = KMLWriter(folder, kmz=kmz, compress_level=compress_level)
+    try:
+        stats = convert_to_writer(path, writer, layer_data, low_memory, job=job, executor=executor,
+                                  entity_cache=EntityCache(cache_dir) if cache_dir else None, tolerance=tolerance,
+                                  simplify=simplify, clip=clip)
+        if not writer.placemarks:
+            raise ValueError("No entities inside the export area" if clip else "No convertible entities found")
+        save_path = os.path.join(folder, os.path.splitext(os.path.basename(path))[0] + writer.ext)
+        with (job.profile.stage('write') if job and job.profile else nullcontext()):
+            writer.commit(save_path)
+    except BaseException:
+        writer.discard()
+        raise
+    if tiled: stats['tiles'] = writer.tiles
+    return save_path, stats
+
+# =====================================================
+# Point Files (CSV / TXT)
+# =====================================================
+POINT_CHUNK = 8192
+# direction → (batch transform, names of the two added columns, decimals)
+POINT_DIRECTIONS = {
+    'sld99_to_wgs84': (sld99_to_wgs84_batch, ('Lon', 'Lat'), 8),
+    'wgs84_to_sld99': (wgs84_to_sld99_batch, ('East', 'North'), 3),
+}
+
+def _to_float(text):
+    try: return float(text)
+    except ValueError: return None
+
+def sniff_point_format(path, sample_lines=20):
+    """Guess (delimiter, has_header) from the first lines of a point file.
+    delimiter None means runs of whitespace (tabs included). A first row with fewer numeric
+    fields than the row after it is taken as a header."""
+    lines = []
+    with open(path, encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            if line.strip(): lines.append(line)
+            if len(lines) == sample_lines: break
+    if not lines: return ',', False
+    delimiter = None
+    # Tabs count as whitespace: TXT exports often mix them with spaces
+    for d in (',', ';', '|'):
+        if all(d in l for l in lines): delimiter = d; break
+    rows = [next(csv.reader([l], delimiter=delimiter)) if delimiter else l.split() for l in lines[:2]]
+    numeric = [sum(_to_float(c) is not None for c in r) for r in rows]
+    return delimiter, len(rows) > 1 and numeric[0] < numeric[1]
+
+def point_column(spec, header):
+    """Column index from a 0-based number or a header name (case-insensitive)."""
+    if isinstance(spec, int): return spec
+    if spec.strip().isdigit(): return int(spec)
+    names = [h.strip().lower() for h in header or ()]
+    if spec.strip().lower() not in names:
+        raise ValueError(f"column {spec!r} not found in header {header!r}")
+    return names.index(spec.strip().lower())
+
+def iter_point_rows(f, delimiter, counter=None):
+    """Rows of a point file opened as text. counter, a one-item list, is
+    advanced by the characters read so callers can report progress."""
+    def lines():
+        for line in f:
+            if counter is not None: counter[0] += len(line)
+            if line.strip(): yield line
+    if delimiter: return csv.reader(lines(), delimiter=delimiter)
+    return (l.split() for l in lines())
+
+def point_output_paths(path, direction, folder=None, kmz=False):
+    """(csv_path, kml_path) for the results of point file `path`, in `folder`
+    (default beside it). The source extension is kept, so pts.csv and
+    pts.txt do not overwrite each other's results."""
+    base = os.path.join(folder or os.path.dirname(path), os.path.basename(path))
+    return base + ('_wgs84.csv' if direction == 'sld99_to_wgs84' else '_sld99.csv'), base + ('.kmz' if kmz else '.kml')
+
+def convert_point_file(path, out_path=None, direction='sld99_to_wgs84', x_col=1, y_col=2, id_col=None,
+                       delimiter='auto', header='auto', kml_path=None, kmz=False, chunk=POINT_CHUNK, job=None):
+    """Transform a CSV/TXT point file in either direction.
+    x/y are easting/northing (SLD99) or lon/lat (WGS84) columns, given as
+    0-based indexes or header names. Each row is written back, padded to the
+    header width (or past the coordinate columns without a header), with the
+    two transformed columns appended; rows whose coordinates do not parse keep
+    them blank and are counted as skipped. With kml_path, every point also
+    becomes a placemark named from id_col (or its row number). Rows are
+    read and transformed `chunk` at a time, so memory does not grow with
+    the file. Returns (out_path, stats)."""
+    if direction not in POINT_DIRECTIONS:
+        raise ValueError(f"unknown direction {direction!r}")
+    transform, new_cols, decimals = POINT_DIRECTIONS[direction]
+    sniffed = sniff_point_format(path)
+    if delimiter == 'auto': delimiter = sniffed[0]
+    if header == 'auto': header = sniffed[1]
+    if out_path is None: out_path = point_output_paths(path, direction)[0]
+    total = max(os.path.getsize(path), 1); read = [0]
+    stats = {'points': 0, 'skipped': 0}
+
+    fd, tmp = tempfile.mkstemp(prefix='.surveymap_', suffix='.part', dir=os.path.dirname(os.path.abspath(out_path)))
+    kml = KMLWriter(os.path.dirname(os.path.abspath(kml_path)), title=os.path.basename(path), kmz=kmz) if kml_path else None
+    try:
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as src, \
+             os.fdopen(fd, 'w', encoding='utf-8', newline='', buffering=256 * 1024) as dst:
+            rows = iter_point_rows(src, delimiter, read)
+            out = csv.writer(dst, delimiter=delimiter or ',')
+            names = next(rows, None) if header else None
+            if names is not None: out.writerow(list(names) + list(new_cols))
+            xi = point_column(x_col, names); yi = point_column(y_col, names)
+            ii = point_column(id_col, names) if id_col is not None else None
+            # Short rows are padded so the new columns always line up under their header
+            width = len(names) if names is not None else max(xi, yi, -1 if ii is None else ii) + 1
+            def padded(row):
+                row = list(row)
+                if len(row) < width: row.extend([''] * (width - len(row)))
+                return row
+            row_no = 0
+            while True:
+                batch = []; xs = array('d'); ys = array('d'); ok = []
+                for row in rows:
+                    row_no += 1
+                    x = _to_float(row[xi]) if xi < len(row) else None
+                    y = _to_float(row[yi]) if yi < len(row) else None
+                    batch.append(row)
+                    if x is None or y is None:
+                        ok.append(False)
+                    else:
+                        ok.append(True); xs.append(x); ys.append(y)
+                    if len(batch) == chunk: break
+                if not batch: break
+                if job: job.check()
+                us, vs = transform(xs, ys) if xs else ((), ())
+                k = 0; first = row_no - len(batch) + 1
+                for n, (row, good) in enumerate(zip(batch, ok)):
+                    if not good:
+                        out.writerow(padded(row) + ['', '']); stats['skipped'] += 1; continue
+                    u = float(us[k]); v = float(vs[k]); k += 1
+                    out.writerow(padded(row) + [f"{u:.{decimals}f}", f"{v:.{decimals}f}"])
+                    if kml:
+                        lon, lat = (u, v) if direction == 'sld99_to_wgs84' else (float(xs[k - 1]), float(ys[k - 1]))
+                        name = row[ii] if ii is not None and ii < len(row) else str(first + n)
+                        kml.add_point(name, lon, lat)
+                stats['points'] += k
+                if job: job.progress(100 * read[0] / total, f"Converting points... {stats['points']:,}")
+            dst.flush(); os.fsync(dst.fileno())
+        try: os.chmod(tmp, 0o644)
+        except OSError: pass
+        os.replace(tmp, out_path)
+        if kml: kml.commit(kml_path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        if kml: kml.discard()
+        raise
+    return out_path, stats
+
+def points_main(argv):
+    """python converter.py points <file> [options]"""
+    import argparse
+    ap = argparse.ArgumentParser(prog='converter.py points', description="Convert CSV/TXT point files between SLD99 and WGS84.")
+    ap.add_argument('inputs', nargs='+', help="CSV/TXT point files")
+    ap.add_argument('--to', choices=('wgs84', 'sld99'), default='wgs84', help="target datum (default wgs84)")
+    ap.add_argument('-x', default='1', help="easting / longitude column: 0-based index or header name (default 1)")
+    ap.add_argument('-y', default='2', help="northing / latitude column (default 2)")
+    ap.add_argument('--id', help="point name column for the KML")
+    ap.add_argument('--delimiter', default='auto', help="field separator; 'auto' to detect, 'space' for whitespace")
+    ap.add_argument('--header', choices=('auto', 'yes', 'no'), default='auto')
+    ap.add_argument('-o', '--out-dir', help="write results here instead of beside each input")
+    ap.add_argument('--kml', action='store_true', help="also write a KML of placemarks")
+    ap.add_argument('--kmz', action='store_true', help="write the placemarks as KMZ")
+    args = ap.parse_args(argv)
+
+    direction = 'sld99_to_wgs84' if args.to == 'wgs84' else 'wgs84_to_sld99'
+    delimiter = None if args.delimiter == 'space' else args.delimiter.replace('\\t', '\t')
+    header = {'auto': 'auto', 'yes': True, 'no': False}[args.header]
+    failed = 0
+    for path in args.inputs:
+        out_path, kml_path = point_output_paths(path, direction, args.out_dir, args.kmz)
+        if not (args.kml or args.kmz): kml_path = None
+        t0 = time.perf_counter()
+        try:
+            _, stats = convert_point_file(path, out_path, direction, args.x, args.y, args.id, delimiter, header, kml_path, args.kmz)
+        except Exception as e:
+            failed += 1
+            print(f"FAILED  {path}: {type(e).__name__}: {e}", flush=True); continue
+        skipped = f"  ({stats['skipped']:,} skipped)" if stats['skipped'] else ""
+        print(f"ok     {time.perf_counter() - t0:8.2f}s  {stats['points']:9,} points{skipped}  {path} → {out_path}", flush=True)
+    return 1 if failed else 0
+
+# =====================================================
+# Command-line Batch Converter
+# =====================================================
+def collect_inputs(specs):
+    """Expand files, folders (searched recursively for .dxf) and glob patterns."""
+    files = []; seen = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            matches = sorted(glob.glob(os.path.join(spec, '**', '*.[dD][xX][fF]'), recursive=True))
+        elif os.path.isfile(spec):
+            matches = [spec]
+        else:
+            matches = sorted(glob.glob(spec, recursive=True))
+        for m in matches:
+            key = os.path.abspath(m)
+            if key not in seen and os.path.isfile(m):
+                seen.add(key); files.append(m)
+    return files
+
+def _convert_one(task):
+    """Worker: convert a single file → (path, save_path, stats or error, seconds).
+    With profiling on, a StageProfile is saved beside the output and its summary added to stats."""
+    path, opts, executor = task
+    opts = dict(opts); profiling = opts.pop('profile', False); cprofile = opts.pop('cprofile', False)
+    profile = StageProfile(trace_memory=True) if profiling or cprofile else None
+    t0 = time.perf_counter()
+    try:
+        if profile: profile.start(cprofile)
+        try:
+            save_path, stats = convert_file(path, executor=executor, job=ConversionJob(profile=profile), **opts)
+        finally:
+            if profile: profile.stop()
+        if profile:
+            profile.save(save_path + '.profile.json', source=path, output=save_path, **stats)
+            stats['profile'] = profile.summary()
+        return path, save_path, stats, time.perf_counter() - t0
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+
+def main(argv=None):
+    import argparse
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['points']:
+        return points_main(argv[1:])
+    ap = argparse.ArgumentParser(prog='converter.py', description="Batch-convert SLD99 DXF drawings to WGS84 KML/KMZ.")
+    ap.add_argument('inputs', nargs='+', help="DXF files, folders or glob patterns")
+    ap.add_argument('-o', '--out-dir', help="write results here instead of beside each DXF")
+    ap.add_argument('-j', '--workers', type=int, default=CONVERT_WORKERS, help=f"parallel workers (default {CONVERT_WORKERS})")
+    ap.add_argument('--kmz', action='store_true', help="write compressed KMZ instead of KML")
+    ap.add_argument('--compress-level', type=int, default=KMZ_COMPRESS_LEVEL, choices=range(0, 10), metavar='0-9',
+                    help=f"KMZ zlib level (default {KMZ_COMPRESS_LEVEL})")
+    ap.add_argument('--low-memory', action='store_true', help="stream each DXF instead of loading it")
+    ap.add_argument('--tolerance', type=float, default=CHORD_TOLERANCE_M,
+                    help=f"max gap in metres between a curve and its chords (default {CHORD_TOLERANCE_M})")
+    ap.add_argument('--simplify', type=float, default=0.0, metavar='METRES',
+                    help="Douglas–Peucker tolerance applied to every layer before transforming (default off)")
+    ap.add_argument('--clip', metavar='AREA',
+                    help="export only entities inside E1,N1,E2,N2 (rectangle), E,N,R (circle) or a polygon point file (SLD99)")
+    ap.add_argument('--tiled', action='store_true', help="write a Region/NetworkLink tile tree that loads only what is in view")
+    ap.add_argument('--tile-size', type=int, default=TILE_MAX_PLACEMARKS, metavar='N',
+                    help=f"max placemarks per tile before it is split (default {TILE_MAX_PLACEMARKS})")
+    ap.add_argument('--cache-dir', help="keep per-entity results here so unchanged drawings and entities are reused")
+    ap.add_argument('--profile', action='store_true', help="save a per-stage JSON profile beside each output")
+    ap.add_argument('--cprofile', action='store_true', help="also capture cProfile stats (<output>.profile.json.prof)")
+    args = ap.parse_args(argv)
+    try: clip = parse_clip(args.clip)
+    except ValueError as e: ap.error(str(e))
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("No DXF files found.", file=sys.stderr)
+        return 2
+    opts = {'out_dir': args.out_dir, 'kmz': args.kmz, 'compress_level': args.compress_level, 'low_memory': args.low_memory,
+            'cache_dir': args.cache_dir, 'tolerance': args.tolerance, 'simplify': args.simplify,
+            'tiled': args.tiled, 'tile_size': args.tile_size, 'clip': clip,
+            'profile': args.profile, 'cprofile': args.cprofile}
+
+    # Several files: one file per worker. A single file: split its chunks across workers instead.
+    t0 = time.perf_counter(); failed = 0
+    if len(files) > 1:
+        executor = make_executor(min(args.workers, len(files)))
+        tasks = [(f, opts, None) for f in files]
+        results = executor.map(_convert_one, tasks) if executor else map(_convert_one, tasks)
+    else:
+        executor = make_executor(args.workers)
+        results = [_convert_one((files[0], opts, executor))]
+    try:
+        for path, save_path, stats, secs in results:
+            if save_path is None:
+                failed += 1
+                print(f"FAILED {secs:8.2f}s  {path}: {stats}", flush=True)
+            else:
+                reused = f"  ({stats['reused']:,} cached)" if stats['reused'] else ""
+                if stats['simplified']: reused += f"  ({stats['simplified']:,} vertices simplified away)"
+                if stats['dropped']: reused += f"  ({stats['dropped']:,} malformed entities dropped)"
+                if stats['clipped']: reused += f"  ({stats['clipped']:,} outside the area)"
+                if 'tiles' in stats: reused += f"  ({stats['tiles']:,} tiles)"
+                print(f"ok     {secs:8.2f}s  {stats['placemarks']:9,} lines{reused}  {path} → {save_path}", flush=True)
+                if 'profile' in stats: print(f"       {stats['profile']}", flush=True)
+    finally:
+        if executor: executor.shutdown()
+    print(f"{len(files) - failed}/{len(files)} converted in {format_duration(time.perf_counter() - t0)}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
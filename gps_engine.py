@@ -0,0 +1,535 @@
+"""
+SurveyMap SL GPS acquisition: location fixes are pushed by a provider as they
+arrive (Android LocationListener through pyjnius) instead of being polled.
+MockLocationProvider replays scripted fixes so the session logic runs on Linux.
+No Kivy imports; callbacks arrive on the provider's thread.
+"""
+import os
+import math
+import time
+import struct
+import random
+import tempfile
+import threading
+from array import array
+from collections import namedtuple
+
+from converter import wgs84_to_sld99, KMLWriter
+
+GPS_TIMEOUT = 90
+# A fix at least this accurate (metres) ends the session straight away
+GPS_GOOD_ACCURACY = 20.0
+# A later fix must beat the best one by this much (metres) to be reported
+GPS_MIN_IMPROVEMENT = 2.0
+
+# Averaging mode: ring size, safety timeout and outlier rejection
+GPS_AVERAGE_FIXES = 60
+GPS_AVERAGE_TIMEOUT = 300
+GPS_AVERAGE_MAX_ACC = 30.0
+GPS_OUTLIER_K = 3.0
+GPS_OUTLIER_MIN_FIXES = 5
+
+# Track logging: fixes per disk write, seconds between fsync checkpoints, worst accuracy kept
+TRACK_BATCH_FIXES = 16
+TRACK_CHECKPOINT_SECONDS = 30.0
+TRACK_MAX_ACC = 50.0
+TRACK_READ_CHUNK = 4096
+
+GPSFix = namedtuple('GPSFix', 'lat lon alt acc time provider')
+# std_e / std_n / std are accuracy-weighted standard deviations in metres
+AveragedFix = namedtuple('AveragedFix', 'lat lon alt east north std_e std_n std count rejected')
+
+class GPSUnavailable(Exception):
+    """Location cannot be acquired; the message is meant for the user."""
+
+# =====================================================
+# Fix Sessions
+# =====================================================
+class _Session:
+    """Provider lifecycle shared by the sessions: a timeout timer, cancel()
+    and a single on_done call. Subclasses implement _on_fix and _timed_out."""
+
+    def __init__(self, provider, on_update, on_done, timeout):
+        self.provider = provider
+        self.on_update = on_update; self.on_done = on_done
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._done = False
+        self._timer = None
+
+    @property
+    def running(self):
+        return not self._done
+
+    def _begin(self):
+        pass
+
+    def start(self):
+        """Begin listening; raises GPSUnavailable if the provider cannot start."""
+        self._begin()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._timed_out)
+            self._timer.daemon = True
+            self._timer.start()
+        try:
+            self.provider.start(self._on_fix)
+        except BaseException:
+            self._stop()
+            raise
+
+    def cancel(self):
+        """Stop without calling on_done."""
+        with self._lock:
+            if self._done: return
+            self._done = True
+        self._stop()
+
+    def _stop(self):
+        self._done = True
+        if self._timer: self._timer.cancel()
+        try: self.provider.stop()
+        except Exception: pass
+
+    def _finish(self, *args):
+        with self._lock:
+            if self._done: return
+            self._done = True
+        self._stop()
+        if self.on_done: self.on_done(*args)
+
+class FixSession(_Session):
+    """Listens to `provider` until a fix is within `accuracy` metres or
+    `timeout` seconds pass, then stops the provider.
+    on_update(fix) fires for every fix that improves on the best so far;
+    on_done(fix, live) fires once with the accepted fix (live=True), the best
+    one seen before the timeout (live=False) or None."""
+
+    def __init__(self, provider, on_update=None, on_done=None,
+                 accuracy=GPS_GOOD_ACCURACY, timeout=GPS_TIMEOUT):
+        super().__init__(provider, on_update, on_done, timeout)
+        self.accuracy = accuracy
+        self.best = None
+        self._best_acc = float('inf')
+
+    def _begin(self):
+        # A cached location is only a timeout fallback; live fixes are compared among themselves
+        self.best = self.provider.last_known()
+        self._best_acc = float('inf')
+
+    def _on_fix(self, fix):
+        with self._lock:
+            if self._done: return
+            if fix.acc >= self._best_acc - GPS_MIN_IMPROVEMENT and fix.acc > self.accuracy:
+                return
+            self.best = fix; self._best_acc = fix.acc
+            finished = fix.acc <= self.accuracy
+            if finished: self._done = True
+        if finished:
+            self._stop()
+            if self.on_done: self.on_done(fix, True)
+        elif self.on_update:
+            self.on_update(fix)
+
+    def _timed_out(self):
+        self._finish(self.best, False)
+
+class AveragingSession(_Session):
+    """Averages fixes for survey-grade points. Accepted fixes go into a
+    ring buffer of `fixes` slots allocated once; the session ends when the
+    ring is full, or after `duration` seconds if given (then the newest
+    `fixes` fixes are kept). Fixes worse than `max_acc` metres, or further
+    than `outlier_k` times max(std, acc) from the current mean, are rejected.
+    on_update(AveragedFix) fires after every accepted fix; on_done(avg,
+    complete) fires once, with avg None if nothing was accepted."""
+
+    def __init__(self, provider, on_update=None, on_done=None, fixes=GPS_AVERAGE_FIXES,
+                 duration=None, max_acc=GPS_AVERAGE_MAX_ACC, outlier_k=GPS_OUTLIER_K):
+        super().__init__(provider, on_update, on_done, duration or GPS_AVERAGE_TIMEOUT)
+        self.size = fixes; self.by_time = duration is not None
+        self.max_acc = max_acc; self.outlier_k = outlier_k
+        # Parallel ring buffers: SLD99 east/north, WGS84 lat/lon, altitude and weight (1 / acc²)
+        self._e, self._n, self._lat, self._lon, self._z, self._w = (array('d', bytes(8 * fixes)) for _ in range(6))
+        self._head = 0
+        self.count = 0; self.rejected = 0
+        self._mean = None   # (east, north, lat, lon, alt, std_e, std_n)
+
+    def _begin(self):
+        self._head = 0; self.count = 0; self.rejected = 0; self._mean = None
+
+    def _stats(self):
+        """Weighted mean and standard deviation over the filled slots."""
+        e, n, la, lo, z, w = self._e, self._n, self._lat, self._lon, self._z, self._w
+        sw = se = sn = sla = slo = sz = 0.0
+        for i in range(self.count):
+            wi = w[i]; sw += wi; se += wi * e[i]; sn += wi * n[i]
+            sla += wi * la[i]; slo += wi * lo[i]; sz += wi * z[i]
+        me = se / sw; mn = sn / sw
+        ve = vn = 0.0
+        for i in range(self.count):
+            wi = w[i]; de = e[i] - me; dn = n[i] - mn
+            ve += wi * de * de; vn += wi * dn * dn
+        return me, mn, sla / sw, slo / sw, sz / sw, math.sqrt(ve / sw), math.sqrt(vn / sw)
+
+    def result(self):
+        """The current AveragedFix, or None before the first accepted fix."""
+        if self._mean is None: return None
+        me, mn, lat, lon, mz, sde, sdn = self._mean
+        # WGS84 is averaged alongside SLD99 rather than transformed back
+        return AveragedFix(lat, lon, mz, me, mn, sde, sdn, math.hypot(sde, sdn), self.count, self.rejected)
+
+    def _on_fix(self, fix):
+        east, north = wgs84_to_sld99(fix.lon, fix.lat)
+        with self._lock:
+            if self._done: return
+            acc = max(fix.acc, 0.5)
+            if acc > self.max_acc:
+                self.rejected += 1; return
+            if self.count >= GPS_OUTLIER_MIN_FIXES:
+                me, mn, _, _, _, sde, sdn = self._mean
+                if math.hypot(east - me, north - mn) > self.outlier_k * max(math.hypot(sde, sdn), acc):
+                    self.rejected += 1; return
+            h = self._head
+            self._e[h] = east; self._n[h] = north; self._lat[h] = fix.lat; self._lon[h] = fix.lon
+            self._z[h] = fix.alt; self._w[h] = 1.0 / (acc * acc)
+            self._head = (h + 1) % self.size
+            if self.count < self.size: self.count += 1
+            self._mean = self._stats()
+            full = not self.by_time and self.count == self.size
+            avg = self.result()
+        if full: self._finish(avg, True)
+        elif self.on_update: self.on_update(avg)
+
+    def _timed_out(self):
+        with self._lock: avg = self.result()
+        # Running out the clock is the normal end of a timed session
+        self._finish(avg, self.by_time and avg is not None)
+
+class TrackSession(_Session):
+    """Feeds every fix to a TrackLog until cancelled (no timeout).
+    on_update(log) fires after each fix that was logged."""
+
+    def __init__(self, provider, log, on_update=None, max_acc=TRACK_MAX_ACC):
+        super().__init__(provider, on_update, None, None)
+        self.log = log; self.max_acc = max_acc
+
+    def _on_fix(self, fix):
+        with self._lock:
+            if self._done or fix.acc > self.max_acc: return
+            self.log.append(fix)
+        if self.on_update: self.on_update(self.log)
+
+    def _timed_out(self):
+        pass
+
+# =====================================================
+# Track Log (append-only file)
+# =====================================================
+TRACK_MAGIC = b'SMTRK\x00\x01\x00'
+# time, lat, lon, alt, acc, east, north
+TRACK_RECORD = struct.Struct('<7d')
+
+def _track_file_points(f):
+    f.seek(0, os.SEEK_END)
+    return max(f.tell() - len(TRACK_MAGIC), 0) // TRACK_RECORD.size
+
+class TrackLog:
+    """Fixes appended to `path` as fixed-size binary records (WGS84 and
+    SLD99). Records are packed into a preallocated buffer and written every
+    `batch` fixes; the file is fsynced at most every `checkpoint` seconds, so
+    a crash loses at most that much. Opening an existing log resumes it,
+    dropping a torn last record. append() runs on the provider thread and
+    checkpoint() may come from the UI thread, so both hold the log's lock."""
+
+    def __init__(self, path, batch=TRACK_BATCH_FIXES, checkpoint=TRACK_CHECKPOINT_SECONDS):
+        self.path = path; self.checkpoint_interval = checkpoint
+        self._lock = threading.RLock()
+        self._buf = bytearray(TRACK_RECORD.size * batch)
+        self._pending = 0
+        self.length = 0.0
+        self.last = None   # (east, north) of the newest point
+        self._f = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        head = self._f.read(len(TRACK_MAGIC))
+        if not head:
+            self._f.write(TRACK_MAGIC)
+        elif head != TRACK_MAGIC:
+            self._f.close()
+            raise ValueError(f"{path} is not a track log")
+        self.points = _track_file_points(self._f)
+        self._f.truncate(len(TRACK_MAGIC) + self.points * TRACK_RECORD.size)
+        self.resumed = self.points
+        if self.points:
+            # One streaming pass restores the walked length
+            for east, north in iter_track_sld99(path):
+                if self.last: self.length += math.hypot(east - self.last[0], north - self.last[1])
+                self.last = (east, north)
+        self._f.seek(0, os.SEEK_END)
+        self._synced = time.monotonic()
+
+    def append(self, fix):
+        east, north = wgs84_to_sld99(fix.lon, fix.lat)
+        with self._lock:
+            TRACK_RECORD.pack_into(self._buf, self._pending * TRACK_RECORD.size,
+                                   fix.time or time.time(), fix.lat, fix.lon, fix.alt, fix.acc, east, north)
+            self._pending += 1; self.points += 1
+            if self.last: self.length += math.hypot(east - self.last[0], north - self.last[1])
+            self.last = (east, north)
+            if self._pending * TRACK_RECORD.size == len(self._buf): self.flush()
+            if time.monotonic() - self._synced >= self.checkpoint_interval: self.checkpoint()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._f.write(memoryview(self._buf)[:self._pending * TRACK_RECORD.size])
+                self._pending = 0
+
+    def checkpoint(self):
+        """Flush and fsync, making every appended fix durable. Does nothing once closed."""
+        with self._lock:
+            if self._f.closed: return
+            self.flush()
+            self._f.flush(); os.fsync(self._f.fileno())
+            self._synced = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self.checkpoint(); self._f.close()
+
+def iter_track(path, chunk=TRACK_READ_CHUNK):
+    """Yields (time, lat, lon, alt, acc, east, north) records, reading
+    `chunk` records at a time; a torn last record is ignored."""
+    size = TRACK_RECORD.size
+    with open(path, 'rb') as f:
+        if f.read(len(TRACK_MAGIC)) != TRACK_MAGIC:
+            raise ValueError(f"{path} is not a track log")
+        while True:
+            data = f.read(size * chunk)
+            usable = len(data) - len(data) % size
+            if usable: yield from TRACK_RECORD.iter_unpack(data[:usable])
+            if len(data) < size * chunk: return
+
+def iter_track_sld99(path):
+    for r in iter_track(path): yield r[5], r[6]
+
+# =====================================================
+# Track Export (GPX / KML / DXF)
+# =====================================================
+TRACK_FORMATS = ('gpx', 'kml', 'kmz', 'dxf')
+
+def _write_atomic(out_path, write):
+    """Run write(f) on a temp file beside out_path, then rename it into place."""
+    fd, tmp = tempfile.mkstemp(prefix='.surveymap_', suffix='.part', dir=os.path.dirname(out_path) or '.')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', buffering=256 * 1024) as f:
+            write(f)
+            f.flush(); os.fsync(f.fileno())
+        try: os.chmod(tmp, 0o644)
+        except OSError: pass
+        os.replace(tmp, out_path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return out_path
+
+def _utc(t):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t))
+
+def export_gpx(path, out_path, name="SurveyMap Track"):
+    def write(f):
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<gpx version="1.1" creator="SurveyMap SL" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                f'<trk><name>{name}</name><trkseg>\n')
+        for t, lat, lon, alt, acc, _, _ in iter_track(path):
+            f.write(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}"><ele>{alt:.1f}</ele><time>{_utc(t)}</time></trkpt>\n')
+        f.write('</trkseg></trk>\n</gpx>\n')
+    return _write_atomic(out_path, write)
+
+def export_kml(path, out_path, name="SurveyMap Track", kmz=False):
+    def coords():
+        parts = []
+        for _, lat, lon, alt, _, _, _ in iter_track(path):
+            parts.append(f"{lon:.7f},{lat:.7f},0 ")
+            if len(parts) == TRACK_READ_CHUNK:
+                yield "".join(parts); parts.clear()
+        if parts: yield "".join(parts)
+    writer = KMLWriter(os.path.dirname(out_path) or '.', title=name, kmz=kmz)
+    try:
+        writer.add_line_style("track", "ff0000ff", width=3)
+        writer.add_linestring_stream(name, "track", coords())
+        return writer.commit(out_path)
+    except BaseException:
+        writer.discard(); raise
+
+def export_dxf(path, out_path, layer="GPS_TRACK"):
+    """R12 3D POLYLINE in SLD99 metres (elevation from GPS altitude)."""
+    def write(f):
+        f.write(f"0\nSECTION\n2\nENTITIES\n0\nPOLYLINE\n8\n{layer}\n66\n1\n10\n0.0\n20\n0.0\n30\n0.0\n70\n8\n")
+        for _, _, _, alt, _, east, north in iter_track(path):
+            f.write(f"0\nVERTEX\n8\n{layer}\n10\n{east:.3f}\n20\n{north:.3f}\n30\n{alt:.3f}\n70\n32\n")
+        f.write(f"0\nSEQEND\n8\n{layer}\n0\nENDSEC\n0\nEOF\n")
+    return _write_atomic(out_path, write)
+
+def export_track(path, out_path, fmt):
+    """Write the track log at `path` as gpx, kml, kmz or dxf; streams the
+    log, so memory does not grow with the track."""
+    if fmt == 'gpx': return export_gpx(path, out_path)
+    if fmt in ('kml', 'kmz'): return export_kml(path, out_path, kmz=fmt == 'kmz')
+    if fmt == 'dxf': return export_dxf(path, out_path)
+    raise ValueError(f"unknown track format {fmt!r}")
+
+# =====================================================
+# Mock Provider (Linux / testing)
+# =====================================================
+class MockLocationProvider:
+    """Replays (delay_seconds, GPSFix) pairs from a background thread."""
+
+    def __init__(self, script, last_known=None):
+        self.script = list(script)
+        self._last_known = last_known
+        self._stop = threading.Event()
+        self._thread = None
+
+    def last_known(self):
+        return self._last_known
+
+    def start(self, on_fix):
+        self._stop.clear()
+        def play():
+            for delay, fix in self.script:
+                if self._stop.wait(delay): return
+                on_fix(fix._replace(time=time.time()))
+        self._thread = threading.Thread(target=play, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @classmethod
+    def walking(cls, lat=6.9271, lon=79.8612, alt=10.0, n=3600, interval=1.0, step_m=1.2, acc=5.0, seed=None):
+        """Someone walking a boundary: `n` fixes `step_m` metres apart."""
+        rnd = random.Random(seed)
+        heading = rnd.uniform(0, 2 * math.pi); script = []
+        for _ in range(n):
+            heading += rnd.gauss(0, 0.15)
+            lat += step_m * math.cos(heading) / 111320.0
+            lon += step_m * math.sin(heading) / (111320.0 * math.cos(math.radians(lat)))
+            script.append((interval, GPSFix(lat, lon, alt, acc, 0.0, 'mock')))
+        return cls(script)
+
+    @classmethod
+    def converging(cls, lat=6.9271, lon=79.8612, alt=10.0, n=12, interval=1.0,
+                   start_acc=60.0, end_acc=4.0, jitter_m=3.0, seed=None):
+        """A receiver warming up: `n` fixes whose accuracy improves from
+        `start_acc` to `end_acc`, scattered around (lat, lon)."""
+        rnd = random.Random(seed)
+        script = []
+        for i in range(n):
+            acc = start_acc + (end_acc - start_acc) * i / max(n - 1, 1)
+            d = jitter_m * acc / start_acc / 111320.0
+            script.append((interval, GPSFix(lat + rnd.gauss(0, d), lon + rnd.gauss(0, d), alt, acc, 0.0, 'mock')))
+        return cls(script)
+
+# =====================================================
+# Android Provider (LocationManager + LocationListener)
+# =====================================================
+_listener_class = None
+
+def _android_listener_class():
+    """LocationListener implemented in Python; built on first use because
+    pyjnius only exists on Android."""
+    global _listener_class
+    if _listener_class is None:
+        from jnius import PythonJavaClass, java_method
+
+        class LocationListener(PythonJavaClass):
+            __javainterfaces__ = ['android/location/LocationListener']
+            __javacontext__ = 'app'
+
+            def __init__(self, callback):
+                super().__init__()
+                self.callback = callback
+
+            @java_method('(Landroid/location/Location;)V')
+            def onLocationChanged(self, location):
+                self.callback(location)
+
+            @java_method('(Ljava/lang/String;)V')
+            def onProviderEnabled(self, provider): pass
+
+            @java_method('(Ljava/lang/String;)V')
+            def onProviderDisabled(self, provider): pass
+
+            @java_method('(Ljava/lang/String;ILandroid/os/Bundle;)V')
+            def onStatusChanged(self, provider, status, extras): pass
+
+        _listener_class = LocationListener
+    return _listener_class
+
+def _to_fix(loc):
+    return GPSFix(loc.getLatitude(), loc.getLongitude(), loc.getAltitude(), loc.getAccuracy(),
+                  loc.getTime() / 1000.0, loc.getProvider())
+
+class AndroidLocationProvider:
+    """Registers one listener for GPS and network updates on the main looper."""
+
+    def __init__(self):
+        from jnius import autoclass
+        try:
+            ActivityThread = autoclass('android.app.ActivityThread')
+            self._context = ActivityThread.currentApplication().getApplicationContext()
+        except Exception:
+            raise GPSUnavailable("❌ Cannot access Android context.\nEnsure Location permission is allowed in Settings.")
+        Context = autoclass('android.content.Context')
+        LM = autoclass('android.location.LocationManager')
+        self._lm = self._context.getSystemService(Context.LOCATION_SERVICE)
+        self._providers = [LM.GPS_PROVIDER, LM.NETWORK_PROVIDER]
+        self._passive = LM.PASSIVE_PROVIDER
+        self._listener = None
+
+    def last_known(self):
+        """Most accurate cached location, if any (never counts as live)."""
+        best = None
+        for p in self._providers + [self._passive]:
+            try:
+                loc = self._lm.getLastKnownLocation(p)
+                if loc is not None and (best is None or loc.getAccuracy() < best.getAccuracy()): best = loc
+            except Exception: pass
+        return _to_fix(best) if best is not None else None
+
+    def start(self, on_fix):
+        from jnius import autoclass
+        try:
+            PackageManager = autoclass('android.content.pm.PackageManager')
+            if self._context.checkSelfPermission("android.permission.ACCESS_FINE_LOCATION") != PackageManager.PERMISSION_GRANTED:
+                raise GPSUnavailable("❌ Location permission NOT granted!\nPlease allow Location in App Settings.")
+        except GPSUnavailable: raise
+        except Exception: pass
+
+        enabled = []
+        for p in self._providers:
+            try:
+                if self._lm.isProviderEnabled(p): enabled.append(p)
+            except Exception: pass
+        if not enabled:
+            raise GPSUnavailable("⚠ Phone Location is OFF!\nPlease turn on GPS in your Phone Settings.")
+
+        Looper = autoclass('android.os.Looper')
+        # Keep a Python reference: the Java side holds only a weak proxy
+        self._listener = _android_listener_class()(lambda loc: on_fix(_to_fix(loc)))
+        for p in enabled:
+            self._lm.requestLocationUpdates(p, 0, 0.0, self._listener, Looper.getMainLooper())
+
+    def stop(self):
+        if self._listener is not None:
+            try: self._lm.removeUpdates(self._listener)
+            except Exception: pass
+            self._listener = None
+
+def make_location_provider(platform, walking=False):
+    """The provider for this platform: Android's LocationManager, the mock
+    provider when SURVEYMAP_MOCK_GPS is set, otherwise None."""
+    if platform == 'android':
+        return AndroidLocationProvider()
+    if os.environ.get('SURVEYMAP_MOCK_GPS'):
+        return MockLocationProvider.walking() if walking else MockLocationProvider.converging()
+    return None
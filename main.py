@@ -1,24 +1,29 @@
 import os
-import math
+import time
+import fnmatch
 import threading
+from concurrent.futures import BrokenExecutor
 from kivy.app import App
 from kivy.lang import Builder
 from kivy.uix.popup import Popup
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.gridlayout import GridLayout
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.filechooser import FileChooserListView
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
-from kivy.uix.checkbox import CheckBox
-from kivy.uix.progressbar import ProgressBar
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.properties import StringProperty, BooleanProperty, ListProperty
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.utils import platform
 from kivy.clock import Clock
-from kivy.graphics import Color, Rectangle, RoundedRectangle
 
-GPS_TIMEOUT = 90
+from converter import (LAYER_COLORS_HEX, StageProfile, EntityCache, wgs84_to_sld99, transform_grids,
+                       dxf_file_key, read_geometry, iter_dxf_entities, count_layers, scan_layer_counts, merge_layer_data,
+                       KMLWriter, TiledKMLWriter, kml_mime_type, make_executor, convert_to_writer, convert_point_file,
+                       point_output_paths, parse_clip, ConversionJob, ConversionCancelled, format_duration)
+from gps_engine import (GPS_TIMEOUT, GPS_AVERAGE_FIXES, GPS_AVERAGE_TIMEOUT, FixSession, AveragingSession,
+                        TrackSession, TrackLog, export_track, GPSUnavailable, make_location_provider)
 
 # =====================================================
 # Permissions Request (Android)
@@ -39,22 +44,6 @@ def request_android_permissions():
 # =====================================================
 # KML Layer Colors (Google Earth: AABBGGRR format)
 # =====================================================
-LAYER_COLORS_HEX = [
-    ("Red",    "ff0000ff"),
-    ("Blue",   "ffff0000"),
-    ("Green",  "ff00aa00"),
-    ("Yellow", "ff00ffff"),
-    ("Cyan",   "ffffff00"),
-    ("Purple", "ffaa00aa"),
-    ("Orange", "ff0066ff"),
-    ("White",  "ffffffff"),
-    ("Pink",   "ffaa44ff"),
-    ("Lime",   "ff00ff88"),
-]
-
-def get_layer_color(index):
-    return LAYER_COLORS_HEX[index % len(LAYER_COLORS_HEX)]
-
 def kml_color_to_rgb(kml_hex):
     """AABBGGRR → (R,G,B) 0-1"""
     try:
@@ -65,85 +54,6 @@ def kml_color_to_rgb(kml_hex):
     except Exception:
         return (1, 1, 1)
 
-# =====================================================
-# SLD99 → WGS84
-# =====================================================
-def sld99_to_wgs84(easting, northing):
-    a=6377276.345; f=1/300.8017; b=a*(1-f)
-    e2=(a**2-b**2)/a**2; e_prime2=(a**2-b**2)/b**2
-    k0=0.9999238418; fe=500000.0; fn=500000.0
-    lon0=math.radians(80.7717130833333); lat0=math.radians(7.00047152777778)
-    x=easting-fe; y=northing-fn
-    M0=a*((1-e2/4-3*e2**2/64-5*e2**3/256)*lat0-(3*e2/8+3*e2**2/32)*math.sin(2*lat0)+(15*e2**3/256)*math.sin(4*lat0))
-    M=M0+y/k0; mu=M/(a*(1-e2/4-3*e2**2/64-5*e2**3/256))
-    e1=(1-math.sqrt(1-e2))/(1+math.sqrt(1-e2))
-    lat1=mu+(3*e1/2-27*e1**3/32)*math.sin(2*mu)+(21*e1**2/16)*math.sin(4*mu)+(151*e1**3/96)*math.sin(6*mu)
-    N1=a/math.sqrt(1-e2*math.sin(lat1)**2); T1=math.tan(lat1)**2
-    C1=e_prime2*math.cos(lat1)**2; R1=a*(1-e2)/(1-e2*math.sin(lat1)**2)**1.5
-    D=x/(N1*k0)
-    lat_l=lat1-(N1*math.tan(lat1)/R1)*(D**2/2-(5+3*T1+10*C1-4*C1**2-9*e_prime2)*D**4/24+(61+90*T1+298*C1+45*T1**2-252*e_prime2-3*C1**2)*D**6/720)
-    lon_l=lon0+(D-(1+2*T1+C1)*D**3/6+(5-2*C1+28*T1-3*C1**2+8*e_prime2+24*T1**2)*D**5/120)/math.cos(lat1)
-    h=0.0; Nl=a/math.sqrt(1-e2*math.sin(lat_l)**2)
-    Xl=(Nl+h)*math.cos(lat_l)*math.cos(lon_l); Yl=(Nl+h)*math.cos(lat_l)*math.sin(lon_l); Zl=(Nl*(1-e2)+h)*math.sin(lat_l)
-    dx=-0.293; dy=766.95; dz=87.713
-    rx=math.radians(-0.195704/3600); ry=math.radians(-1.695068/3600); rz=math.radians(-3.473016/3600); ds=-0.039338/1e6
-    Xw=Xl+dx+ds*Xl+rz*Yl-ry*Zl; Yw=Yl+dy-rz*Xl+ds*Yl+rx*Zl; Zw=Zl+dz+ry*Xl-rx*Yl+ds*Zl
-    aw=6378137.0; fw=1/298.257223563; e2w=2*fw-fw**2; bw=aw*(1-fw); ep2w=(aw**2-bw**2)/bw**2
-    p=math.sqrt(Xw**2+Yw**2); th=math.atan2(Zw*aw,p*bw)
-    lonw=math.atan2(Yw,Xw); latw=math.atan2(Zw+ep2w*bw*math.sin(th)**3,p-e2w*aw*math.cos(th)**3)
-    return math.degrees(lonw), math.degrees(latw)
-
-# =====================================================
-# WGS84 → SLD99 (Inverse)
-# =====================================================
-def wgs84_to_sld99(lon, lat):
-    aw = 6378137.0; fw = 1/298.257223563; ew2 = 2*fw - fw**2
-    ae = 6377276.345; fe = 1/300.8017; ee2 = 2*fe - fe**2
-    
-    lat_rad = math.radians(lat)
-    lon_rad = math.radians(lon)
-    Nw = aw / math.sqrt(1 - ew2 * math.sin(lat_rad)**2)
-    h = 0 
-    Xw = (Nw + h) * math.cos(lat_rad) * math.cos(lon_rad)
-    Yw = (Nw + h) * math.cos(lat_rad) * math.sin(lon_rad)
-    Zw = (Nw * (1 - ew2) + h) * math.sin(lat_rad)
-    
-    dx=-0.293; dy=766.95; dz=87.713
-    rx=math.radians(-0.195704/3600); ry=math.radians(-1.695068/3600); rz=math.radians(-3.473016/3600)
-    ds=-0.039338/1e6
-    
-    Xs = Xw - dx; Ys = Yw - dy; Zs = Zw - dz
-    X_e = Xs - ds*Xs + rz*Ys - ry*Zs
-    Y_e = Ys - rz*Xs - ds*Ys + rx*Zs
-    Z_e = Zs + ry*Xs - rx*Ys - ds*Zs
-    
-    p = math.sqrt(X_e**2 + Y_e**2)
-    th = math.atan2(Z_e * ae, p * (ae*(1-fe)))
-    ep2 = ee2 / (1-ee2)
-    lat_e = math.atan2(Z_e + ep2 * ae*(1-fe) * math.sin(th)**3, p - ee2 * ae * math.cos(th)**3)
-    lon_e = math.atan2(Y_e, X_e)
-    
-    lat0 = math.radians(7.00047152777778); lon0 = math.radians(80.7717130833333)
-    k0 = 0.9999238418; fe_val = 500000.0; fn_val = 500000.0
-    
-    A = (lon_e - lon0) * math.cos(lat_e)
-    T = math.tan(lat_e)**2
-    C = ep2 * math.cos(lat_e)**2
-    N = ae / math.sqrt(1 - ee2 * math.sin(lat_e)**2)
-    
-    def calc_M(phi):
-        return ae * ((1 - ee2/4 - 3*ee2**2/64 - 5*ee2**3/256)*phi - 
-                     (3*ee2/8 + 3*ee2**2/32)*math.sin(2*phi) + 
-                     (15*ee2**3/256)*math.sin(4*phi))
-                     
-    M = calc_M(lat_e)
-    M0 = calc_M(lat0)
-    
-    Easting = fe_val + k0 * N * (A + (1-T+C)*A**3/6 + (5-18*T+T**2+72*C-58*ep2)*A**5/120)
-    Northing = fn_val + k0 * (M - M0 + N * math.tan(lat_e) * (A**2/2 + (5-T+9*C+4*C**2)*A**4/24 + (61-58*T+T**2+600*C-330*ep2)*A**6/720))
-    
-    return Easting, Northing
-
 # =====================================================
 # WhatsApp Sharing Intents
 # =====================================================
@@ -187,7 +97,7 @@ def share_file_whatsapp(filepath):
         File = autoclass('java.io.File')
         
         intent = Intent(Intent.ACTION_SEND)
-        intent.setType("application/vnd.google-earth.kml+xml")
+        intent.setType(kml_mime_type(filepath))
         intent.putExtra(Intent.EXTRA_STREAM, Uri.fromFile(File(filepath)))
         intent.setPackage("com.whatsapp")
         
@@ -214,7 +124,7 @@ def auto_open_kml(filepath):
 
     try:
         result = subprocess.run(
-            ['am', 'start', '-n', 'com.google.earth/.EarthActivity', '-a', 'android.intent.action.VIEW', '-d', f'file://{filepath}', '-t', 'application/vnd.google-earth.kml+xml', '--activity-brought-to-front'],
+            ['am', 'start', '-n', 'com.google.earth/.EarthActivity', '-a', 'android.intent.action.VIEW', '-d', f'file://{filepath}', '-t', kml_mime_type(filepath), '--activity-brought-to-front'],
             capture_output=True, text=True, timeout=8
         )
         if result.returncode == 0 and 'Error' not in result.stdout + result.stderr:
@@ -234,7 +144,7 @@ def auto_open_kml(filepath):
         intent = Intent(Intent.ACTION_VIEW)
         intent.addFlags(Intent.FLAG_ACTIVITY_NEW_TASK | 0x00000001)
         uri = Uri.fromFile(File(filepath))
-        intent.setDataAndType(uri, "application/vnd.google-earth.kml+xml")
+        intent.setDataAndType(uri, kml_mime_type(filepath))
         act = cast('android.app.Activity', PA.mActivity)
         act.startActivity(intent)
         return True, "jnius opened"
@@ -266,6 +176,41 @@ KV = '''
         background_color: 0,0,0,0
         on_release: app.root.current = 'about'
 
+<LayerRow>:
+    size_hint_y: None
+    height: '46dp'
+    spacing: '8dp'
+    CheckBox:
+        size_hint_x: None
+        width: '40dp'
+        active: root.enabled
+        on_active: root.on_toggle(self.active)
+    Button:
+        size_hint_x: None
+        width: '44dp'
+        text: ''
+        background_normal: ''
+        background_color: root.rgba
+        on_release: app.cycle_layer_color(root.layer_name)
+    Label:
+        text: root.label_text
+        font_size: '13sp'
+        halign: 'left'
+        valign: 'middle'
+        text_size: self.size
+        shorten: True
+
+<LayerList>:
+    viewclass: 'LayerRow'
+    RecycleBoxLayout:
+        orientation: 'vertical'
+        default_size: None, dp(46)
+        default_size_hint: 1, None
+        size_hint_y: None
+        height: self.minimum_height
+        spacing: dp(4)
+        padding: dp(4)
+
 <MainScreen>:
     name: 'main'
     canvas.before:
@@ -377,6 +322,89 @@ KV = '''
                             background_color: 0.3, 0.3, 0.5, 1
                             on_release: app.open_save_folder_chooser()
 
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '32dp'
+                        spacing: '6dp'
+                        CheckBox:
+                            id: low_mem_check
+                            size_hint_x: None
+                            width: '36dp'
+                            active: False
+                            on_active: app.set_low_memory_mode(self.active)
+                        Label:
+                            text: "Low-memory mode (very large DXF files)"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                            halign: 'left'
+                            valign: 'middle'
+                            text_size: self.size
+
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '32dp'
+                        spacing: '6dp'
+                        CheckBox:
+                            id: kmz_check
+                            size_hint_x: None
+                            width: '36dp'
+                            active: False
+                            on_active: app.set_kmz_output(self.active)
+                        Label:
+                            text: "Save as KMZ (compressed, smaller to share)"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                            halign: 'left'
+                            valign: 'middle'
+                            text_size: self.size
+
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '32dp'
+                        spacing: '6dp'
+                        CheckBox:
+                            id: tiled_check
+                            size_hint_x: None
+                            width: '36dp'
+                            active: False
+                            on_active: app.set_tiled_output(self.active)
+                        Label:
+                            text: "Tiled KMZ (huge plans load only what is in view)"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                            halign: 'left'
+                            valign: 'middle'
+                            text_size: self.size
+
+                    TextInput:
+                        id: clip_input
+                        hint_text: "Export area (blank = all): E1,N1,E2,N2 · E,N,radius · radius around GPS fix · polygon CSV path"
+                        multiline: False
+                        size_hint_y: None
+                        height: '38dp'
+                        font_size: '11sp'
+                        background_color: 0.1, 0.1, 0.15, 1
+                        foreground_color: 1, 1, 1, 1
+                        cursor_color: 0.5, 0.8, 1, 1
+
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '32dp'
+                        spacing: '6dp'
+                        CheckBox:
+                            id: debug_profile_check
+                            size_hint_x: None
+                            width: '36dp'
+                            active: False
+                            on_active: app.set_debug_profile(self.active)
+                        Label:
+                            text: "Debug: save timing profile (JSON)"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                            halign: 'left'
+                            valign: 'middle'
+                            text_size: self.size
+
                     Button:
                         id: convert_btn
                         text: "🔄  Convert & Create KML"
@@ -400,10 +428,21 @@ KV = '''
                             color: 1, 1, 0.5, 1
                             size_hint_y: None
                             height: '20dp'
-                        ProgressBar:
-                            id: convert_progress
-                            max: 100
-                            value: 0
+                        BoxLayout:
+                            spacing: '6dp'
+                            ProgressBar:
+                                id: convert_progress
+                                max: 100
+                                value: 0
+                            Button:
+                                id: cancel_btn
+                                text: "✖ Cancel"
+                                font_size: '12sp'
+                                size_hint_x: None
+                                width: '80dp'
+                                background_normal: ''
+                                background_color: 0.6, 0.2, 0.2, 1
+                                on_release: app.cancel_conversion()
 
                     Label:
                         id: convert_status
@@ -426,6 +465,113 @@ KV = '''
                         background_color: 0.15, 0.82, 0.35, 1
                         on_release: app.share_kml()
 
+                # ===== Point File Section =====
+                BoxLayout:
+                    orientation: 'vertical'
+                    size_hint_y: None
+                    height: self.minimum_height
+                    padding: '14dp'
+                    spacing: '8dp'
+                    canvas.before:
+                        Color:
+                            rgba: 0.16, 0.3, 0.24, 0.6
+                        RoundedRectangle:
+                            pos: self.pos
+                            size: self.size
+                            radius: [12]
+
+                    Label:
+                        text: "Point File Converter (CSV / TXT)"
+                        font_size: '17sp'
+                        bold: True
+                        size_hint_y: None
+                        height: '36dp'
+                        color: 0.5, 1, 0.75, 1
+                        halign: 'left'
+                        text_size: self.size
+                        valign: 'middle'
+
+                    Button:
+                        text: "📄  Select Point File"
+                        size_hint_y: None
+                        height: '46dp'
+                        background_normal: ''
+                        background_color: 0.12, 0.55, 0.4, 1
+                        on_release: app.open_points_chooser()
+
+                    Label:
+                        id: points_file_label
+                        text: "No point file selected..."
+                        color: 0.55, 0.55, 0.55, 1
+                        size_hint_y: None
+                        height: '26dp'
+                        text_size: self.size
+                        halign: 'left'
+                        valign: 'middle'
+
+                    Button:
+                        id: points_dir_btn
+                        text: "SLD99  →  WGS84"
+                        size_hint_y: None
+                        height: '40dp'
+                        background_normal: ''
+                        background_color: 0.3, 0.3, 0.5, 1
+                        on_release: app.toggle_points_direction()
+
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '40dp'
+                        spacing: '6dp'
+                        Label:
+                            id: points_x_label
+                            text: "E col"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                        TextInput:
+                            id: points_x_input
+                            text: "1"
+                            multiline: False
+                            font_size: '13sp'
+                        Label:
+                            id: points_y_label
+                            text: "N col"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                        TextInput:
+                            id: points_y_input
+                            text: "2"
+                            multiline: False
+                            font_size: '13sp'
+                        Label:
+                            text: "ID col"
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                        TextInput:
+                            id: points_id_input
+                            text: "0"
+                            multiline: False
+                            font_size: '13sp'
+
+                    Button:
+                        id: points_convert_btn
+                        text: "⚡  Convert Points"
+                        size_hint_y: None
+                        height: '46dp'
+                        background_normal: ''
+                        background_color: 0.15, 0.82, 0.35, 1
+                        on_release: app.convert_points()
+
+                    Label:
+                        id: points_status
+                        text: "Columns: 0-based number or header name."
+                        font_size: '12sp'
+                        color: 0.6, 1, 0.65, 1
+                        size_hint_y: None
+                        height: '60dp'
+                        text_size: self.width, None
+                        halign: 'center'
+                        valign: 'top'
+
                 # ===== GPS Section =====
                 BoxLayout:
                     orientation: 'vertical'
@@ -461,6 +607,24 @@ KV = '''
                         background_color: 0.72, 0.32, 0.08, 1
                         on_release: app.toggle_gps()
 
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '32dp'
+                        spacing: '6dp'
+                        CheckBox:
+                            id: gps_average_check
+                            size_hint_x: None
+                            width: '36dp'
+                            active: False
+                            on_active: app.set_gps_average(self.active)
+                        Label:
+                            text: "Average fixes (control point, %d fixes)" % app.gps_average_fixes
+                            font_size: '12sp'
+                            color: 0.7, 0.7, 0.7, 1
+                            halign: 'left'
+                            valign: 'middle'
+                            text_size: self.size
+
                     Label:
                         id: gps_timer_label
                         text: ""
@@ -475,7 +639,7 @@ KV = '''
                         font_size: '14sp'
                         color: 0.9, 0.9, 0.9, 1
                         size_hint_y: None
-                        height: '140dp'
+                        height: '180dp'
                         text_size: self.width, None
                         halign: 'center'
                         valign: 'top'
@@ -491,6 +655,52 @@ KV = '''
                         background_color: 0.15, 0.82, 0.35, 1
                         on_release: app.share_gps()
 
+                    Button:
+                        id: track_btn
+                        text: "🚶  Start Track"
+                        size_hint_y: None
+                        height: '46dp'
+                        background_normal: ''
+                        background_color: 0.55, 0.25, 0.1, 1
+                        on_release: app.toggle_track()
+
+                    Label:
+                        id: track_label
+                        text: "Walk a boundary to record it as a track."
+                        font_size: '13sp'
+                        color: 0.9, 0.9, 0.9, 1
+                        size_hint_y: None
+                        height: '60dp'
+                        text_size: self.width, None
+                        halign: 'center'
+                        valign: 'top'
+
+                    BoxLayout:
+                        size_hint_y: None
+                        height: '40dp'
+                        spacing: '6dp'
+                        Button:
+                            id: track_gpx_btn
+                            text: "GPX"
+                            disabled: True
+                            background_normal: ''
+                            background_color: 0.3, 0.3, 0.5, 1
+                            on_release: app.export_track('gpx')
+                        Button:
+                            id: track_kml_btn
+                            text: "KML"
+                            disabled: True
+                            background_normal: ''
+                            background_color: 0.3, 0.3, 0.5, 1
+                            on_release: app.export_track('kml')
+                        Button:
+                            id: track_dxf_btn
+                            text: "DXF"
+                            disabled: True
+                            background_normal: ''
+                            background_color: 0.3, 0.3, 0.5, 1
+                            on_release: app.export_track('dxf')
+
 <HelpScreen>:
     name: 'help'
     canvas.before:
@@ -508,7 +718,7 @@ KV = '''
                 size_hint_y: None
                 height: self.minimum_height
                 Label:
-                    text: "[b][color=66ddff]DXF → KML:[/color][/b]\\n  1. Select your DXF file.\\n  2. Check or uncheck layers using the 'Select Layers' button.\\n  3. Tap the color dot to assign different colors.\\n  4. Choose your Save Folder (Default: Download).\\n  5. Press Convert. Google Earth will open automatically.\\n  6. Use the WhatsApp button to share the generated KML file.\\n\\n[b][color=ffcc44]GPS Coordinates:[/color][/b]\\n  1. Ensure Phone Location/GPS Settings are ON.\\n  2. Press 'Get Coordinates'.\\n  3. Stay in an open outdoor area for best signal.\\n  4. WGS84 (Lat/Lon) and SLD99 (North/East) will be displayed.\\n  5. Share the location directly via WhatsApp."
+                    text: "[b][color=66ddff]DXF → KML:[/color][/b]\\n  1. Select your DXF file.\\n  2. Check or uncheck layers using the 'Select Layers' button.\\n  3. Tap the color dot to assign different colors.\\n  4. Choose your Save Folder (Default: Download).\\n  5. Press Convert. Google Earth will open automatically.\\n  6. Use the WhatsApp button to share the generated KML file.\\n  7. For very large DXF files, tick 'Low-memory mode' before selecting the file.\\n  8. Tick 'Save as KMZ' for a compressed file that is quicker to share.\\n  9. Dense contour layers: in Select Layers, enter a tolerance in metres and tap 'Simplify all shown'.\\n  10. Huge plans: tick 'Tiled KMZ' so Google Earth loads only the area in view.\\n  11. Only need part of the plan? Fill 'Export area' with E1,N1,E2,N2, a radius in metres around your GPS fix, or a polygon CSV.\\n\\n[b][color=80ffbf]Point Files:[/color][/b]\\n  1. Select a CSV or TXT file of points (any separator).\\n  2. Tap the direction button to choose SLD99 → WGS84 or WGS84 → SLD99.\\n  3. Enter the coordinate columns (0 = first) or their header names.\\n  4. Converted CSV and a KML of the points are saved to the Save Folder.\\n\\n[b][color=ffcc44]GPS Coordinates:[/color][/b]\\n  1. Ensure Phone Location/GPS Settings are ON.\\n  2. Press 'Get Coordinates'.\\n  3. Stay in an open outdoor area for best signal.\\n  4. WGS84 (Lat/Lon) and SLD99 (North/East) will be displayed.\\n  5. Share the location directly via WhatsApp.\\n  6. For control points, tick 'Average fixes' and keep the phone still until the count completes.\\n  7. Press 'Start Track' and walk a boundary; 'Stop Track' saves it for GPX, KML or DXF export."
                     markup: True
                     text_size: self.width, None
                     size_hint_y: None
@@ -553,6 +763,26 @@ KV = '''
 # Screen Classes
 # =====================================================
 class MainScreen(Screen): pass
+
+class LayerList(RecycleView): pass
+
+class LayerRow(RecycleDataViewBehavior, BoxLayout):
+    """One recycled Layer Manager row; all state lives in the row's data dict."""
+    layer_name = StringProperty('')
+    label_text = StringProperty('')
+    enabled = BooleanProperty(True)
+    rgba = ListProperty([1, 1, 1, 1])
+    _refreshing = False
+
+    def refresh_view_attrs(self, rv, index, data):
+        # Rebinding a recycled row must not report its checkbox change as a user toggle
+        self._refreshing = True
+        try: return super().refresh_view_attrs(rv, index, data)
+        finally: self._refreshing = False
+
+    def on_toggle(self, active):
+        if not self._refreshing:
+            App.get_running_app().set_layer_enabled(self.layer_name, active)
 class HelpScreen(Screen): pass
 class AboutScreen(Screen): pass
 
@@ -561,22 +791,57 @@ class AboutScreen(Screen): pass
 # =====================================================
 class SurveyApp(App):
     is_gps_running = False
-    _gps_timeout_event = None
+    gps_average = False
+    gps_average_fixes = GPS_AVERAGE_FIXES
+    _gps_session = None
+    _gps_limit = GPS_TIMEOUT
+    points_direction = 'sld99_to_wgs84'
+    _points_path = None
+    _points_job = None
+    _track_session = None
+    _track_log = None
+    _last_track = None
     _gps_timer_event = None
     _gps_elapsed = 0
     _layer_data = {}
+    _geom = None
+    _geom_lock = threading.Lock()
+    low_memory_mode = False
+    kmz_output = False
+    tiled_output = False
+    debug_profile = False
     
     # Store data for sharing
     _last_kml_path = None
     _last_gps_text = None
+    _last_gps_fix = None
+    _pending_writer = None
+    _job = None
+    _to_sld99 = None
+    _executor = None
 
     def on_start(self):
         # Request necessary permissions securely at startup
         request_android_permissions()
+        # Load (or build and cache) the fast transform grids off the UI thread
+        threading.Thread(target=self._load_grids, daemon=True).start()
+        self._restore_last_track()
+        self._check_unfinished_track()
+
+    def on_pause(self):
+        # Make the recorded track durable before Android may kill the app
+        if self._track_log: self._track_log.checkpoint()
+        return True
+
+    def on_stop(self):
+        if self._track_session: self._track_session.cancel()
+        if self._track_log: self._track_log.close()
+        if self._executor: self._executor.shutdown(wait=False, cancel_futures=True)
 
     def build(self):
         Builder.load_string(KV)
         self.selected_file_path = None
+        self._entity_cache = EntityCache(os.path.join(self.user_data_dir, 'convert_cache'))
         sm = ScreenManager()
         sm.add_widget(MainScreen(name='main'))
         sm.add_widget(HelpScreen(name='help'))
@@ -599,7 +864,77 @@ class SurveyApp(App):
                 self._set_gps_label(f"{self.root.get_screen('main').ids.gps_label.text}\n\n⚠ Share Error: {msg}")
 
     # =================================================
-    # GPS Tracking Thread (JNI)
+    # Point File Converter (CSV / TXT)
+    # =================================================
+    def open_points_chooser(self):
+        layout = BoxLayout(orientation='vertical')
+        fc = FileChooserListView(path='/storage/emulated/0/', filters=['*.csv', '*.CSV', '*.txt', '*.TXT'])
+        layout.add_widget(fc)
+        row = BoxLayout(size_hint_y=None, height='52dp', spacing='8dp', padding='8dp')
+        row.add_widget(Button(text="Cancel", background_color=(.8,.2,.2,1), on_release=lambda x: self._points_pop.dismiss()))
+        row.add_widget(Button(text="Select ✓", background_color=(.1,.7,.3,1), on_release=lambda x: self._on_points_selected(fc.selection)))
+        layout.add_widget(row)
+        self._points_pop = Popup(title="Select Point File", content=layout, size_hint=(.96,.93))
+        self._points_pop.open()
+
+    def _on_points_selected(self, sel):
+        if sel:
+            self._points_path = sel[0]
+            main = self.root.get_screen('main')
+            main.ids.points_file_label.text = f"✅  {os.path.basename(self._points_path)}"
+            main.ids.points_file_label.color = (.3, 1, .45, 1)
+        self._points_pop.dismiss()
+
+    def toggle_points_direction(self):
+        ids = self.root.get_screen('main').ids
+        if self.points_direction == 'sld99_to_wgs84':
+            self.points_direction = 'wgs84_to_sld99'
+            ids.points_dir_btn.text = "WGS84  →  SLD99"; ids.points_x_label.text = "Lon col"; ids.points_y_label.text = "Lat col"
+        else:
+            self.points_direction = 'sld99_to_wgs84'
+            ids.points_dir_btn.text = "SLD99  →  WGS84"; ids.points_x_label.text = "E col"; ids.points_y_label.text = "N col"
+
+    def convert_points(self):
+        ids = self.root.get_screen('main').ids
+        if self._points_job:
+            self._points_job.cancel(); return
+        if not self._points_path:
+            self._set_points_status("❌  Please select a point file first!"); return
+        save_folder = ids.save_path_input.text.strip()
+        try: os.makedirs(save_folder, exist_ok=True)
+        except Exception as e:
+            self._set_points_status(f"❌ Save folder error:\n{str(e)[:120]}"); return
+        out_path, kml_path = point_output_paths(self._points_path, self.points_direction, save_folder, self.kmz_output)
+        opts = dict(out_path=out_path, direction=self.points_direction,
+                    x_col=ids.points_x_input.text.strip() or '1', y_col=ids.points_y_input.text.strip() or '2',
+                    id_col=ids.points_id_input.text.strip() or None,
+                    kml_path=kml_path, kmz=self.kmz_output)
+        self._points_job = ConversionJob(lambda v, msg: Clock.schedule_once(lambda dt: self._set_points_status(f"{msg}  {v:.0f}%")))
+        ids.points_convert_btn.text = "✖  Cancel"
+        threading.Thread(target=self._run_points, args=(self._points_job, opts), daemon=True).start()
+
+    def _run_points(self, job, opts):
+        try:
+            out_path, stats = convert_point_file(self._points_path, job=job, **opts)
+            skipped = f"  ({stats['skipped']:,} rows skipped)" if stats['skipped'] else ""
+            msg = f"✅ {stats['points']:,} points in {format_duration(job.elapsed())}{skipped}\n{os.path.basename(out_path)} + {os.path.basename(opts['kml_path'])}"
+        except ConversionCancelled:
+            msg = "Conversion cancelled."
+        except Exception as e:
+            msg = f"❌ Error: {str(e)[:150]}"
+        Clock.schedule_once(lambda dt: self._points_done(msg))
+
+    def _points_done(self, msg):
+        self._points_job = None
+        self.root.get_screen('main').ids.points_convert_btn.text = "⚡  Convert Points"
+        self._set_points_status(msg)
+
+    def _set_points_status(self, t):
+        try: self.root.get_screen('main').ids.points_status.text = t
+        except Exception: pass
+
+    # =================================================
+    # GPS Acquisition (location listener)
     # =================================================
     def toggle_gps(self):
         if self.is_gps_running:
@@ -611,123 +946,174 @@ class SurveyApp(App):
             self._set_gps_timer("")
             return
 
-        if platform == 'android':
+        try:
+            provider = make_location_provider(platform)
+            if provider is None:
+                self._set_gps_label("GPS works on Android devices only.")
+                return
             # Hide share button initially
             main = self.root.get_screen('main')
             main.ids.share_gps_btn.height = '0dp'
             main.ids.share_gps_btn.opacity = 0
             main.ids.share_gps_btn.disabled = True
-            
-            threading.Thread(target=self._gps_fetch_thread, daemon=True).start()
-        else:
-            self._set_gps_label("GPS works on Android devices only.")
-
-    def _gps_fetch_thread(self):
-        import traceback, time
-        def show(msg): Clock.schedule_once(lambda dt: self._set_gps_label(msg))
 
-        try:
-            from jnius import autoclass
-            try:
-                ActivityThread = autoclass('android.app.ActivityThread')
-                app_context = ActivityThread.currentApplication().getApplicationContext()
-            except Exception as e1:
-                show(f"❌ Cannot access Android context.\nEnsure Location permission is allowed in Settings.")
-                self._cancel_gps_timers()
-                self.is_gps_running = False
-                return
+            if self.gps_average:
+                self._gps_session = AveragingSession(provider, fixes=self.gps_average_fixes,
+                    on_update=lambda avg: Clock.schedule_once(lambda dt: self._gps_averaging(avg)),
+                    on_done=lambda avg, complete: Clock.schedule_once(lambda dt: self._gps_average_done(avg, complete)))
+                self._gps_limit = GPS_AVERAGE_TIMEOUT
+            else:
+                self._gps_session = FixSession(provider,
+                    on_update=lambda fix: Clock.schedule_once(lambda dt: self._gps_improving(fix)),
+                    on_done=lambda fix, live: Clock.schedule_once(lambda dt: self._gps_session_done(fix, live)))
+                self._gps_limit = GPS_TIMEOUT
+            self._gps_session.start()
+        except GPSUnavailable as e:
+            self._set_gps_label(str(e)); return
+        except Exception as e:
+            self._set_gps_label(f"❌ GPS Error:\n{str(e)[:120]}"); return
+
+        self.is_gps_running = True
+        self._gps_elapsed = 0
+        self._set_btn_stop()
+        self._set_gps_timer("Connecting to satellites...")
+        self._gps_timer_event = Clock.schedule_interval(self._gps_count, 1)
+
+    def _load_grids(self):
+        # Resolved once, so live fixes call the grid directly without the build lock
+        self._to_sld99 = transform_grids(self.user_data_dir)[1]
+
+    def _gps_improving(self, fix):
+        if not self.is_gps_running: return
+        # Live readout uses the grid (exact until it has loaded); the final fix is transformed exactly
+        east, north = (self._to_sld99 or wgs84_to_sld99)(fix.lon, fix.lat)
+        self._set_gps_label(f"🛰 Improving Signal...\nLat: {fix.lat:.6f}°\nLon: {fix.lon:.6f}°\nN: {north:.1f}  E: {east:.1f}\nAccuracy: ±{fix.acc:.0f} m")
+
+    def _gps_averaging(self, avg):
+        if not self.is_gps_running: return
+        self._set_gps_label(f"📐 Averaging... {avg.count}/{self.gps_average_fixes} fixes\nN: {avg.north:.2f}  E: {avg.east:.2f}\nσ: ±{avg.std:.2f} m   Rejected: {avg.rejected}")
+
+    def _gps_average_done(self, avg, complete):
+        if not self.is_gps_running: return
+        if avg is None:
+            self._gps_session_done(None, False); return
+        self._cancel_gps_timers()
+        self.is_gps_running = False
+        try: self.root.get_screen('main').ids.gps_btn.text = "📍  Get Coordinates"
+        except Exception: pass
+        tag = "✅ Averaged" if complete else f"📍 Partial Average ({avg.count}/{self.gps_average_fixes})"
+        final_text = (
+            f"--- WGS84 ---\n"
+            f"Lat: {avg.lat:.7f}°\n"
+            f"Lon: {avg.lon:.7f}°\n"
+            f"--- SLD99 ---\n"
+            f"North: {avg.north:.3f} m\n"
+            f"East: {avg.east:.3f} m\n"
+            f"σN: ±{avg.std_n:.2f} m  σE: ±{avg.std_e:.2f} m\n"
+            f"Fixes: {avg.count}  Rejected: {avg.rejected}"
+        )
+        self._gps_publish(tag, final_text, avg.lat, avg.lon)
 
-            Context = autoclass('android.content.Context')
-            LM_cls  = autoclass('android.location.LocationManager')
-            lm = app_context.getSystemService(Context.LOCATION_SERVICE)
+    def _gps_session_done(self, fix, live):
+        if not self.is_gps_running: return
+        if fix is not None:
+            self._gps_done(fix.lat, fix.lon, fix.alt, fix.acc, live=live)
+            return
+        self._cancel_gps_timers()
+        self.is_gps_running = False
+        self._set_gps_label("⏰ Timeout — No location found.\nMove to an open area outside.")
+        self._set_gps_timer("")
+        try: self.root.get_screen('main').ids.gps_btn.text = '📍  Get Coordinates'
+        except Exception: pass
 
-            GPS_P     = LM_cls.GPS_PROVIDER
-            NET_P     = LM_cls.NETWORK_PROVIDER
-            PASSIVE_P = LM_cls.PASSIVE_PROVIDER
+    # =================================================
+    # GPS Track Logging
+    # =================================================
+    def _track_dir(self):
+        d = os.path.join(self.user_data_dir, 'tracks'); os.makedirs(d, exist_ok=True)
+        return d
+
+    def _restore_last_track(self):
+        # Saved tracks outlive the app; the newest one is offered for export again
+        d = self._track_dir()
+        saved = sorted(f for f in os.listdir(d) if f.startswith('track_') and f.endswith('.smtrk'))
+        if not saved: return
+        self._last_track = os.path.join(d, saved[-1])
+        self._set_track_export_enabled(True)
+        self._set_track_label(f"Last track: {saved[-1]}\nExport it below.")
+
+    def _check_unfinished_track(self):
+        path = os.path.join(self._track_dir(), 'current.smtrk')
+        if not os.path.exists(path): return
+        try:
+            log = TrackLog(path); n = log.points; log.close()
+        except (OSError, ValueError): return
+        if n: self._set_track_label(f"Unfinished track found ({n} points).\nPress 'Start Track' to resume it.")
 
-            # Permissions
-            try:
-                PackageManager  = autoclass('android.content.pm.PackageManager')
-                PERMISSION_FINE = "android.permission.ACCESS_FINE_LOCATION"
-                if app_context.checkSelfPermission(PERMISSION_FINE) != PackageManager.PERMISSION_GRANTED:
-                    show("❌ Location permission NOT granted!\nPlease allow Location in App Settings.")
-                    self._cancel_gps_timers()
-                    self.is_gps_running = False
-                    return
-            except Exception: pass
+    def toggle_track(self):
+        main = self.root.get_screen('main')
+        if self._track_session:
+            self._track_session.cancel(); self._track_session = None
+            log = self._track_log; self._track_log = None
+            log.close()
+            main.ids.track_btn.text = "🚶  Start Track"
+            if not log.points:
+                os.remove(log.path); self._set_track_label("Track stopped (no points recorded)."); return
+            self._last_track = os.path.join(self._track_dir(), time.strftime('track_%Y%m%d_%H%M%S.smtrk'))
+            os.replace(log.path, self._last_track)
+            self._set_track_label(f"✅ Track saved: {log.points} points, {log.length:,.0f} m.\nExport it below.")
+            self._set_track_export_enabled(True)
+            return
 
-            gps_on = False; net_on = False
+        try:
+            provider = make_location_provider(platform, walking=True)
+            if provider is None:
+                self._set_track_label("GPS works on Android devices only."); return
+            log = TrackLog(os.path.join(self._track_dir(), 'current.smtrk'))
+            session = TrackSession(provider, log, on_update=lambda lg: Clock.schedule_once(lambda dt: self._track_update(lg)))
             try:
-                gps_on = lm.isProviderEnabled(GPS_P)
-                net_on = lm.isProviderEnabled(NET_P)
-            except Exception: pass
-
-            if not gps_on and not net_on:
-                show("⚠ Phone Location is OFF!\nPlease turn on GPS in your Phone Settings.")
-                self._cancel_gps_timers()
-                self.is_gps_running = False
-                return
-
-            Clock.schedule_once(lambda dt: self._set_gps_timer("Connecting to satellites..."))
-
-            rough_loc = None
-            for provider in [NET_P, GPS_P, PASSIVE_P]:
-                try:
-                    loc = lm.getLastKnownLocation(provider)
-                    if loc is not None:
-                        rough_loc = loc; break
-                except Exception: pass
-
-            self.is_gps_running = True
-            self._gps_elapsed = 0
-            Clock.schedule_once(lambda dt: self._set_btn_stop())
-            self._gps_timer_event = Clock.schedule_interval(self._gps_count, 1)
-            self._gps_timeout_event = Clock.schedule_once(self._gps_timed_out, GPS_TIMEOUT)
-
-            start_time = time.time()
-            best_acc   = 9999.0
-            best_loc   = rough_loc
-
-            while self.is_gps_running and (time.time() - start_time) < GPS_TIMEOUT:
-                time.sleep(2)
-                if not self.is_gps_running: break
-                try:
-                    for p in [GPS_P, NET_P]:
-                        gloc = lm.getLastKnownLocation(p)
-                        if gloc is None: continue
-                        acc = gloc.getAccuracy()
-                        if acc < best_acc - 2:
-                            best_acc = acc
-                            best_loc = gloc
-                            lat = gloc.getLatitude()
-                            lon = gloc.getLongitude()
-                            alt = gloc.getAltitude()
-                            if acc <= 20.0:
-                                Clock.schedule_once(lambda dt, la=lat, lo=lon, al=alt, ac=acc: self._gps_done(la, lo, al, ac, live=True))
-                                return
-                            
-                            Clock.schedule_once(lambda dt, la=lat, lo=lon, al=alt, ac=acc: self._set_gps_label(
-                                    f"🛰 Improving Signal...\nLat: {la:.6f}°\nLon: {lo:.6f}°\nAccuracy: ±{ac:.0f} m"
-                                ))
-                except Exception: pass
-
-            if self.is_gps_running:
-                if best_loc is not None:
-                    lat = best_loc.getLatitude()
-                    lon = best_loc.getLongitude()
-                    alt = best_loc.getAltitude()
-                    acc = best_loc.getAccuracy()
-                    Clock.schedule_once(lambda dt, la=lat, lo=lon, al=alt, ac=acc: self._gps_done(la, lo, al, ac, live=False))
-                else:
-                    show("⏰ Timeout — No location found.\nMove to an open area outside.")
-                    self._cancel_gps_timers()
-                    self.is_gps_running = False
-                    Clock.schedule_once(lambda dt: setattr(self.root.get_screen('main').ids.gps_btn, 'text', '📍  Get Coordinates'))
-
+                session.start()
+            except BaseException:
+                log.close(); raise
+        except GPSUnavailable as e:
+            self._set_track_label(str(e)); return
         except Exception as e:
-            show(f"❌ GPS Error:\n{str(e)[:120]}")
-            self._cancel_gps_timers()
-            self.is_gps_running = False
+            self._set_track_label(f"❌ Track Error:\n{str(e)[:120]}"); return
+        self._track_log = log; self._track_session = session
+        main.ids.track_btn.text = "⏹  Stop Track"
+        resumed = f" (resumed {log.resumed} points)" if log.resumed else ""
+        self._set_track_label(f"🔴 Waiting for GPS fixes...{resumed}")
+
+    def _track_update(self, log):
+        if log is not self._track_log: return
+        self._set_track_label(f"🔴 Recording: {log.points} points, {log.length:,.0f} m\nN: {log.last[1]:.1f}  E: {log.last[0]:.1f}")
+
+    def export_track(self, fmt):
+        if not self._last_track: return
+        try:
+            save_folder = self.root.get_screen('main').ids.save_path_input.text.strip()
+            os.makedirs(save_folder, exist_ok=True)
+        except Exception as e:
+            self._set_track_label(f"❌ Save folder error:\n{str(e)[:120]}"); return
+        base = os.path.splitext(os.path.basename(self._last_track))[0]
+        out = os.path.join(save_folder, f"{base}.{fmt}")
+        self._set_track_label(f"Exporting {fmt.upper()}...")
+        def work():
+            try:
+                export_track(self._last_track, out, fmt)
+                msg = f"✅ Saved: {out}"
+            except Exception as e:
+                msg = f"❌ Export failed: {str(e)[:120]}"
+            Clock.schedule_once(lambda dt: self._set_track_label(msg))
+        threading.Thread(target=work, daemon=True).start()
+
+    def _set_track_export_enabled(self, state):
+        ids = self.root.get_screen('main').ids
+        for b in (ids.track_gpx_btn, ids.track_kml_btn, ids.track_dxf_btn): b.disabled = not state
+
+    def _set_track_label(self, t):
+        try: self.root.get_screen('main').ids.track_label.text = t
+        except Exception: pass
 
     def _set_btn_stop(self):
         try: self.root.get_screen('main').ids.gps_btn.text = "⏹  Stop GPS"
@@ -752,8 +1138,11 @@ class SurveyApp(App):
             f"East: {east:.3f} m\n"
             f"Accuracy: ±{acc:.0f} m"
         )
-        
+        self._gps_publish(tag, final_text, lat, lon)
+
+    def _gps_publish(self, tag, final_text, lat, lon):
         # Save text for WhatsApp Share
+        self._last_gps_fix = (lat, lon)
         self._last_gps_text = f"📍 Location Survey Data\n\n{final_text}\n\nMap: https://maps.google.com/?q={lat},{lon}"
         
         self._set_gps_label(f"{tag}:\n{final_text}")
@@ -767,15 +1156,11 @@ class SurveyApp(App):
 
     def _gps_count(self, dt):
         self._gps_elapsed += 1
-        self._set_gps_timer(f"⏱  {self._gps_elapsed}s / {GPS_TIMEOUT}s")
-
-    def _gps_timed_out(self, dt):
-        self.is_gps_running = False
-        self._cancel_gps_timers()
+        self._set_gps_timer(f"⏱  {self._gps_elapsed}s / {self._gps_limit}s")
 
     def _cancel_gps_timers(self):
-        if self._gps_timeout_event:
-            self._gps_timeout_event.cancel(); self._gps_timeout_event = None
+        if self._gps_session:
+            self._gps_session.cancel(); self._gps_session = None
         if self._gps_timer_event:
             self._gps_timer_event.cancel(); self._gps_timer_event = None
 
@@ -820,28 +1205,68 @@ class SurveyApp(App):
             main.ids.share_kml_btn.height = '0dp'
             main.ids.share_kml_btn.opacity = 0
             main.ids.share_kml_btn.disabled = True
+            self._geom = None
             threading.Thread(target=self._scan_layers, daemon=True).start()
         self._dxf_pop.dismiss()
 
+    def _load_geometry(self, progress=None, profile=None):
+        """Return the extracted geometry of the selected DXF, reading the
+        file only when it is not cached or has changed on disk."""
+        with self._geom_lock:
+            path = self.selected_file_path
+            key = dxf_file_key(path)
+            if self._geom is not None and self._geom.key == key:
+                return self._geom
+            self._geom = None
+            geom = read_geometry(path, progress, profile)
+            if path == self.selected_file_path:
+                self._geom = geom
+            return geom
+
+    def set_low_memory_mode(self, state):
+        self.low_memory_mode = state
+        if state: self._geom = None
+
+    def set_gps_average(self, state):
+        self.gps_average = state
+
+    def set_kmz_output(self, state):
+        self.kmz_output = state
+
+    def set_tiled_output(self, state):
+        self.tiled_output = state
+
+    def set_debug_profile(self, state):
+        self.debug_profile = state
+
     def _scan_layers(self):
+        path = self.selected_file_path
+        self._layer_data = {}
+        def partial(counts, fraction):
+            # Layers appear in the Layer Manager while the scan is still running
+            if path != self.selected_file_path: return
+            self._layer_data = merge_layer_data(self._layer_data, counts)
+            Clock.schedule_once(lambda dt, n=len(counts): self._set_layer_status(f"Scanning... {n} layer(s) so far ({fraction:.0%})"))
         try:
-            import ezdxf
-            doc = ezdxf.readfile(self.selected_file_path)
-            msp = doc.modelspace()
-            layers_found = {}
-            for e in msp:
-                if e.dxftype() in ['LWPOLYLINE', 'POLYLINE', 'LINE']:
-                    ln = e.dxf.layer if hasattr(e.dxf, 'layer') else '0'
-                    if ln not in layers_found:
-                        idx = len(layers_found)
-                        cname, ckml = get_layer_color(idx)
-                        layers_found[ln] = {'enabled': True, 'color_name': cname, 'color_kml': ckml, 'count': 0}
-                    layers_found[ln]['count'] += 1
-
-            self._layer_data = layers_found
+            try:
+                layer_counts = scan_layer_counts(path, partial)
+            except ValueError:
+                # Binary DXF: let ezdxf do the scan
+                if self.low_memory_mode:
+                    layer_counts = count_layers(iter_dxf_entities(path))
+                else:
+                    layer_counts = self._load_geometry().layer_counts
+            if path != self.selected_file_path: return
+            self._layer_data = merge_layer_data(self._layer_data, layer_counts)
             Clock.schedule_once(lambda dt: self._update_layer_status())
         except Exception as e:
             Clock.schedule_once(lambda dt: self._set_layer_status(f"Scan error: {e}"))
+            return
+
+        # Parse the drawing in the background so Convert can reuse it
+        if not self.low_memory_mode:
+            try: self._load_geometry()
+            except Exception: pass
 
     def _update_layer_status(self):
         n = len(self._layer_data)
@@ -860,28 +1285,31 @@ class SurveyApp(App):
         outer.add_widget(Label(text="[b]Layer Manager[/b]", markup=True, size_hint_y=None, height='32dp', color=(.5,.85,1,1)))
         outer.add_widget(Label(text="Check = Include in KML  |  Tap color to change", size_hint_y=None, height='22dp', font_size='12sp', color=(.7,.7,.7,1)))
 
-        scroll = ScrollView(size_hint=(1, 1))
-        grid = GridLayout(cols=1, size_hint_y=None, spacing='4dp', padding='4dp')
-        grid.bind(minimum_height=grid.setter('height'))
-
-        self._layer_checkboxes = {}
-        for lname, ldata in self._layer_data.items():
-            row = BoxLayout(size_hint_y=None, height='46dp', spacing='8dp')
-            cb = CheckBox(size_hint_x=None, width='40dp', active=ldata['enabled'])
-            self._layer_checkboxes[lname] = cb
-            rgb = kml_color_to_rgb(ldata['color_kml'])
-            color_btn = Button(size_hint_x=None, width='44dp', background_normal='', background_color=(rgb[0], rgb[1], rgb[2], 1), text='')
-            color_btn._layer_name = lname
-            color_btn.bind(on_release=self._cycle_layer_color)
-            lbl = Label(text=f"{lname}  ({ldata['count']} items)  [{ldata['color_name']}]", halign='left', valign='middle', text_size=(None, None), font_size='13sp')
-            lbl.bind(size=lambda inst, val: setattr(inst, 'text_size', (val[0], None)))
-
-            row.add_widget(cb); row.add_widget(color_btn); row.add_widget(lbl)
-            grid.add_widget(row)
-            ldata['_lbl'] = lbl; ldata['_color_btn'] = color_btn
-
-        scroll.add_widget(grid)
-        outer.add_widget(scroll)
+        self._layer_filter = ''
+        filter_input = TextInput(hint_text="Filter layers (text or pattern, e.g. ROAD*)", multiline=False, size_hint_y=None, height='40dp',
+                                 font_size='13sp', background_color=(.1,.1,.15,1), foreground_color=(1,1,1,1), cursor_color=(.5,.8,1,1))
+        filter_input.bind(text=lambda inst, val: self._set_layer_filter(val))
+        outer.add_widget(filter_input)
+
+        # Only the visible rows exist as widgets; the rows are rebuilt from _layer_data
+        self._layer_list = LayerList()
+        outer.add_widget(self._layer_list)
+        self._refresh_layer_list()
+
+        self._bulk_color_idx = 0
+        bulk_row = BoxLayout(size_hint_y=None, height='42dp', spacing='8dp')
+        self._bulk_color_btn = Button(background_normal='', on_release=self._cycle_bulk_color)
+        self._show_bulk_color()
+        bulk_row.add_widget(self._bulk_color_btn)
+        bulk_row.add_widget(Button(text="Color all shown", background_normal='', background_color=(.3,.2,.55,1), on_release=self._apply_bulk_color))
+        outer.add_widget(bulk_row)
+
+        simplify_row = BoxLayout(size_hint_y=None, height='42dp', spacing='8dp')
+        self._simplify_input = TextInput(hint_text="Simplify (m), 0 = off", multiline=False, input_filter='float', font_size='13sp',
+                                         background_color=(.1,.1,.15,1), foreground_color=(1,1,1,1), cursor_color=(.5,.8,1,1))
+        simplify_row.add_widget(self._simplify_input)
+        simplify_row.add_widget(Button(text="Simplify all shown", background_normal='', background_color=(.2,.45,.4,1), on_release=self._apply_bulk_simplify))
+        outer.add_widget(simplify_row)
 
         btn_row = BoxLayout(size_hint_y=None, height='48dp', spacing='8dp')
         btn_row.add_widget(Button(text="Select All", background_normal='', background_color=(.2,.5,.8,1), on_release=lambda x: self._select_all_layers(True)))
@@ -892,22 +1320,79 @@ class SurveyApp(App):
         self._layer_pop = Popup(title="Layer Manager", content=outer, size_hint=(.95, .88))
         self._layer_pop.open()
 
-    def _cycle_layer_color(self, btn):
-        lname = btn._layer_name
+    def _shown_layers(self):
+        """Names of the layers matching the Layer Manager filter, in drawing order.
+        Text with * ? [ is a case-insensitive wildcard pattern, anything else a substring."""
+        f = self._layer_filter.strip().lower()
+        if not f: return list(self._layer_data)
+        if any(ch in f for ch in '*?['):
+            return [ln for ln in self._layer_data if fnmatch.fnmatchcase(ln.lower(), f)]
+        return [ln for ln in self._layer_data if f in ln.lower()]
+
+    def _layer_row_data(self, lname):
+        ldata = self._layer_data[lname]
+        rgb = kml_color_to_rgb(ldata['color_kml'])
+        simplify = f"  ~{ldata['simplify']:g} m" if ldata.get('simplify') else ""
+        return {'layer_name': lname, 'enabled': ldata['enabled'], 'rgba': [rgb[0], rgb[1], rgb[2], 1],
+                'label_text': f"{lname}  ({ldata['count']} items)  [{ldata['color_name']}]{simplify}"}
+
+    def _refresh_layer_list(self):
+        self._layer_list.data = [self._layer_row_data(ln) for ln in self._shown_layers()]
+
+    def _update_layer_row(self, lname):
+        for i, row in enumerate(self._layer_list.data):
+            if row['layer_name'] == lname:
+                self._layer_list.data[i] = self._layer_row_data(lname)
+                break
+
+    def _set_layer_filter(self, text):
+        self._layer_filter = text
+        self._refresh_layer_list()
+
+    def set_layer_enabled(self, lname, state):
+        ldata = self._layer_data.get(lname)
+        if ldata is None or ldata['enabled'] == state: return
+        ldata['enabled'] = state
+        self._update_layer_row(lname)
+
+    def cycle_layer_color(self, lname):
         ldata = self._layer_data[lname]
         cur_idx = next((i for i, c in enumerate(LAYER_COLORS_HEX) if c[1] == ldata['color_kml']), 0)
         next_idx = (cur_idx + 1) % len(LAYER_COLORS_HEX)
-        cname, ckml = LAYER_COLORS_HEX[next_idx]
-        ldata['color_name'] = cname; ldata['color_kml'] = ckml
+        ldata['color_name'], ldata['color_kml'] = LAYER_COLORS_HEX[next_idx]
+        self._update_layer_row(lname)
+
+    def _show_bulk_color(self):
+        cname, ckml = LAYER_COLORS_HEX[self._bulk_color_idx]
         rgb = kml_color_to_rgb(ckml)
-        btn.background_color = (rgb[0], rgb[1], rgb[2], 1)
-        ldata['_lbl'].text = f"{lname}  ({ldata['count']} items)  [{cname}]"
+        self._bulk_color_btn.text = f"Color: {cname}"
+        self._bulk_color_btn.background_color = (rgb[0]*.7, rgb[1]*.7, rgb[2]*.7, 1)
+
+    def _cycle_bulk_color(self, *args):
+        self._bulk_color_idx = (self._bulk_color_idx + 1) % len(LAYER_COLORS_HEX)
+        self._show_bulk_color()
+
+    def _apply_bulk_color(self, *args):
+        cname, ckml = LAYER_COLORS_HEX[self._bulk_color_idx]
+        for ln in self._shown_layers():
+            ldata = self._layer_data[ln]
+            ldata['color_name'] = cname; ldata['color_kml'] = ckml
+        self._refresh_layer_list()
+
+    def _apply_bulk_simplify(self, *args):
+        # Douglas–Peucker tolerance in SLD99 metres for the shown layers; blank or 0 turns it off
+        try: tol = max(float(self._simplify_input.text or 0), 0.0)
+        except ValueError: return
+        for ln in self._shown_layers():
+            if tol: self._layer_data[ln]['simplify'] = tol
+            else: self._layer_data[ln].pop('simplify', None)
+        self._refresh_layer_list()
 
     def _select_all_layers(self, state):
-        for cb in self._layer_checkboxes.values(): cb.active = state
+        for ln in self._shown_layers(): self._layer_data[ln]['enabled'] = state
+        self._refresh_layer_list()
 
     def _apply_layer_selection(self, *args):
-        for lname, cb in self._layer_checkboxes.items(): self._layer_data[lname]['enabled'] = cb.active
         enabled = sum(1 for l in self._layer_data.values() if l['enabled'])
         self._set_layer_status(f"✅ {enabled}/{len(self._layer_data)} layers selected.")
         self._layer_pop.dismiss()
@@ -942,101 +1427,115 @@ class SurveyApp(App):
             
         main.ids.convert_btn.disabled = True
         main.ids.convert_btn.text = "⏳  Converting..."
-        main.ids.progress_box.height = '52dp'
+        main.ids.progress_box.height = '60dp'
         main.ids.progress_box.opacity = 1
         main.ids.convert_progress.value = 0
         main.ids.progress_label.text = "Preparing..."
+        main.ids.cancel_btn.disabled = False
         main.ids.convert_status.text = ""
         main.ids.convert_status.height = '0dp'
-        threading.Thread(target=self._run_conversion, daemon=True).start()
+        self._job = ConversionJob(lambda v, msg: Clock.schedule_once(lambda dt: self._set_progress(v, msg)),
+                                  profile=StageProfile(trace_memory=self.debug_profile))
+        threading.Thread(target=self._run_conversion, args=(self._job,), daemon=True).start()
 
-    def _run_conversion(self):
-        def upd(v, msg): Clock.schedule_once(lambda dt: self._set_progress(v, msg))
-        def done(ok, msg, path=None): Clock.schedule_once(lambda dt: self._finish(ok, msg, path))
+    def cancel_conversion(self):
+        if self._job:
+            self._job.cancel()
+            try:
+                main = self.root.get_screen('main')
+                main.ids.cancel_btn.disabled = True
+                main.ids.progress_label.text = "Cancelling..."
+            except Exception: pass
 
-        try: import ezdxf
-        except ImportError:
-            done(False, "❌ ezdxf not installed!"); return
+    def _run_conversion(self, job):
+        upd = job.progress
+        def done(ok, msg, path=None): Clock.schedule_once(lambda dt: self._finish(ok, msg, path))
 
+        writer = None
+        profile = job.profile
+        profile.start()
         try:
-            upd(10, "Reading DXF file...")
-            doc = ezdxf.readfile(self.selected_file_path)
-            msp = doc.modelspace()
-            upd(20, "Scanning entities...")
-            entities = [e for e in msp if e.dxftype() in ['LWPOLYLINE','POLYLINE','LINE']]
-            total = max(len(entities), 1)
-
-            active_layers = {ln for ln, ld in self._layer_data.items() if ld.get('enabled', True)} if self._layer_data else None
-            upd(30, f"{len(entities)} entities found...")
-
-            styles_xml = ""
-            for ln, ld in self._layer_data.items():
-                if not ld.get('enabled', True): continue
-                style_id = ln.replace(' ', '_').replace('/', '_')
-                styles_xml += f'  <Style id="layer_{style_id}"><LineStyle><color>{ld["color_kml"]}</color><width>2</width></LineStyle></Style>\n'
-            styles_xml += '  <Style id="layer_default"><LineStyle><color>ff0000ff</color><width>2</width></LineStyle></Style>\n'
-
-            kml = '<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2">\n<Document>\n  <n>Survey Plan - SLD99</n>\n' + styles_xml
-            lines_found = 0; skipped = 0
-
-            for i, entity in enumerate(entities):
-                if i % 10 == 0:
-                    upd(30 + int((i / total) * 55), f"Converting {i+1} / {total}...")
-                try:
-                    layer_name = entity.dxf.layer if hasattr(entity.dxf, 'layer') else '0'
-                    if active_layers is not None and layer_name not in active_layers:
-                        skipped += 1; continue
-
-                    style_id = layer_name.replace(' ', '_').replace('/', '_')
-                    style_ref = f"layer_{style_id}" if layer_name in self._layer_data else "layer_default"
-
-                    if entity.dxftype() in ['LWPOLYLINE', 'POLYLINE']:
-                        pts = list(entity.get_points('xy')) if entity.dxftype() == 'LWPOLYLINE' else list(entity.points())
-                        if len(pts) < 2: continue
-                        coords = " ".join(f"{sld99_to_wgs84(p[0],p[1])[0]:.7f},{sld99_to_wgs84(p[0],p[1])[1]:.7f},0" for p in pts)
-                    elif entity.dxftype() == 'LINE':
-                        s = entity.dxf.start; e2 = entity.dxf.end
-                        l1 = sld99_to_wgs84(s[0], s[1]); l2 = sld99_to_wgs84(e2[0], e2[1])
-                        coords = f"{l1[0]:.7f},{l1[1]:.7f},0 {l2[0]:.7f},{l2[1]:.7f},0"
-                    else: continue
-
-                    kml += f'  <Placemark><n>{layer_name} #{lines_found+1}</n><styleUrl>#{style_ref}</styleUrl><LineString><tessellate>1</tessellate><coordinates>{coords}</coordinates></LineString></Placemark>\n'
-                    lines_found += 1
-                except Exception: continue
-
-            kml += '</Document>\n</kml>'
-
-            if lines_found == 0:
-                done(False, "❌ No convertible entities found!")
-                return
-
-            upd(88, "Saving KML file...")
             save_folder = self.root.get_screen('main').ids.save_path_input.text.strip()
             os.makedirs(save_folder, exist_ok=True)
             base = os.path.splitext(os.path.basename(self.selected_file_path))[0]
-            save_path = os.path.join(save_folder, base + ".kml")
+            fix = wgs84_to_sld99(self._last_gps_fix[1], self._last_gps_fix[0]) if self._last_gps_fix else None
+            clip = parse_clip(self.root.get_screen('main').ids.clip_input.text, fix)
+            # Tiles are always packed in a KMZ so the result stays a single file to open and share
+            writer = TiledKMLWriter(save_folder, kmz=True) if self.tiled_output else KMLWriter(save_folder, kmz=self.kmz_output)
+            save_path = os.path.join(save_folder, base + writer.ext)
+
+            executor = self._conversion_executor()
+            stats = convert_to_writer(self.selected_file_path, writer, self._layer_data,
+                                      low_memory=self.low_memory_mode and self._geom is None,
+                                      load_geometry=lambda path, progress, prof: self._load_geometry(progress, prof),
+                                      job=job, executor=executor, entity_cache=self._entity_cache, clip=clip)
+            skipped = stats['skipped']
+
+            lines_found = writer.placemarks
+            if lines_found == 0:
+                writer.discard()
+                done(False, "❌ No entities inside the export area!" if clip else "❌ No convertible entities found!")
+                return
+
+            upd(88, "Saving KML file...", force=True)
+            with profile.stage('write'):
+                writer.close()
+            profile.stop()
+            if stats['reused'] and not stats['vertices']:
+                cache_note = f"All {stats['reused']} entities reused from cache."
+            else:
+                cache_note = f"{stats['unique_vertices']} unique of {stats['vertices']} vertices ({stats['vertices'] / max(stats['unique_vertices'], 1):.1f}× dedup)."
+                if stats['reused']: cache_note += f" {stats['reused']} entities reused."
+            if stats['simplified']: cache_note += f" ✂ {stats['simplified']:,} vertices simplified away."
+            if stats['dropped']: cache_note += f" ⚠ {stats['dropped']:,} malformed entities could not be read."
+            if clip: cache_note += f" ✂ {clip.describe()}: {stats['clipped']:,} entities outside left out."
+            if self.tiled_output: cache_note += f" ▦ {writer.tiles:,} tiles."
+            cache_note += f"\n⏱ {profile.summary()}"
 
             if os.path.exists(save_path):
-                self._pending_kml = kml
+                self._pending_writer = writer
                 self._pending_save_path = save_path
                 self._pending_lines = lines_found
                 self._pending_skipped = skipped
+                self._pending_cache_note = cache_note
+                self._pending_stats = stats
                 Clock.schedule_once(lambda dt: self._show_overwrite_popup())
                 return
 
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(kml)
-
-            upd(100, "✅ Done!")
-            done(True, f"✅ KML created!\n{lines_found} lines converted.\n📁 {save_path}", save_path)
+            upd(100, "✅ Done!", force=True)
+            writer.commit(save_path)
+            self._save_profile(save_path, stats)
+            done(True, f"✅ {writer.ext[1:].upper()} created!\n{lines_found} lines converted in {format_duration(job.elapsed())}.\n{cache_note}\n📁 {save_path}", save_path)
 
+        except ConversionCancelled:
+            if writer: writer.discard()
+            Clock.schedule_once(lambda dt: self._reset_convert_ui("⏹ Conversion cancelled."))
         except Exception as e:
+            if writer: writer.discard()
+            if isinstance(e, BrokenExecutor): self._executor = None
             done(False, f"❌ Error:\n{str(e)[:80]}")
+        finally:
+            profile.stop()
+
+    def _conversion_executor(self):
+        """The worker pool, started on first use and kept for the session.
+        Spawned workers re-import main.py (Kivy included) as __mp_main__,
+        so starting a pool per conversion would pay that on every run. Workers
+        themselves only start once a job has enough vertices to split."""
+        if self._executor is None: self._executor = make_executor()
+        return self._executor
+
+    def _save_profile(self, save_path, stats):
+        """Debug mode: write the conversion's stage profile beside the KML."""
+        if not self.debug_profile or not self._job or not self._job.profile: return
+        try: self._job.profile.save(save_path + '.profile.json', source=self.selected_file_path, output=save_path, **stats)
+        except OSError: pass
 
     def _show_overwrite_popup(self):
         base_path = self._pending_save_path
         fname = os.path.basename(base_path)
         folder  = os.path.dirname(base_path)
+        ext = self._pending_writer.ext
 
         content = BoxLayout(orientation='vertical', spacing='8dp', padding='12dp')
         content.add_widget(Label(text=f"[b]File already exists![/b]\n\n[color=ffcc44]{fname}[/color]\n\nOverwrite or New Name?", markup=True, halign='center', size_hint_y=None, height='90dp'))
@@ -1053,13 +1552,15 @@ class SurveyApp(App):
             base_no_ext = os.path.splitext(fname)[0]
             counter = 1
             while True:
-                new_path = os.path.join(folder, f"{base_no_ext}_{counter}.kml")
+                new_path = os.path.join(folder, f"{base_no_ext}_{counter}{ext}")
                 if not os.path.exists(new_path): break
                 counter += 1
             self._save_kml_final(new_path, overwrite=False)
 
         def do_cancel(x):
             pop.dismiss()
+            self._pending_writer.discard()
+            self._pending_writer = None
             self._reset_convert_ui("Save cancelled.")
 
         btn_row.add_widget(Button(text="Overwrite", background_color=(.8,.3,.1,1), on_release=do_overwrite))
@@ -1070,10 +1571,12 @@ class SurveyApp(App):
 
     def _save_kml_final(self, save_path, overwrite):
         try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(self._pending_kml)
+            kind = self._pending_writer.ext[1:].upper()
+            self._pending_writer.commit(save_path)
+            self._pending_writer = None
+            self._save_profile(save_path, self._pending_stats)
             tag = "Overwritten" if overwrite else "New File"
-            self._finish(True, f"✅ KML Saved! ({tag})\n{self._pending_lines} lines.\n📁 {save_path}", save_path)
+            self._finish(True, f"✅ {kind} Saved! ({tag})\n{self._pending_lines} lines.\n{self._pending_cache_note}\n📁 {save_path}", save_path)
         except Exception as e:
             self._finish(False, f"❌ Save error: {e}")
 
@@ -1105,7 +1608,7 @@ class SurveyApp(App):
             main.ids.convert_btn.disabled = False
             main.ids.convert_btn.text = "🔄  Convert & Create KML"
             main.ids.convert_status.text = msg
-            main.ids.convert_status.height = '90dp'
+            main.ids.convert_status.height = '130dp'
             main.ids.convert_status.color = (.3,1,.5,1) if ok else (1,.4,.4,1)
             
             if ok and path:
@@ -0,0 +1,233 @@
+"""
+Converter tests on small drawings built with ezdxf in a temporary folder.
+
+Usage:  python -m pytest -q tests
+"""
+import os
+import csv
+import sys
+import math
+import pickle
+import random
+from array import array
+
+import ezdxf
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import converter
+from converter import (scan_layer_counts, read_geometry, count_layers, iter_dxf_entities,
+                       default_layer_data, convert_file, sld99_to_wgs84, convert_point_file, points_main,
+                       make_executor, EntityCache, simplify_indices, part_bounds, SpatialIndex, ClipRegion,
+                       parse_clip)
+
+SINHALA = "මායිම"   # "boundary"
+
+def _lines_dxf(path, version, layers):
+    """One LINE per entry of `layers`, on that layer, 10 m apart."""
+    doc = ezdxf.new(version); msp = doc.modelspace()
+    for i, ln in enumerate(layers):
+        msp.add_line((400000 + 10 * i, 500000), (400000 + 10 * i, 500010), dxfattribs={'layer': ln})
+    doc.saveas(path)
+    return path
+
+# =====================================================
+# Layer Scan
+# =====================================================
+@pytest.mark.parametrize('version', ['R12', 'R2000', 'R2004', 'R2018'])
+def test_scan_matches_extract_for_unicode_layers(tmp_path, version):
+    path = _lines_dxf(str(tmp_path / "plan.dxf"), version, [SINHALA] * 2 + ["Roads", "0"] * 3)
+    counts = scan_layer_counts(path)
+    assert counts == {SINHALA: 2, "Roads": 3, "0": 3}
+    assert counts == read_geometry(path).layer_counts
+    assert counts == count_layers(iter_dxf_entities(path))
+
+@pytest.mark.parametrize('mode', ['normal', 'low_memory', 'cached'])
+def test_unicode_layers_are_converted(tmp_path, mode):
+    path = _lines_dxf(str(tmp_path / "plan.dxf"), 'R2000', [SINHALA] * 2 + ["Roads"] * 6)
+    layer_data = default_layer_data(scan_layer_counts(path))
+    out, stats = convert_file(path, str(tmp_path / "out"), low_memory=mode == 'low_memory', layer_data=layer_data,
+                              cache_dir=str(tmp_path / "cache") if mode == 'cached' else None)
+    assert stats['placemarks'] == 8 and stats['skipped'] == 0
+    with open(out, encoding='utf-8') as f:
+        assert f.read().count(f"<n>{SINHALA} #") == 2
+
+# =====================================================
+# Block Expansion
+# =====================================================
+def _block_plan(path, scale=1.0, with_first=True):
+    doc = ezdxf.new('R2000'); msp = doc.modelspace()
+    ring = doc.blocks.new("RING"); ring.add_circle((0, 0), 1.0)
+    pair = doc.blocks.new("PAIR"); pair.add_line((0, 0), (1, 0)); pair.add_line((0, 0), (0, 1))
+    first = msp.add_blockref("PAIR", (400000, 500000))
+    second = msp.add_blockref("RING", (400100, 500000), dxfattribs={'xscale': scale, 'yscale': scale})
+    if not with_first: msp.delete_entity(first)
+    doc.saveas(path)
+    return second.dxf.handle
+
+def test_insert_handles_do_not_depend_on_earlier_entities(tmp_path):
+    h = _block_plan(str(tmp_path / "a.dxf"))
+    before = read_geometry(str(tmp_path / "a.dxf")).handles
+    _block_plan(str(tmp_path / "b.dxf"), with_first=False)
+    after = read_geometry(str(tmp_path / "b.dxf")).handles
+    assert [x for x in before if x.startswith(h + ":")] == [x for x in after if x.startswith(h + ":")] == [f"{h}:0"]
+
+def test_scaled_insert_keeps_chord_tolerance(tmp_path):
+    path = str(tmp_path / "plan.dxf")
+    _block_plan(path, scale=100.0)
+    geom = read_geometry(path, tolerance=0.1)
+    _, start, count = geom.parts[-1]
+    cx, cy = 400100, 500000
+    for i in range(start, start + count - 1):
+        mx = (geom.xs[i] + geom.xs[i + 1]) / 2; my = (geom.ys[i] + geom.ys[i + 1]) / 2
+        assert 100.0 - math.hypot(mx - cx, my - cy) <= 0.1
+
+# =====================================================
+# Point Files
+# =====================================================
+def test_point_file_pads_rows_and_transforms(tmp_path):
+    src = tmp_path / "pts.csv"
+    src.write_text("Id,East,North,Code\nA,400000,500000,BM\nB,400010,500010\nC,x,500000,BM\n", encoding='utf-8')
+    out, stats = convert_point_file(str(src), id_col='Id', kml_path=str(tmp_path / "pts.kml"))
+    assert out == str(tmp_path / "pts.csv_wgs84.csv")
+    assert stats == {'points': 2, 'skipped': 1}
+    with open(out, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["Id", "East", "North", "Code", "Lon", "Lat"]
+    assert all(len(r) == 6 for r in rows)
+    assert rows[2][3] == "" and rows[3][4:] == ["", ""]
+    lon, lat = sld99_to_wgs84(400000, 500000)
+    assert abs(float(rows[1][4]) - lon) < 1e-7 and abs(float(rows[1][5]) - lat) < 1e-7
+
+def test_points_cli_keeps_same_named_inputs_apart(tmp_path):
+    (tmp_path / "pts.csv").write_text("1,400000,500000\n", encoding='utf-8')
+    (tmp_path / "pts.txt").write_text("1 400100 500100\n2 400200 500200\n", encoding='utf-8')
+    assert points_main([str(tmp_path / "pts.csv"), str(tmp_path / "pts.txt"), '--kml']) == 0
+    for name, n in (("pts.csv", 1), ("pts.txt", 2)):
+        with open(tmp_path / (name + "_wgs84.csv"), encoding='utf-8') as f:
+            assert len(f.read().splitlines()) == n
+        assert (tmp_path / (name + ".kml")).exists()
+
+# =====================================================
+# Parallel Transform
+# =====================================================
+def test_executor_is_serial_without_processes(monkeypatch):
+    import multiprocessing
+    def unavailable(method=None): raise NotImplementedError("no sem_open")
+    monkeypatch.setattr(multiprocessing, 'get_context', unavailable)
+    assert make_executor(4) is None
+    assert make_executor(1) is None
+
+# =====================================================
+# Entity Cache
+# =====================================================
+def _kml_body(path):
+    with open(path, encoding='utf-8') as f:
+        return [l for l in f if '<Placemark>' in l]
+
+def test_entity_cache_reuses_unchanged_entities(tmp_path):
+    path = str(tmp_path / "plan.dxf"); cache = str(tmp_path / "cache")
+    doc = ezdxf.new('R2000'); msp = doc.modelspace()
+    lines = [msp.add_line((400000 + 10 * i, 500000), (400000 + 10 * i, 500010), dxfattribs={'layer': 'L'}) for i in range(20)]
+    doc.saveas(path)
+    _, first = convert_file(path, str(tmp_path / "a"), cache_dir=cache)
+    _, again = convert_file(path, str(tmp_path / "b"), cache_dir=cache)
+    assert first['reused'] == 0 and again['reused'] == 20
+
+    lines[5].dxf.end = (400055, 500020)
+    doc.saveas(path)
+    out, edited = convert_file(path, str(tmp_path / "c"), cache_dir=cache)
+    assert edited['placemarks'] == 20 and edited['reused'] == 19
+    fresh, _ = convert_file(path, str(tmp_path / "d"))
+    assert _kml_body(out) == _kml_body(fresh)
+
+def test_entity_cache_ignores_other_versions(tmp_path):
+    ec = EntityCache(str(tmp_path))
+    ec.save("plan.dxf", "hash", [["1", "L", b"d", "0,0,0 1,1,0"]])
+    assert ec.load("plan.dxf")['entities'][0][3] == "0,0,0 1,1,0"
+    with open(ec._path("plan.dxf"), 'rb') as f: rec = pickle.load(f)
+    rec['version'] = EntityCache.VERSION - 1
+    with open(ec._path("plan.dxf"), 'wb') as f: pickle.dump(rec, f)
+    assert ec.load("plan.dxf") is None
+
+# =====================================================
+# Line Simplification
+# =====================================================
+def _offset(xs, ys, m, a, b):
+    """Distance of vertex m from the segment a-b."""
+    dx = xs[b] - xs[a]; dy = ys[b] - ys[a]
+    L = dx * dx + dy * dy
+    t = max(0.0, min(1.0, ((xs[m] - xs[a]) * dx + (ys[m] - ys[a]) * dy) / L))
+    return math.hypot(xs[m] - xs[a] - t * dx, ys[m] - ys[a] - t * dy)
+
+@pytest.mark.parametrize('count', [20, 500])
+def test_simplify_keeps_vertices_within_tolerance(monkeypatch, count):
+    rnd = random.Random(count)
+    xs = array('d', [0.0] * 3); ys = array('d', [0.0] * 3)   # unrelated vertices before the part
+    for i in range(count):
+        xs.append(i * 1.0); ys.append(math.sin(i / 15.0) * 20 + rnd.uniform(-0.3, 0.3))
+    kept = list(simplify_indices(xs, ys, 3, count, 0.5))
+    assert kept[0] == 3 and kept[-1] == 3 + count - 1 and kept == sorted(kept)
+    assert len(kept) < count
+    for a, b in zip(kept, kept[1:]):
+        for m in range(a + 1, b): assert _offset(xs, ys, m, a, b) <= 0.5
+    # The NumPy kernel and the pure-Python loop agree
+    monkeypatch.setattr(converter, 'HAVE_NUMPY', False)
+    assert list(simplify_indices(xs, ys, 3, count, 0.5)) == kept
+
+def test_simplify_keeps_small_closed_rings():
+    xs = array('d', [0, 10, 10.01, 0, 0]); ys = array('d', [0, 0, 0.01, 0.02, 0])
+    assert list(simplify_indices(xs, ys, 0, 5, 100.0)) == [0, 1, 2, 3, 4]
+    assert list(simplify_indices(xs, ys, 0, 5, 0)) == [0, 1, 2, 3, 4]
+
+# =====================================================
+# Spatial Index + Clip Filter
+# =====================================================
+def test_spatial_index_matches_brute_force():
+    rnd = random.Random(5)
+    xs = array('d'); ys = array('d'); parts = []
+    for i in range(400):
+        x = rnd.uniform(0, 1000); y = rnd.uniform(0, 1000)
+        parts.append(('L', len(xs), 2)); xs.extend((x, x + rnd.uniform(-20, 20))); ys.extend((y, y + rnd.uniform(-20, 20)))
+    parts.append(('L', len(xs), 2)); xs.extend((-50, 1050)); ys.extend((500, 520))   # a boundary across the plan
+    b = part_bounds(xs, ys, parts)
+    boxes = []
+    for _ in range(50):
+        x0 = rnd.uniform(-100, 1000); y0 = rnd.uniform(-100, 1000)
+        boxes.append((x0, y0, x0 + rnd.uniform(0, 300), y0 + rnd.uniform(0, 300)))
+    fine = SpatialIndex(b, cell=25.0)
+    assert fine.large == [len(parts) - 1]
+    for index in (SpatialIndex.from_parts(xs, ys, parts), fine):
+        for box in boxes:
+            expect = [i for i in range(len(parts))
+                      if b[4 * i] <= box[2] and b[4 * i + 2] >= box[0] and b[4 * i + 1] <= box[3] and b[4 * i + 3] >= box[1]]
+            assert index.query(box) == expect
+
+def test_clip_region_intersections():
+    area = ClipRegion.rect(100, 100, 200, 200)
+    xs = array('d'); ys = array('d')
+    def part(*pts):
+        start = len(xs)
+        for x, y in pts: xs.append(x); ys.append(y)
+        return start, len(pts)
+    crossing = part((50, 150), (250, 150))              # no vertex inside
+    outside = part((50, 50), (90, 250))
+    ring = part((0, 0), (300, 0), (300, 300), (0, 300), (0, 0))   # surrounds the area
+    open_ring = part((0, 0), (300, 0), (300, 300), (0, 300))
+    assert area.intersects(xs, ys, *crossing)
+    assert not area.intersects(xs, ys, *outside)
+    assert area.intersects(xs, ys, *ring) and not area.intersects(xs, ys, *open_ring)
+    circle = ClipRegion.circle(150, 150, 30)
+    assert circle.intersects(xs, ys, *crossing) and not circle.intersects(xs, ys, *outside)
+    assert circle.intersects(xs, ys, *ring) and not circle.intersects(xs, ys, *open_ring)
+
+def test_parse_clip_forms(tmp_path):
+    assert parse_clip("") is None
+    assert parse_clip("200,200,100,100").bounds == (100, 100, 200, 200)
+    assert parse_clip("150 150 25").radius == 25
+    assert parse_clip("40", gps_fix=(1000, 2000)).centre == (1000, 2000)
+    poly = tmp_path / "area.csv"
+    poly.write_text("Id,E,N\n1,0,0\n2,10,0\n3,10,10\n4,0,10\n", encoding='utf-8')
+    assert parse_clip(str(poly)).bounds == (0, 0, 10, 10)
+    for bad in ("1,2", "a,b,c,d", "40"):
+        with pytest.raises(ValueError): parse_clip(bad)
@@ -0,0 +1,116 @@
+"""
+GPS engine tests: scripted fixes are replayed through MockLocationProvider
+with no delay, so the sessions run their real threading paths on Linux.
+
+Usage:  python -m pytest -q tests
+"""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gps_engine import (GPSFix, FixSession, AveragingSession, MockLocationProvider, TrackLog,
+                        iter_track, TRACK_MAGIC, TRACK_RECORD, GPS_GOOD_ACCURACY, GPS_OUTLIER_MIN_FIXES)
+
+LAT, LON, ALT = 6.9271, 79.8612, 10.0
+WAIT = 5.0
+
+def _fix(acc, lat=LAT, lon=LON):
+    return GPSFix(lat, lon, ALT, acc, 0.0, 'mock')
+
+def _run(session):
+    """Starts `session` and returns the on_done arguments once it finishes."""
+    done = threading.Event(); result = []
+    session.on_done = lambda *args: (result.extend(args), done.set())
+    session.start()
+    assert done.wait(WAIT), "session did not finish"
+    return result
+
+# =====================================================
+# FixSession
+# =====================================================
+def test_fix_session_stops_at_accuracy_threshold():
+    accs = [60.0, 45.0, 30.0, GPS_GOOD_ACCURACY - 2, 3.0, 1.0]
+    provider = MockLocationProvider((0, _fix(a)) for a in accs)
+    updates = []
+    session = FixSession(provider, on_update=updates.append)
+    fix, live = _run(session)
+    assert live is True and fix.acc == GPS_GOOD_ACCURACY - 2
+    assert [f.acc for f in updates] == [60.0, 45.0, 30.0]
+    assert not session.running and provider._stop.is_set()
+
+def test_fix_session_ignores_small_improvements():
+    provider = MockLocationProvider((0, _fix(a)) for a in (50.0, 49.0, 48.5, 40.0, 10.0))
+    updates = []
+    fix, live = _run(FixSession(provider, on_update=updates.append))
+    assert live and fix.acc == 10.0
+    assert [f.acc for f in updates] == [50.0, 40.0]
+
+def test_fix_session_timeout_returns_best_fix():
+    provider = MockLocationProvider([(0, _fix(80.0)), (0, _fix(40.0)), (60, _fix(1.0))])
+    fix, live = _run(FixSession(provider, timeout=0.3))
+    assert live is False and fix.acc == 40.0
+
+# =====================================================
+# AveragingSession
+# =====================================================
+def test_averaging_session_rejects_outliers():
+    good = MockLocationProvider.converging(LAT, LON, ALT, n=20, start_acc=5.0, end_acc=5.0, seed=1).script
+    far = [(0, _fix(5.0, LAT + 0.001, LON)), (0, _fix(5.0, LAT, LON - 0.001))]   # ~110 m off
+    bad = [(0, _fix(80.0))]   # worse than max_acc
+    script = [(0, f) for _, f in good[:GPS_OUTLIER_MIN_FIXES]] + far + bad + [(0, f) for _, f in good[GPS_OUTLIER_MIN_FIXES:]]
+    session = AveragingSession(MockLocationProvider(script), fixes=len(good))
+    avg, complete = _run(session)
+    assert complete is True
+    assert avg.count == len(good) and avg.rejected == 3
+    assert abs(avg.lat - LAT) * 111320.0 < 2.0 and abs(avg.lon - LON) * 111320.0 < 2.0
+    assert avg.std < 5.0
+    assert session.result() == avg
+
+def test_averaging_session_keeps_early_fixes():
+    # Outlier rejection only starts once enough fixes set the mean
+    script = [(0, _fix(5.0, LAT + 0.001 * (i % 2), LON)) for i in range(GPS_OUTLIER_MIN_FIXES)]
+    avg, complete = _run(AveragingSession(MockLocationProvider(script), fixes=GPS_OUTLIER_MIN_FIXES))
+    assert complete and avg.count == GPS_OUTLIER_MIN_FIXES and avg.rejected == 0
+
+# =====================================================
+# TrackLog
+# =====================================================
+def test_track_log_resumes_after_torn_record(tmp_path):
+    path = str(tmp_path / "walk.smtrk")
+    script = MockLocationProvider.walking(n=40, interval=0, seed=7).script
+    log = TrackLog(path, batch=16)
+    for _, fix in script[:30]: log.append(fix)
+    log.close()
+    length = log.length
+    with open(path, 'ab') as f:
+        f.write(TRACK_RECORD.pack(1.0, LAT, LON, ALT, 5.0, 0.0, 0.0)[:TRACK_RECORD.size // 2])
+    assert len(list(iter_track(path))) == 30
+
+    log = TrackLog(path, batch=16)
+    assert log.resumed == 30 and log.points == 30
+    assert abs(log.length - length) < 1e-6
+    assert os.path.getsize(path) == len(TRACK_MAGIC) + 30 * TRACK_RECORD.size
+    for _, fix in script[30:]: log.append(fix)
+    log.close()
+    records = list(iter_track(path))
+    assert len(records) == 40
+    assert [(r[1], r[2]) for r in records] == [(f.lat, f.lon) for _, f in script]
+
+def test_track_log_checkpoint_from_another_thread(tmp_path):
+    # on_pause checkpoints from the UI thread while the provider thread appends
+    path = str(tmp_path / "walk.smtrk")
+    script = MockLocationProvider.walking(n=20000, interval=0, seed=3).script
+    log = TrackLog(path, batch=16, checkpoint=3600)
+    stop = threading.Event()
+    def pause():
+        while not stop.is_set(): log.checkpoint()
+    t = threading.Thread(target=pause); t.start()
+    try:
+        for _, fix in script: log.append(fix)
+    finally:
+        stop.set(); t.join()
+    log.close()
+    records = list(iter_track(path))
+    assert len(records) == len(script)
+    assert [(r[1], r[2]) for r in records] == [(f.lat, f.lon) for _, f in script]